@@ -0,0 +1,264 @@
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+from functools import reduce
+
+import ast
+from walker import NodeWalker
+from evalexpr import binop
+
+# Closed-form evaluation of expressions over the indices of replicators. The
+# subscripts and locations of channel uses in replicators are usually affine
+# in the indices, possibly with a quotient or remainder by a constant (for
+# example (i*N)+((j+1) rem N)). Such an expression is analysed once into a
+# Form, which is then evaluated over the whole iteration space of the indices
+# with list arithmetic, rather than by substituting the values of the indices
+# into a copy of the expression at each point.
+
+class Form(object):
+  """
+  An integer-valued expression c + a_1*t_1 + ... + a_n*t_n, where each a_i is
+  a constant and each term t_i is an Index, Quotient or Remainder.
+  """
+  def __init__(self, const, terms=[]):
+    self.const = const
+    self.terms = terms
+
+  def is_const(self):
+    return not self.terms
+
+  def add(self, f):
+    return Form(self.const + f.const, self.terms + f.terms)
+
+  def scale(self, k):
+    if k == 0:
+      return Form(0)
+    return Form(self.const * k, [(a * k, t) for (a, t) in self.terms])
+
+  def divides(self, d):
+    """
+    Return if every coefficient of the form is a multiple of d.
+    """
+    return (self.const % d == 0
+        and all(a % d == 0 for (a, t) in self.terms))
+
+  def values(self, columns, n):
+    """
+    Evaluate the form at each of n points, given the value of each index at
+    each point.
+    """
+    v = [self.const] * n
+    for (a, t) in self.terms:
+      v = [x + a*y for (x, y) in zip(v, t.values(columns, n))]
+    return v
+
+class Index(object):
+  """
+  The value of a replicator index.
+  """
+  def __init__(self, name):
+    self.name = name
+
+  def values(self, columns, n):
+    return columns[self.name]
+
+class Quotient(object):
+  """
+  The quotient of a form and a (non-zero) constant.
+  """
+  def __init__(self, form, d):
+    self.form = form
+    self.d = d
+
+  def values(self, columns, n):
+    return [binop('/', x, self.d) for x in self.form.values(columns, n)]
+
+class Remainder(object):
+  """
+  The remainder of a form and a (non-zero) constant.
+  """
+  def __init__(self, form, d):
+    self.form = form
+    self.d = d
+
+  def values(self, columns, n):
+    return [binop('rem', x, self.d) for x in self.form.values(columns, n)]
+
+class AffineExpr(NodeWalker):
+  """
+  Analyse an expression as a Form over a set of index names. Return None if
+  this is not possible. Operators are applied in the same way as EvalExpr.
+  """
+  def __init__(self, names):
+    self.names = names
+
+  # Expressions =========================================
+
+  def expr_single(self, node):
+    return self.elem(node.elem)
+
+  def expr_unary(self, node):
+
+    a = self.elem(node.elem)
+
+    if a == None:
+      return None
+
+    if   node.op == '-': return a.scale(-1)
+    elif node.op == '~': return Form(-1).add(a.scale(-1))
+    else:
+      assert 0
+
+  def expr_binop(self, node):
+
+    a = self.elem(node.elem)
+    b = self.expr(node.right) if a != None else None
+
+    if a == None or b == None:
+      return None
+
+    if a.is_const() and b.is_const():
+      return Form(binop(node.op, a.const, b.const))
+
+    if   node.op == '+': return a.add(b)
+    elif node.op == '-': return a.add(b.scale(-1))
+    elif node.op == '*':
+      if a.is_const(): return b.scale(a.const)
+      if b.is_const(): return a.scale(b.const)
+    elif b.is_const() and b.const != 0:
+      d = b.const
+      if node.op == '/':
+        if a.divides(d):
+          return Form(a.const // d, [(x // d, t) for (x, t) in a.terms])
+        return Form(0, [(1, Quotient(a, d))])
+      elif node.op == 'rem':
+        return Form(0, [(1, Remainder(a, d))])
+      elif node.op == '<<' and d > 0:
+        return a.scale(1 << d)
+      elif node.op == '>>' and d > 0:
+        return Form(0, [(1, Quotient(a, 1 << d))])
+    return None
+
+  # Elements ============================================
+
+  def elem_id(self, node):
+    if node.name in self.names:
+      return Form(0, [(1, Index(node.name))])
+    s = node.symbol
+    if s != None and isinstance(s.value, int):
+      return Form(s.value)
+    return None
+
+  def elem_group(self, node):
+    return self.expr(node.expr)
+
+  def elem_number(self, node):
+    return Form(node.value) if isinstance(node.value, int) else None
+
+  # Not integer-valued, or not constant
+
+  def elem_boolean(self, node):
+    return None
+
+  def elem_char(self, node):
+    return None
+
+  def elem_fcall(self, node):
+    return None
+
+  def elem_sub(self, node):
+    return None
+
+  def elem_slice(self, node):
+    return None
+
+  def elem_index_range(self, node):
+    return None
+
+  def elem_string(self, node):
+    return None
+
+def columns(names, ranges):
+  """
+  Return a dictionary of the value of each named index at each point of the
+  product of their ranges, in the order produced by itertools.product. Where
+  indices have the same name, the first is used.
+  """
+  n = reduce(lambda x, y: x*len(y), ranges, 1)
+  cols = {}
+  stride = n
+  for (name, r) in zip(names, ranges):
+    if n == 0:
+      cols.setdefault(name, [])
+      continue
+    stride //= len(r)
+    col = [x for x in r for i in range(stride)] * (n // (len(r) * stride))
+    cols.setdefault(name, col)
+  return cols
+
+def expand(expr, names, ranges):
+  """
+  Evaluate an expression at each point of the product of the ranges of a set
+  of named indices. Return a list of the values, or None if the expression is
+  not a Form.
+  """
+  f = AffineExpr(set(names)).expr(expr)
+  if f == None:
+    return None
+  n = reduce(lambda x, y: x*len(y), ranges, 1)
+  return f.values(columns(names, ranges), n)
+
+def linear(expr, names):
+  """
+  Analyse an expression as c + a_1*i_1 + ... + a_n*i_n over a set of named
+  indices. Return (c, {name: a}), or None if it is not of this form.
+  """
+  f = AffineExpr(set(names)).expr(expr)
+  if f == None or not all(isinstance(t, Index) for (a, t) in f.terms):
+    return None
+  coeffs = {}
+  for (a, t) in f.terms:
+    coeffs[t.name] = coeffs.get(t.name, 0) + a
+  return (f.const, coeffs)
+
+def rotation(expr, indices):
+  """
+  Analyse a subscript as a rotation of each index within its range, combined
+  in row-major order:
+    k + s_1*((d_1 + o_1) rem n_1) + ... + s_m*((d_m + o_m) rem n_m),
+  where d_j is the offset of index j from its base, n_j is its count and s_j
+  is the product of the counts of the indices following it. For example
+  (i*N)+((j+1) rem N). This maps the iteration space one-to-one onto [k,
+  k+n_1*...*n_m). Return (k, [o_1, ..., o_m]) with each o_j in [0, n_j), or
+  None if the subscript is not of this form.
+  """
+  names = [x.name for x in indices]
+  f = AffineExpr(set(names)).expr(expr)
+  if f == None:
+    return None
+  dims = [x.count_value for x in indices]
+  strides = [reduce(lambda x, y: x*y, dims[j+1:], 1)
+      for j in range(len(dims))]
+  k = f.const
+  offsets = [0] * len(indices)
+  seen = set()
+  for (a, t) in f.terms:
+    if isinstance(t, Index):
+      j = names.index(t.name)
+      k += a * indices[j].base_value
+    elif (isinstance(t, Remainder) and len(t.form.terms) == 1
+        and t.form.terms[0][0] == 1 and isinstance(t.form.terms[0][1], Index)):
+      j = names.index(t.form.terms[0][1].name)
+      if t.d != dims[j]:
+        return None
+      offsets[j] = (indices[j].base_value + t.form.const) % dims[j]
+    else:
+      return None
+    if j in seen or a != strides[j]:
+      return None
+    seen.add(j)
+  if any(not j in seen and dims[j] > 1 for j in range(len(dims))):
+    return None
+  return (k, offsets)
@@ -6,14 +6,33 @@
 #-----------------------------------------------------------------
 
 import sys
+from copy import deepcopy
+
+_UNSET = object()
 
 class Node(object):
   """ 
-  Abstract base class for AST nodes.
+  Abstract base class for AST nodes. Nodes have a fixed set of attributes
+  (slots), given in the configuration.
   """
+  __slots__ = ('coord',)
+  _fields = ('coord',)
+
+  def __deepcopy__(self, memo):
+    """
+    Copy a node and (recursively) each of its fields that has been set.
+    """
+    x = object.__new__(self.__class__)
+    memo[id(self)] = x
+    for k in self._fields:
+      v = getattr(self, k, _UNSET)
+      if v is not _UNSET:
+        object.__setattr__(x, k, deepcopy(v, memo))
+    return x
+
   def children(self):
     """ 
-    A sequence of all children that are Nodes.
+    An iterator over all children that are Nodes.
     """
     pass
 
@@ -69,22 +88,25 @@ class NodeVisitor(object):
 
 
 class Program(Node):
+  __slots__ = ('decls', 'defs')
+  _fields = ('coord', 'decls', 'defs')
+
   def __init__(self, decls, defs, coord=None):
     self.decls = decls
     self.defs = defs
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.decls is not None: c.extend(self.decls)
-    if self.defs is not None: c.extend(self.defs)
-    return tuple(c)
+    if self.decls is not None: yield from self.decls
+    if self.defs is not None: yield from self.defs
 
   def accept(self, visitor):
     tag = visitor.visit_program(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.decls is not None:
+      for c in self.decls: c.accept(visitor)
+    if self.defs is not None:
+      for c in self.defs: c.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -94,6 +116,9 @@ class Program(Node):
 
 
 class VarDecl(Node):
+  __slots__ = ('name', 'type', 'expr', 'symbol')
+  _fields = ('coord', 'name', 'type', 'expr', 'symbol')
+
   def __init__(self, name, type, expr, coord=None):
     self.name = name
     self.type = type
@@ -102,14 +127,11 @@ class VarDecl(Node):
     self.symbol = None
 
   def children(self):
-    c = []
-    return tuple(c)
+    return ()
 
   def accept(self, visitor):
     tag = visitor.visit_var_decl(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
     visitor.up(tag)
 
   def __hash__(self):
@@ -123,6 +145,9 @@ class VarDecl(Node):
 
 
 class ProcDef(Node):
+  __slots__ = ('name', 'type', 'formals', 'stmt', 'location', 'pred', 'chans', 'chantab', 'symbol')
+  _fields = ('coord', 'name', 'type', 'formals', 'stmt', 'location', 'pred', 'chans', 'chantab', 'symbol')
+
   def __init__(self, name, type, formals, stmt, coord=None):
     self.name = name
     self.type = type
@@ -132,16 +157,15 @@ class ProcDef(Node):
     self.symbol = None
 
   def children(self):
-    c = []
-    if self.stmt is not None: c.append(self.stmt)
-    if self.formals is not None: c.extend(self.formals)
-    return tuple(c)
+    if self.stmt is not None: yield self.stmt
+    if self.formals is not None: yield from self.formals
 
   def accept(self, visitor):
     tag = visitor.visit_proc_def(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.stmt is not None: self.stmt.accept(visitor)
+    if self.formals is not None:
+      for c in self.formals: c.accept(visitor)
     visitor.up(tag)
 
   def __hash__(self):
@@ -155,6 +179,9 @@ class ProcDef(Node):
 
 
 class Param(Node):
+  __slots__ = ('name', 'type', 'expr', 'symbol')
+  _fields = ('coord', 'name', 'type', 'expr', 'symbol')
+
   def __init__(self, name, type, expr, coord=None):
     self.name = name
     self.type = type
@@ -163,14 +190,11 @@ class Param(Node):
     self.symbol = None
 
   def children(self):
-    c = []
-    return tuple(c)
+    return ()
 
   def accept(self, visitor):
     tag = visitor.visit_param(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
     visitor.up(tag)
 
   def __hash__(self):
@@ -184,6 +208,9 @@ class Param(Node):
 
 
 class Stmt(Node):
+  __slots__ = ('location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans')
+
   def __init__(self, coord=None):
     self.coord = coord
 
@@ -202,22 +229,25 @@ class Stmt(Node):
 
 
 class StmtSeq(Stmt):
+  __slots__ = ('decls', 'stmt', 'scope')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'decls', 'stmt', 'scope')
+
   def __init__(self, decls, stmt, coord=None):
     self.decls = decls
     self.stmt = stmt
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.decls is not None: c.extend(self.decls)
-    if self.stmt is not None: c.extend(self.stmt)
-    return tuple(c)
+    if self.decls is not None: yield from self.decls
+    if self.stmt is not None: yield from self.stmt
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_seq(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.decls is not None:
+      for c in self.decls: c.accept(visitor)
+    if self.stmt is not None:
+      for c in self.stmt: c.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -227,6 +257,9 @@ class StmtSeq(Stmt):
 
 
 class StmtPar(Stmt):
+  __slots__ = ('decls', 'stmt', 'distribute', 'scope')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'decls', 'stmt', 'distribute', 'scope')
+
   def __init__(self, decls, stmt, distribute, coord=None):
     self.decls = decls
     self.stmt = stmt
@@ -234,16 +267,16 @@ class StmtPar(Stmt):
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.decls is not None: c.extend(self.decls)
-    if self.stmt is not None: c.extend(self.stmt)
-    return tuple(c)
+    if self.decls is not None: yield from self.decls
+    if self.stmt is not None: yield from self.stmt
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_par(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.decls is not None:
+      for c in self.decls: c.accept(visitor)
+    if self.stmt is not None:
+      for c in self.stmt: c.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -254,22 +287,23 @@ class StmtPar(Stmt):
 
 
 class StmtAss(Stmt):
+  __slots__ = ('left', 'expr')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'left', 'expr')
+
   def __init__(self, left, expr, coord=None):
     self.left = left
     self.expr = expr
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.left is not None: c.append(self.left)
-    if self.expr is not None: c.append(self.expr)
-    return tuple(c)
+    if self.left is not None: yield self.left
+    if self.expr is not None: yield self.expr
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_ass(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.left is not None: self.left.accept(visitor)
+    if self.expr is not None: self.expr.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -279,22 +313,23 @@ class StmtAss(Stmt):
 
 
 class StmtIn(Stmt):
+  __slots__ = ('left', 'expr')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'left', 'expr')
+
   def __init__(self, left, expr, coord=None):
     self.left = left
     self.expr = expr
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.left is not None: c.append(self.left)
-    if self.expr is not None: c.append(self.expr)
-    return tuple(c)
+    if self.left is not None: yield self.left
+    if self.expr is not None: yield self.expr
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_in(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.left is not None: self.left.accept(visitor)
+    if self.expr is not None: self.expr.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -304,22 +339,23 @@ class StmtIn(Stmt):
 
 
 class StmtOut(Stmt):
+  __slots__ = ('left', 'expr')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'left', 'expr')
+
   def __init__(self, left, expr, coord=None):
     self.left = left
     self.expr = expr
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.left is not None: c.append(self.left)
-    if self.expr is not None: c.append(self.expr)
-    return tuple(c)
+    if self.left is not None: yield self.left
+    if self.expr is not None: yield self.expr
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_out(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.left is not None: self.left.accept(visitor)
+    if self.expr is not None: self.expr.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -329,22 +365,23 @@ class StmtOut(Stmt):
 
 
 class StmtInTag(Stmt):
+  __slots__ = ('left', 'expr')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'left', 'expr')
+
   def __init__(self, left, expr, coord=None):
     self.left = left
     self.expr = expr
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.left is not None: c.append(self.left)
-    if self.expr is not None: c.append(self.expr)
-    return tuple(c)
+    if self.left is not None: yield self.left
+    if self.expr is not None: yield self.expr
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_in_tag(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.left is not None: self.left.accept(visitor)
+    if self.expr is not None: self.expr.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -354,22 +391,23 @@ class StmtInTag(Stmt):
 
 
 class StmtOutTag(Stmt):
+  __slots__ = ('left', 'expr')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'left', 'expr')
+
   def __init__(self, left, expr, coord=None):
     self.left = left
     self.expr = expr
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.left is not None: c.append(self.left)
-    if self.expr is not None: c.append(self.expr)
-    return tuple(c)
+    if self.left is not None: yield self.left
+    if self.expr is not None: yield self.expr
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_out_tag(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.left is not None: self.left.accept(visitor)
+    if self.expr is not None: self.expr.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -379,22 +417,23 @@ class StmtOutTag(Stmt):
 
 
 class StmtAlias(Stmt):
+  __slots__ = ('left', 'slice')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'left', 'slice')
+
   def __init__(self, left, slice, coord=None):
     self.left = left
     self.slice = slice
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.left is not None: c.append(self.left)
-    if self.slice is not None: c.append(self.slice)
-    return tuple(c)
+    if self.left is not None: yield self.left
+    if self.slice is not None: yield self.slice
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_alias(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.left is not None: self.left.accept(visitor)
+    if self.slice is not None: self.slice.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -404,6 +443,9 @@ class StmtAlias(Stmt):
 
 
 class StmtConnect(Stmt):
+  __slots__ = ('left', 'id', 'expr', 'type')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'left', 'id', 'expr', 'type')
+
   def __init__(self, left, id, expr, type, coord=None):
     self.left = left
     self.id = id
@@ -412,17 +454,16 @@ class StmtConnect(Stmt):
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.left is not None: c.append(self.left)
-    if self.id is not None: c.append(self.id)
-    if self.expr is not None: c.append(self.expr)
-    return tuple(c)
+    if self.left is not None: yield self.left
+    if self.id is not None: yield self.id
+    if self.expr is not None: yield self.expr
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_connect(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.left is not None: self.left.accept(visitor)
+    if self.id is not None: self.id.accept(visitor)
+    if self.expr is not None: self.expr.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -433,6 +474,9 @@ class StmtConnect(Stmt):
 
 
 class StmtServer(Stmt):
+  __slots__ = ('decls', 'server', 'client', 'distribute', 'scope')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'decls', 'server', 'client', 'distribute', 'scope')
+
   def __init__(self, decls, server, client, distribute, coord=None):
     self.decls = decls
     self.server = server
@@ -441,17 +485,17 @@ class StmtServer(Stmt):
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.server is not None: c.append(self.server)
-    if self.client is not None: c.append(self.client)
-    if self.decls is not None: c.extend(self.decls)
-    return tuple(c)
+    if self.server is not None: yield self.server
+    if self.client is not None: yield self.client
+    if self.decls is not None: yield from self.decls
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_server(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.server is not None: self.server.accept(visitor)
+    if self.client is not None: self.client.accept(visitor)
+    if self.decls is not None:
+      for c in self.decls: c.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -462,22 +506,23 @@ class StmtServer(Stmt):
 
 
 class StmtWhile(Stmt):
+  __slots__ = ('cond', 'stmt')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'cond', 'stmt')
+
   def __init__(self, cond, stmt, coord=None):
     self.cond = cond
     self.stmt = stmt
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.cond is not None: c.append(self.cond)
-    if self.stmt is not None: c.append(self.stmt)
-    return tuple(c)
+    if self.cond is not None: yield self.cond
+    if self.stmt is not None: yield self.stmt
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_while(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.cond is not None: self.cond.accept(visitor)
+    if self.stmt is not None: self.stmt.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -487,22 +532,23 @@ class StmtWhile(Stmt):
 
 
 class StmtFor(Stmt):
+  __slots__ = ('index', 'stmt')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'index', 'stmt')
+
   def __init__(self, index, stmt, coord=None):
     self.index = index
     self.stmt = stmt
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.index is not None: c.append(self.index)
-    if self.stmt is not None: c.append(self.stmt)
-    return tuple(c)
+    if self.index is not None: yield self.index
+    if self.stmt is not None: yield self.stmt
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_for(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.index is not None: self.index.accept(visitor)
+    if self.stmt is not None: self.stmt.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -512,22 +558,24 @@ class StmtFor(Stmt):
 
 
 class StmtRep(Stmt):
+  __slots__ = ('indices', 'stmt', 'm')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'indices', 'stmt', 'm')
+
   def __init__(self, indices, stmt, coord=None):
     self.indices = indices
     self.stmt = stmt
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.stmt is not None: c.append(self.stmt)
-    if self.indices is not None: c.extend(self.indices)
-    return tuple(c)
+    if self.stmt is not None: yield self.stmt
+    if self.indices is not None: yield from self.indices
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_rep(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.stmt is not None: self.stmt.accept(visitor)
+    if self.indices is not None:
+      for c in self.indices: c.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -537,6 +585,9 @@ class StmtRep(Stmt):
 
 
 class StmtIf(Stmt):
+  __slots__ = ('cond', 'thenstmt', 'elsestmt')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'cond', 'thenstmt', 'elsestmt')
+
   def __init__(self, cond, thenstmt, elsestmt, coord=None):
     self.cond = cond
     self.thenstmt = thenstmt
@@ -544,17 +595,16 @@ class StmtIf(Stmt):
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.cond is not None: c.append(self.cond)
-    if self.thenstmt is not None: c.append(self.thenstmt)
-    if self.elsestmt is not None: c.append(self.elsestmt)
-    return tuple(c)
+    if self.cond is not None: yield self.cond
+    if self.thenstmt is not None: yield self.thenstmt
+    if self.elsestmt is not None: yield self.elsestmt
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_if(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.cond is not None: self.cond.accept(visitor)
+    if self.thenstmt is not None: self.thenstmt.accept(visitor)
+    if self.elsestmt is not None: self.elsestmt.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -564,22 +614,23 @@ class StmtIf(Stmt):
 
 
 class StmtOn(Stmt):
+  __slots__ = ('expr', 'stmt')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'expr', 'stmt')
+
   def __init__(self, expr, stmt, coord=None):
     self.expr = expr
     self.stmt = stmt
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.expr is not None: c.append(self.expr)
-    if self.stmt is not None: c.append(self.stmt)
-    return tuple(c)
+    if self.expr is not None: yield self.expr
+    if self.stmt is not None: yield self.stmt
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_on(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.expr is not None: self.expr.accept(visitor)
+    if self.stmt is not None: self.stmt.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -589,6 +640,9 @@ class StmtOn(Stmt):
 
 
 class StmtPcall(Stmt):
+  __slots__ = ('name', 'args', 'symbol')
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'name', 'args', 'symbol')
+
   def __init__(self, name, args, coord=None):
     self.name = name
     self.args = args
@@ -596,15 +650,13 @@ class StmtPcall(Stmt):
     self.symbol = None
 
   def children(self):
-    c = []
-    if self.args is not None: c.extend(self.args)
-    return tuple(c)
+    if self.args is not None: yield from self.args
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_pcall(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.args is not None:
+      for c in self.args: c.accept(visitor)
     visitor.up(tag)
 
   def __hash__(self):
@@ -618,20 +670,20 @@ class StmtPcall(Stmt):
 
 
 class StmtAssert(Stmt):
+  __slots__ = ('expr',)
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'expr')
+
   def __init__(self, expr, coord=None):
     self.expr = expr
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.expr is not None: c.append(self.expr)
-    return tuple(c)
+    if self.expr is not None: yield self.expr
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_assert(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.expr is not None: self.expr.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -641,20 +693,20 @@ class StmtAssert(Stmt):
 
 
 class StmtReturn(Stmt):
+  __slots__ = ('expr',)
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans', 'expr')
+
   def __init__(self, expr, coord=None):
     self.expr = expr
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.expr is not None: c.append(self.expr)
-    return tuple(c)
+    if self.expr is not None: yield self.expr
 
   def accept(self, visitor):
     tag = visitor.visit_stmt_return(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.expr is not None: self.expr.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -664,6 +716,9 @@ class StmtReturn(Stmt):
 
 
 class StmtSkip(Stmt):
+  __slots__ = ()
+  _fields = ('coord', 'location', 'pred', 'succ', 'use', 'defs', 'inp', 'out', 'use_bits', 'def_bits', 'in_bits', 'out_bits', 'chans')
+
   def __init__(self, coord=None):
     self.coord = coord
 
@@ -682,6 +737,9 @@ class StmtSkip(Stmt):
 
 
 class Expr(Node):
+  __slots__ = ('key',)
+  _fields = ('coord', 'key')
+
   def __init__(self, coord=None):
     self.coord = coord
 
@@ -700,20 +758,20 @@ class Expr(Node):
 
 
 class ExprSingle(Expr):
+  __slots__ = ('elem',)
+  _fields = ('coord', 'key', 'elem')
+
   def __init__(self, elem, coord=None):
     self.elem = elem
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.elem is not None: c.append(self.elem)
-    return tuple(c)
+    if self.elem is not None: yield self.elem
 
   def accept(self, visitor):
     tag = visitor.visit_expr_single(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.elem is not None: self.elem.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -723,21 +781,21 @@ class ExprSingle(Expr):
 
 
 class ExprUnary(Expr):
+  __slots__ = ('op', 'elem')
+  _fields = ('coord', 'key', 'op', 'elem')
+
   def __init__(self, op, elem, coord=None):
     self.op = op
     self.elem = elem
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.elem is not None: c.append(self.elem)
-    return tuple(c)
+    if self.elem is not None: yield self.elem
 
   def accept(self, visitor):
     tag = visitor.visit_expr_unary(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.elem is not None: self.elem.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -748,6 +806,9 @@ class ExprUnary(Expr):
 
 
 class ExprBinop(Expr):
+  __slots__ = ('op', 'elem', 'right')
+  _fields = ('coord', 'key', 'op', 'elem', 'right')
+
   def __init__(self, op, elem, right, coord=None):
     self.op = op
     self.elem = elem
@@ -755,16 +816,14 @@ class ExprBinop(Expr):
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.elem is not None: c.append(self.elem)
-    if self.right is not None: c.append(self.right)
-    return tuple(c)
+    if self.elem is not None: yield self.elem
+    if self.right is not None: yield self.right
 
   def accept(self, visitor):
     tag = visitor.visit_expr_binop(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.elem is not None: self.elem.accept(visitor)
+    if self.right is not None: self.right.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -775,6 +834,9 @@ class ExprBinop(Expr):
 
 
 class Elem(Node):
+  __slots__ = ('key',)
+  _fields = ('coord', 'key')
+
   def __init__(self, coord=None):
     self.coord = coord
 
@@ -793,20 +855,20 @@ class Elem(Node):
 
 
 class ElemId(Elem):
+  __slots__ = ('name', 'symbol')
+  _fields = ('coord', 'key', 'name', 'symbol')
+
   def __init__(self, name, coord=None):
     self.name = name
     self.coord = coord
     self.symbol = None
 
   def children(self):
-    c = []
-    return tuple(c)
+    return ()
 
   def accept(self, visitor):
     tag = visitor.visit_elem_id(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
     visitor.up(tag)
 
   def __eq__(self, other):
@@ -823,6 +885,9 @@ class ElemId(Elem):
 
 
 class ElemSub(Elem):
+  __slots__ = ('name', 'expr', 'symbol')
+  _fields = ('coord', 'key', 'name', 'expr', 'symbol')
+
   def __init__(self, name, expr, coord=None):
     self.name = name
     self.expr = expr
@@ -830,15 +895,12 @@ class ElemSub(Elem):
     self.symbol = None
 
   def children(self):
-    c = []
-    if self.expr is not None: c.append(self.expr)
-    return tuple(c)
+    if self.expr is not None: yield self.expr
 
   def accept(self, visitor):
     tag = visitor.visit_elem_sub(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.expr is not None: self.expr.accept(visitor)
     visitor.up(tag)
 
   def __eq__(self, other):
@@ -855,6 +917,9 @@ class ElemSub(Elem):
 
 
 class ElemSlice(Elem):
+  __slots__ = ('name', 'base', 'count', 'symbol')
+  _fields = ('coord', 'key', 'name', 'base', 'count', 'symbol')
+
   def __init__(self, name, base, count, coord=None):
     self.name = name
     self.base = base
@@ -863,16 +928,14 @@ class ElemSlice(Elem):
     self.symbol = None
 
   def children(self):
-    c = []
-    if self.base is not None: c.append(self.base)
-    if self.count is not None: c.append(self.count)
-    return tuple(c)
+    if self.base is not None: yield self.base
+    if self.count is not None: yield self.count
 
   def accept(self, visitor):
     tag = visitor.visit_elem_slice(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.base is not None: self.base.accept(visitor)
+    if self.count is not None: self.count.accept(visitor)
     visitor.up(tag)
 
   def __eq__(self, other):
@@ -889,6 +952,9 @@ class ElemSlice(Elem):
 
 
 class ElemIndexRange(Elem):
+  __slots__ = ('name', 'base', 'count', 'distributed', 'base_value', 'count_value', 'symbol')
+  _fields = ('coord', 'key', 'name', 'base', 'count', 'distributed', 'base_value', 'count_value', 'symbol')
+
   def __init__(self, name, base, count, coord=None):
     self.name = name
     self.base = base
@@ -897,16 +963,14 @@ class ElemIndexRange(Elem):
     self.symbol = None
 
   def children(self):
-    c = []
-    if self.base is not None: c.append(self.base)
-    if self.count is not None: c.append(self.count)
-    return tuple(c)
+    if self.base is not None: yield self.base
+    if self.count is not None: yield self.count
 
   def accept(self, visitor):
     tag = visitor.visit_elem_index_range(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.base is not None: self.base.accept(visitor)
+    if self.count is not None: self.count.accept(visitor)
     visitor.up(tag)
 
   def __eq__(self, other):
@@ -923,20 +987,20 @@ class ElemIndexRange(Elem):
 
 
 class ElemGroup(Elem):
+  __slots__ = ('expr',)
+  _fields = ('coord', 'key', 'expr')
+
   def __init__(self, expr, coord=None):
     self.expr = expr
     self.coord = coord
 
   def children(self):
-    c = []
-    if self.expr is not None: c.append(self.expr)
-    return tuple(c)
+    if self.expr is not None: yield self.expr
 
   def accept(self, visitor):
     tag = visitor.visit_elem_group(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.expr is not None: self.expr.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -946,6 +1010,9 @@ class ElemGroup(Elem):
 
 
 class ElemFcall(Elem):
+  __slots__ = ('name', 'args', 'symbol')
+  _fields = ('coord', 'key', 'name', 'args', 'symbol')
+
   def __init__(self, name, args, coord=None):
     self.name = name
     self.args = args
@@ -953,15 +1020,13 @@ class ElemFcall(Elem):
     self.symbol = None
 
   def children(self):
-    c = []
-    if self.args is not None: c.extend(self.args)
-    return tuple(c)
+    if self.args is not None: yield from self.args
 
   def accept(self, visitor):
     tag = visitor.visit_elem_fcall(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
+    if self.args is not None:
+      for c in self.args: c.accept(visitor)
     visitor.up(tag)
 
   def __eq__(self, other):
@@ -978,19 +1043,19 @@ class ElemFcall(Elem):
 
 
 class ElemNumber(Elem):
+  __slots__ = ('value',)
+  _fields = ('coord', 'key', 'value')
+
   def __init__(self, value, coord=None):
     self.value = value
     self.coord = coord
 
   def children(self):
-    c = []
-    return tuple(c)
+    return ()
 
   def accept(self, visitor):
     tag = visitor.visit_elem_number(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -1001,19 +1066,19 @@ class ElemNumber(Elem):
 
 
 class ElemBoolean(Elem):
+  __slots__ = ('value',)
+  _fields = ('coord', 'key', 'value')
+
   def __init__(self, value, coord=None):
     self.value = value
     self.coord = coord
 
   def children(self):
-    c = []
-    return tuple(c)
+    return ()
 
   def accept(self, visitor):
     tag = visitor.visit_elem_boolean(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -1024,19 +1089,19 @@ class ElemBoolean(Elem):
 
 
 class ElemString(Elem):
+  __slots__ = ('value',)
+  _fields = ('coord', 'key', 'value')
+
   def __init__(self, value, coord=None):
     self.value = value
     self.coord = coord
 
   def children(self):
-    c = []
-    return tuple(c)
+    return ()
 
   def accept(self, visitor):
     tag = visitor.visit_elem_string(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -1047,19 +1112,19 @@ class ElemString(Elem):
 
 
 class ElemChar(Elem):
+  __slots__ = ('value',)
+  _fields = ('coord', 'key', 'value')
+
   def __init__(self, value, coord=None):
     self.value = value
     self.coord = coord
 
   def children(self):
-    c = []
-    return tuple(c)
+    return ()
 
   def accept(self, visitor):
     tag = visitor.visit_elem_char(self)
     visitor.down(tag)
-    for c in self.children():
-      c.accept(visitor)
     visitor.up(tag)
 
   def __repr__(self):
@@ -8,6 +8,9 @@
 from string import Template
 import util
 
+# The slots of every node, declared by Node (see _PROLOGUE_CODE)
+NODE_SLOTS = ['coord']
+
 class ASTGenerator(object):
   """
   Generate ast module from a specification
@@ -23,6 +26,12 @@ class ASTGenerator(object):
     self.node_cfg = [NodeCfg(parent, name, contents) 
         for (parent, name, contents) in self.parse_cfgfile(cfg_filename)]
 
+    # Give each node the slots already declared by its parents
+    fields = {'Node': NODE_SLOTS}
+    for x in self.node_cfg:
+      x.inherited = fields[x.parent]
+      fields[x.name] = x.fields()
+
   def generate(self, file=None):
     """ 
     Generates the code into file, an open file buffer.
@@ -79,7 +88,8 @@ class NodeCfg(object):
   """ 
   Node configuration. 
   name: node name
-  contents: a list of contents - attributes and child nodes 
+  contents: a list of contents - attributes, child nodes and analysis
+    attributes
   """
   def __init__(self, parent, name, contents):
     self.parent = parent
@@ -88,8 +98,14 @@ class NodeCfg(object):
     self.attr = []
     self.child = []
     self.seq_child = []
+    self.analysis = []
+    self.inherited = []
 
     for entry in contents:
+      if entry.endswith('?'):
+        self.analysis.append(entry.rstrip('?'))
+        continue
+
       clean_entry = entry.rstrip('*')
       self.all_entries.append(clean_entry)
       
@@ -100,6 +116,23 @@ class NodeCfg(object):
       else:
         self.attr.append(entry)
 
+  def slots(self):
+    """
+    The attributes of the node, in order, that are not declared by a parent.
+    Analysis attributes are not set by the constructor, so (as for any
+    attribute a pass has not yet set) reading one raises an AttributeError.
+    """
+    names = self.all_entries + self.analysis
+    if 'name' in self.all_entries:
+      names = names + ['symbol']
+    return [x for x in names if not x in self.inherited]
+
+  def fields(self):
+    """
+    All the slots of the node, including those declared by its parents.
+    """
+    return self.inherited + self.slots()
+
   def gen_source(self):
     src =  self.gen_init()
     src += self.gen_children()
@@ -111,6 +144,8 @@ class NodeCfg(object):
   
   def gen_init(self):
     src = "class {}({}):\n".format(self.name, self.parent)
+    src += "  __slots__ = {}\n".format(repr(tuple(self.slots())))
+    src += "  _fields = {}\n\n".format(repr(tuple(self.fields())))
 
     if self.all_entries:
       args = ', '.join(self.all_entries)
@@ -132,33 +167,35 @@ class NodeCfg(object):
   def gen_children(self):
     src = '  def children(self):\n'
     
-    if self.all_entries:
-      src += '    c = []\n'
-      
-      template = ('' +
-        '    if self.%s is not None:' +
-        ' c.%s(self.%s)\n')
-      
+    if self.child or self.seq_child:
       for child in self.child:
-        src += template % (child, 'append', child)
+        src += '    if self.%s is not None: yield self.%s\n' % (child, child)
       
       for seq_child in self.seq_child:
-        src += template % (seq_child, 'extend', seq_child)
+        src += '    if self.%s is not None: yield from self.%s\n' % (
+            seq_child, seq_child)
           
-      src += '    return tuple(c)\n\n'
+      src += '\n'
     else:
       src += '    return ()\n\n'
       
     return src
 
   def gen_accept(self):
+    """
+    Visit the children in the same order as children(), but without creating
+    an iterator.
+    """
     src =  '  def accept(self, visitor):\n'
     src += '    tag = visitor.visit_{}(self)\n'.format(
         (util.camel_to_under(self.name)))
     src += '    visitor.down(tag)\n'
-    if self.all_entries:
-      src += "    for c in self.children():\n"
-      src += "      c.accept(visitor)\n"
+    for child in self.child:
+      src += '    if self.%s is not None: self.%s.accept(visitor)\n' % (
+          child, child)
+    for seq_child in self.seq_child:
+      src += '    if self.%s is not None:\n' % seq_child
+      src += '      for c in self.%s: c.accept(visitor)\n' % seq_child
     src += '    visitor.up(tag)\n\n'
     return src
 
@@ -226,14 +263,33 @@ r'''#-----------------------------------------------------------------
 
 _PROLOGUE_CODE = r'''
 import sys
+from copy import deepcopy
+
+_UNSET = object()
 
 class Node(object):
   """ 
-  Abstract base class for AST nodes.
+  Abstract base class for AST nodes. Nodes have a fixed set of attributes
+  (slots), given in the configuration.
   """
+  __slots__ = ('coord',)
+  _fields = ('coord',)
+
+  def __deepcopy__(self, memo):
+    """
+    Copy a node and (recursively) each of its fields that has been set.
+    """
+    x = object.__new__(self.__class__)
+    memo[id(self)] = x
+    for k in self._fields:
+      v = getattr(self, k, _UNSET)
+      if v is not _UNSET:
+        object.__setattr__(x, k, deepcopy(v, memo))
+    return x
+
   def children(self):
     """ 
-    A sequence of all children that are Nodes.
+    An iterator over all children that are Nodes.
     """
     pass
 
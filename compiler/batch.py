@@ -0,0 +1,76 @@
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+import sys
+import shlex
+import multiprocessing
+
+import util
+from util import vmsg
+from server import run
+
+# Batch compilation of a list of jobs, each given as a line of compiler
+# arguments in a job file, for example::
+#
+#   # Sweep the number of cores
+#   array2d.sire -t XS1 -n 4  --val N=2 -o array2d_4.se
+#   array2d.sire -t XS1 -n 16 --val N=4 -o array2d_16.se
+#
+# The target-independent front end (parsing and value overrides) is run once
+# for each distinct source in the parent process. Each job is then compiled
+# in a worker forked from it, which inherits the parsed AST and runs the
+# device-dependent stages on its own private copy. Workers are not reused
+# between jobs so no state can leak from one compilation into another.
+
+def read_jobs(filename):
+  """
+  Read a job file and return a list of argument lists. Blank lines and lines
+  beginning with '#' are ignored.
+  """
+  jobs = []
+  for x in util.read_file(filename, read_lines=True):
+    x = x.strip()
+    if x and not x.startswith('#'):
+      jobs.append(shlex.split(x))
+  return jobs
+
+def run_job(compile, args):
+  """
+  Compile a single job, capturing its output.
+  """
+  resp = {}
+  resp['status'] = run(compile, args, '', resp)
+  return resp
+
+def run_batch(filename, compile, front_end, num_procs, v=False):
+  """
+  Run each job in a batch file over a pool of 'num_procs' processes. The
+  'front_end' function is called with the arguments of each job before any
+  workers are created. Output from each job is reported in job order.
+  Return the number of jobs that failed.
+  """
+  jobs = read_jobs(filename)
+  vmsg(v, 'Running front end for {} jobs'.format(len(jobs)))
+  [front_end(x) for x in jobs]
+
+  vmsg(v, 'Compiling {} jobs with {} processes'.format(len(jobs), num_procs))
+  pool = multiprocessing.get_context('fork').Pool(num_procs,
+      maxtasksperchild=1)
+  try:
+    results = [pool.apply_async(run_job, (compile, x)) for x in jobs]
+    failed = 0
+    for (i, (args, r)) in enumerate(zip(jobs, results)):
+      resp = r.get()
+      vmsg(v, '[{}/{}] {}: {}'.format(i+1, len(jobs), ' '.join(args),
+          'ok' if resp['status'] == 0 else 'failed'))
+      sys.stdout.write(resp['stdout'])
+      sys.stderr.write(resp['stderr'])
+      if resp['status'] != 0:
+        failed += 1
+  finally:
+    pool.close()
+    pool.join()
+
+  return failed
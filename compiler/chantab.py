@@ -7,9 +7,10 @@ from util import debug
 
 class ChanTable(object):
   """
-  A table to record the location of channel ends and their names. Each key maps
-  to list of locations where the first location is that of the master, and a 
-  unique identifier for the specific connection instance.
+  A table to record the location of channel ends and their names. Each
+  declared channel maps to a Channels object recording, for each element, the
+  locations of the master (first) and slave (second) ends and a unique
+  identifier for the specific connection instance.
   """
   def __init__(self, name, debug=False):
     self.name = name
@@ -26,69 +27,81 @@ class ChanTable(object):
     debug(self.debug, 'Ended scope')
     return tab
 
-  def key(self, name, index):
-    return '{}{}'.format(name, '' if index==None else index)
+  def declare(self, name, size=None):
+    """
+    Add a channel declaration in the current scope so channel uses can be
+    added to the correct scope. 'size' is the length of a channel array.
+    """
+    self.scopes[-1].declare(name, size)
+    debug(self.debug, '  Insert decl: '+name)
+
+  def resolve(self, name, base=None):
+    """
+    Return the Channels of the declaration of 'name' visible from a scope.
+    """
+    return (self.scopes[-1] if base==None else base).resolve(name)
 
-  def insert(self, name, index, location, chanend, chanset, decl=False):
+  def insert(self, name, index, location, chanend, chanset):
     """
-    Add channel declarations (with just names) so channel uses can be added to
-    the correct scope.
-    Or add a channel element with a particular index into the table recording the
+    Add a channel element with a particular index into the table recording the
     location and the ChanElemSet it is a member of (this is necessary for
     performing colouring to assign connection ids).
-    Declarations are prefixed with an underscore.
     """
-    if decl:
-      self.scopes[-1].tab['_'+name] = Channel()
-      debug(self.debug, '  Insert decl: '+name)
-      return
-    else:
-      scope = self.scopes[-1]
-      while scope != None:
-        if '_'+name in scope.tab:
-          key = self.key(name, index)
-          if not key in scope.tab:
-            scope.tab[key] = Channel()
-          scope.tab[key].locations.append(location)
-          scope.tab[key].chanends.append(chanend)
-          scope.tab[key].chansets.append(chanset)
-          debug(self.debug, '  Insert: '+name+'{} @ {}'.format(
-              '[{}]'.format(index) if index!=None else '', location))
-          return
-        scope = scope.prev
-    print('Could not insert element of channel '+name)
-    assert 0
+    self.insert_all(name, [index], [location], chanend, chanset)
+
+  def insert_all(self, name, indices, locations, chanend, chanset):
+    """
+    Add a sequence of elements of a channel, each with an index (in
+    'indices') and a location (in 'locations'), from the same channel end
+    (that of 'chanset').
+    """
+    c = self.resolve(name)
+    if c == None:
+      print('Could not insert element of channel '+name)
+      assert 0
+    for (index, location) in zip(indices, locations):
+      c.insert(index, location, chanset)
+      if self.debug:
+        debug(self.debug, '  Insert: '+name+'{} @ {}'.format(
+            '[{}]'.format(index) if index!=None else '', location))
 
   def contains(self, name, index):
     """
     Check if the table contains a channel element.
     """
-    return any(self.key(name, index) in x.tab for x in self.scopes)
+    c = self.resolve(name)
+    return c != None and c.slot(index) != None
 
-  def lookup(self, name, index, base=None, scoped=False):
+  def lookup(self, name, index, base=None):
     """
-    Lookup a channel's master and slave location. If base is set, a lookup can
-    be made from any scope.
+    Lookup a channel element: return the Channels it belongs to and its slot,
+    or None. If base is set, a lookup can be made from any scope.
     """
-    key = self.key(name, index)
-    scope = self.scopes[-1] if base==None else base
-    while scope != None:
-      if key in scope.tab:
-        debug(self.debug,"  Lookup: "+key)
-        return scope.tab[key]
-      scope = scope.prev
-    return None
+    scope = self.scopes[-1] if base == None else base
+    c = scope.resolved.get(name) or scope.resolve(name)
+    if c == None:
+      return None
+    i = c.slot(index)
+    return (c, i) if i != None else None
+
+  def lookup_locations(self, name, index, base=None):
+    """
+    Return the list of locations of the ends of a channel element.
+    """
+    x = self.lookup(name, index, base)
+    return x[0].locations(x[1]) if x != None else []
 
   def lookup_master_location(self, name, index, base=None):
     x = self.lookup(name, index, base)
-    return x.locations[0] if x != None else None
+    return x[0].master[x[1]] if x != None else None
 
   def lookup_slave_location(self, name, index, base=None):
     x = self.lookup(name, index, base)
-    return x.locations[1] if x != None else None
+    return x[0].slave[x[1]] if x != None else None
 
   def lookup_connid(self, name, index, scope):
-    return self.lookup(name, index, scope).connid
+    x = self.lookup(name, index, scope)
+    return x[0].connid[x[1]] if x != None else None
 
   def lookup_is_master(self, chan, elem, base=None):
     """
@@ -98,20 +111,19 @@ class ChanTable(object):
     first (master) chanend - which must be different if on the same location.
     """
     x = self.lookup(chan.name, elem.index, base)
-    if x == None:
-      return None
-    if x.locations[0] == x.locations[1]:
-      return x.chanends[0] == chan.chanend
-    else:
-      return x.locations[0] == elem.location 
+    return x[0].is_master(x[1], chan, elem) if x != None else None
 
   def lookup_chanset(self, chan, elem, base=None):
-    master = self.lookup_is_master(chan, elem, base)
     x = self.lookup(chan.name, elem.index, base)
-    return x.chansets[0 if master else 1] if x != None else None
+    if x == None:
+      return None
+    (c, i) = x
+    return (c.master_chanset[i] if c.is_master(i, chan, elem) 
+        else c.slave_chanset[i])
 
   def set_connid(self, name, index, scope, connid):
-    self.lookup(name, index, scope).connid = connid
+    (c, i) = self.lookup(name, index, scope)
+    c.connid[i] = connid
 
   def new_chanend(self):
     name = '_c{}'.format(self.chanend_count)
@@ -124,34 +136,146 @@ class ChanTable(object):
     for x in self.scopes:
       if len(x.tab) == 0:
         print('  Empty')
-      for y in filter(lambda x: x[0]!='_', x.tab.keys()):
-      #for y in x.tab.keys():
-        print('  Channel {} is {}'.format(y, x.tab[y]))
+      for (name, c) in x.tab.items():
+        for (index, i) in c.elements():
+          print('  Channel {}{} is {}'.format(name,
+              '' if index==None else '[{}]'.format(index), c.display(i)))
       print('--------------------------')
 
 
 class Scope(object):
   """
-  A scope represented by a table of channel identifiers with a pointer to the
-  previous scope.
+  A scope represented by a table of the channels declared in it with a
+  pointer to the previous scope. The declaration each name resolves to from
+  this scope is remembered.
   """
   def __init__(self, prev):
     self.tab = {}
     self.prev = prev
+    self.resolved = {}
+
+  def declare(self, name, size):
+    self.tab[name] = Channels(size)
+    self.resolved = {}
+
+  def resolve(self, name):
+    c = self.resolved.get(name)
+    if c == None:
+      scope = self
+      while scope != None and not name in scope.tab:
+        scope = scope.prev
+      if scope == None:
+        return None
+      c = self.resolved[name] = scope.tab[name]
+    return c
 
 
-class Channel(object):
+class Channels(object):
   """
-  A channel entity.
+  The elements of a declared channel. A channel array of length 'size' has
+  slots for each subscript in range, allocated when the first element is
+  inserted; a single channel has one slot (for the index None). Other
+  subscripts are given slots as they are inserted. For each slot we record:
+   - the number of ends inserted;
+   - the locations of the master and slave ends;
+   - the ChanElemSets of the master and slave ends;
+   - the connection identifier.
+  The elements of an array used only by symbolic ChanElemSets (see
+  labelchans.ChanMap), listed in 'symbolic', are not inserted.
   """
-  def __init__(self):
-    self.connid = -1
-    self.locations = []
-    self.chanends = []
-    self.chansets = []
-  
-  def __repr__(self):
-    return 'locations: {}, chanends: {}'.format(
-        ', '.join(['{}'.format(x) for x in self.locations]),
-        ', '.join(['{}'.format(x) for x in self.chanends]))
+  def __init__(self, size=None):
+    self.size = size
+    self.extra = {}
+    self.count = []
+    self.master = []
+    self.slave = []
+    self.master_chanset = []
+    self.slave_chanset = []
+    self.connid = []
+    self.others = {}
+    self.symbolic = []
+
+  def allocate(self):
+    n = self.size if self.size != None else 1
+    self.count = [0] * n
+    self.master = [None] * n
+    self.slave = [None] * n
+    self.master_chanset = [None] * n
+    self.slave_chanset = [None] * n
+    self.connid = [-1] * n
+
+  def is_used(self):
+    """
+    Return if any element has been inserted.
+    """
+    return len(self.count) > 0
 
+  def position(self, index):
+    """
+    Return the slot for a subscript, or None if it does not have one.
+    """
+    if index == None:
+      return 0 if self.size == None else self.extra.get(index)
+    if self.size != None and 0 <= index < self.size:
+      return index
+    return self.extra.get(index)
+
+  def slot(self, index):
+    """
+    Return the slot of an element that has been inserted, or None.
+    """
+    if not self.is_used():
+      return None
+    i = self.position(index)
+    return i if i != None and self.count[i] > 0 else None
+
+  def is_master(self, i, chan, elem):
+    if self.master[i] == self.slave[i]:
+      return self.master_chanset[i].chanend == chan.chanend
+    else:
+      return self.master[i] == elem.location
+
+  def insert(self, index, location, chanset):
+    if not self.is_used():
+      self.allocate()
+    i = self.position(index)
+    if i == None:
+      i = self.extra[index] = len(self.count)
+      self.count.append(0)
+      self.master.append(None)
+      self.slave.append(None)
+      self.master_chanset.append(None)
+      self.slave_chanset.append(None)
+      self.connid.append(-1)
+    n = self.count[i]
+    if n == 0:
+      self.master[i] = location
+      self.master_chanset[i] = chanset
+    elif n == 1:
+      self.slave[i] = location
+      self.slave_chanset[i] = chanset
+    else:
+      self.others.setdefault(i, []).append((location, chanset))
+    self.count[i] = n + 1
+
+  def locations(self, i):
+    return ([self.master[i], self.slave[i]][:self.count[i]]
+        + [x[0] for x in self.others.get(i, [])])
+
+  def chansets(self, i):
+    return ([self.master_chanset[i], self.slave_chanset[i]][:self.count[i]]
+        + [x[1] for x in self.others.get(i, [])])
+
+  def elements(self):
+    """
+    Return a list of (index, slot) for each element inserted.
+    """
+    es = [(x if self.size != None else None, x) 
+        for x in range(len(self.count) - len(self.extra))]
+    es += list(self.extra.items())
+    return [(x, i) for (x, i) in es if self.count[i] > 0]
+
+  def display(self, i):
+    return 'locations: {}, chanends: {}'.format(
+        ', '.join(['{}'.format(x) for x in self.locations(i)]),
+        ', '.join(['{}'.format(x.chanend) for x in self.chansets(i)]))
@@ -11,16 +11,23 @@ from builtin import builtins
 
 class Children(NodeVisitor):
   """
-  An AST visitor to determine the children of each procedure.
+  An AST visitor to determine the children of each procedure: the procedures
+  it calls directly or indirectly, which must be sent with it when it is
+  moved to another core.
   """
   def __init__(self, sig, _debug=False):
     self.debug = _debug
     self.parent = None
     self.children = {}
+    self.calls = {}
+    self.immobile = set([x for x in builtins.keys() if not builtins[x].mobile])
+    self.names = list(sig.mobile_proc_names)
+    self.index = dict([(x, i) for (i, x) in enumerate(self.names)])
     debug(self.debug, 'Initialising:')
     for x in sig.mobile_proc_names:
       debug(self.debug, '  '+x)
       self.children[x] = []
+      self.calls[x] = set()
 
   def add_child(self, name):
     """ 
@@ -29,29 +36,84 @@ class Children(NodeVisitor):
      - add only if it hasn't been already
      - don't add if it is its parent (recursive)
     """
-    if ((not name in self.children[self.parent]) and name != self.parent
-        and not name in filter(lambda x: not builtins[x].mobile, builtins.keys())):
+    if ((not name in self.calls[self.parent]) and name != self.parent
+        and not name in self.immobile):
       self.children[self.parent].append(name)
+      self.calls[self.parent].add(name)
       debug(self.debug, '  added child '+name+' to '+self.parent)
 
   def build(self):
     """ 
     Given immediate child relationships, calculate all nested relationships.
+    The call graph is condensed into its strongly connected components
+    (mutually recursive procedures) with Tarjan's algorithm, which completes
+    each component after those it calls, so the closure of each is the union
+    of its members and the closures of the components it calls. Closures are
+    bit-vectors over the mobile procedures, and the children of each
+    procedure are given in the order of the mobile procedures.
     """
-    change = True
-    # While there are still changes
-    while change:
-      change = False
-      # For each procedure x
-      for x in self.children.keys():
-        # For each child call y of x
-        for y in self.children[x]:
-          # for each child z of call y, or grandchild of x
-          for z in self.children[y]:
-            # Add it if it hasn't already been
-            if not z in self.children[x] and x != z:
-              self.children[x].append(z)
-              change = True
+    n = len(self.names)
+    succ = [[self.index[y] for y in self.children[x]] for x in self.names]
+    order = [None] * n
+    low = [0] * n
+    comp = [None] * n
+    closures = []
+    stack = []
+    count = 0
+    for root in range(n):
+      if order[root] != None:
+        continue
+      order[root] = low[root] = count
+      count += 1
+      stack.append(root)
+      path = [(root, iter(succ[root]))]
+      while path:
+        (v, edges) = path[-1]
+        w = next(edges, None)
+        if w != None:
+          if order[w] == None:
+            order[w] = low[w] = count
+            count += 1
+            stack.append(w)
+            path.append((w, iter(succ[w])))
+          elif comp[w] == None:
+            low[v] = min(low[v], order[w])
+          continue
+        path.pop()
+        if path:
+          u = path[-1][0]
+          low[u] = min(low[u], low[v])
+        if low[v] == order[v]:
+          # v is the root of a component: pop its members
+          c = len(closures)
+          bits = 0
+          members = []
+          while True:
+            w = stack.pop()
+            comp[w] = c
+            bits |= 1 << w
+            members.append(w)
+            if w == v:
+              break
+          for w in members:
+            for x in succ[w]:
+              if comp[x] != c:
+                bits |= closures[comp[x]]
+          closures.append(bits)
+    names = [self.decode(x) for x in closures]
+    for (i, x) in enumerate(self.names):
+      self.children[x] = [y for y in names[comp[i]] if y != x]
+
+  def decode(self, bits):
+    """
+    Return the names of the procedures in a bit-vector, in order.
+    """
+    names = []
+    while bits:
+      b = bits & -bits
+      names.append(self.names[b.bit_length()-1])
+      bits ^= b
+    return names
 
   def display(self, buf=sys.stdout):
     """
@@ -0,0 +1,301 @@
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+import copy
+from functools import reduce
+
+import ast
+from util import vmsg
+from typedefs import *
+from walker import NodeWalker
+from errorlog import ErrorLog
+from insertons import InsertOns
+from subelem import SubElem
+from symboltab import Symbol
+
+CHAN_TYPES = [T_CHAN_SINGLE, T_CHAN_SUB, T_CHAN_ARRAY, T_CHANEND_SINGLE,
+    T_CHANEND_SUB, T_CHANEND_ARRAY, T_CHANEND_SERVER_SINGLE,
+    T_CHANEND_CLIENT_SINGLE]
+
+class ChunkReps(NodeWalker):
+  """
+  Divide the processes of a replicator into chunks of G (the grain), each
+  distributed to one processor and running its processes locally. For
+  example, with G = 4, the replicator::
+
+    par i in [0 for N] do foo(c[i], c[i+1])
+
+  is translated as::
+
+    par _g in [0 for N/4] do
+      { foo(c[(_g*4)+0], c[((_g*4)+0)+1]) & ... &
+        foo(c[(_g*4)+3], c[((_g*4)+3)+1]) }
+
+  so the subscripts of channels are still labelled for each process. The
+  processes of a chunk run over threads when there are enough (see
+  Device.num_process_threads), and otherwise in sequence with a for loop,
+  which is possible only if they do not use channels. When G does not divide
+  the number of processes N, there are ceil(N/G) chunks and each process is
+  guarded by 'if (_g*G)+k < N' (unless it is in range in every chunk), so only
+  those of the last chunk past N are skipped. The connections of channels are
+  made for every process of each chunk, so for processes using channels G is
+  instead rounded up to a divisor of N.
+
+  The grain is given for every replicator, or chosen to fit the program on
+  the processors of the device: while more are needed than are available,
+  the replicator with the most processes is divided into the fewest chunks
+  that make up the difference. Only the outermost replicators of 'main'
+  whose processes each use one processor are divided.
+  """
+  def __init__(self, device, grain=None):
+    self.device = device
+    self.grain = grain
+
+  def walk_program(self, node, v):
+    main = node.defs[-1]
+    self.main = main
+    self.symbol = None
+    self.reps = []
+    self.stmt(main.stmt)
+    self.reps = [x for x in self.reps if self.size(x.stmt) == 1]
+    if self.grain != None:
+      for x in self.reps:
+        self.chunk(x, self.grain, v)
+      return
+    cores = self.device.num_cores()
+    need = self.size(main.stmt)
+    for x in sorted(self.reps, key=lambda x: -processes(x)):
+      if need <= cores:
+        break
+      m = processes(x)
+      c = max(1, m - (need - cores))
+      if self.chunk(x, -(-m // c), v):
+        need = self.size(main.stmt)
+
+  def size(self, stmt):
+    """
+    Return the number of processors InsertOns would give a statement.
+    """
+    return CountProcs(self.device, ErrorLog()).stmt(stmt, None, 0)
+
+  def chunk(self, node, g, v):
+    """
+    Divide a replicator into chunks of g processes. Return True if it was
+    divided.
+    """
+    m = processes(node)
+    g = min(max(g, 1), m)
+    if m % g != 0 and uses_chans(node.stmt):
+      g = min([x for x in range(g, m+1) if m % x == 0])
+    if g == 1:
+      return False
+    n = -(-m // g)
+    threads = self.device.num_process_threads()
+    local = threads == None or g <= threads
+    if not local and uses_chans(node.stmt):
+      vmsg(v, '  replicator at {} cannot be divided into chunks of {}'
+          .format(node.coord, g))
+      return False
+    vmsg(v, '  replicator at {}: {} processes in {} chunks of {}{}'.format(
+      node.coord, m, n, g, ' (threads)' if local else ''))
+
+    # The offset of each process is (_g*g)+k, for chunk _g
+    index = elem_index('_g', n, True)
+    self.declare(index)
+    def offset(k):
+      return ast.ExprBinop('+', ast.ElemGroup(ast.ExprBinop('*',
+        elem_id(index), num(g))), ast.ExprSingle(k))
+    def process(k):
+      s = self.process(node, offset(k))
+      if m % g == 0 or (isinstance(k, ast.ElemNumber)
+          and ((n-1)*g) + k.value < m):
+        return s
+      cond = ast.ExprBinop('<', ast.ElemGroup(offset(copy.deepcopy(k))),
+          num(m))
+      return ast.StmtIf(cond, s, ast.StmtSkip(node.coord), node.coord)
+    if local:
+      node.stmt = ast.StmtPar([], [process(ast.ElemNumber(k))
+        for k in range(g)], False, node.coord)
+    else:
+      k = elem_index('_k', g, False)
+      decl = ast.VarDecl(k.name, T_VAR_SINGLE, None)
+      decl.symbol = k.symbol
+      node.stmt = ast.StmtSeq([decl], [ast.StmtFor(k, process(elem_id(k)),
+        node.coord)], node.coord)
+    node.indices = [index]
+    return True
+
+  def declare(self, index):
+    """
+    Declare the chunk index in the block of 'main' (once, for every
+    replicator divided), as a replicator index is declared in the source.
+    """
+    if self.symbol != None:
+      index.symbol = self.symbol
+      return
+    self.symbol = index.symbol
+    decl = ast.VarDecl(index.name, T_VAR_SINGLE, None)
+    decl.symbol = index.symbol
+    stmt = self.main.stmt
+    if isinstance(stmt, ast.StmtSeq) or isinstance(stmt, ast.StmtPar):
+      stmt.decls.append(decl)
+    else:
+      self.main.stmt = ast.StmtSeq([decl], [stmt], stmt.coord)
+
+  def process(self, node, w):
+    """
+    Return a copy of the process of a replicator at offset w of the combined
+    index, with each index i_j = b_j + ((w / s_j) rem n_j), where s_j is the
+    product of the counts of the indices following it.
+    """
+    s = copy.deepcopy(node.stmt)
+    dims = [x.count_value for x in node.indices]
+    for (j, x) in enumerate(node.indices):
+      e = w
+      stride = reduce(lambda a, b: a*b, dims[j+1:], 1)
+      if stride > 1:
+        e = ast.ExprBinop('/', ast.ElemGroup(e), num(stride))
+      if j > 0:
+        e = ast.ExprBinop('rem', ast.ElemGroup(e), num(dims[j]))
+      if x.base_value != 0:
+        e = ast.ExprBinop('+', ast.ElemGroup(e), num(x.base_value))
+      s.accept(SubIndex(ast.ElemId(x.name), e))
+    return s
+
+  # Statements containing statements
+
+  def stmt_rep(self, node):
+    self.reps.append(node)
+
+  def stmt_seq(self, node):
+    [self.stmt(x) for x in node.stmt]
+
+  def stmt_par(self, node):
+    [self.stmt(x) for x in node.stmt]
+
+  def stmt_server(self, node):
+    self.stmt(node.server)
+    self.stmt(node.client)
+
+  def stmt_if(self, node):
+    self.stmt(node.thenstmt)
+    self.stmt(node.elsestmt)
+
+  def stmt_while(self, node):
+    self.stmt(node.stmt)
+
+  def stmt_for(self, node):
+    self.stmt(node.stmt)
+
+  def stmt_on(self, node):
+    self.stmt(node.stmt)
+
+  # Statements not containing statements
+
+  def stmt_pcall(self, node):
+    pass
+
+  def stmt_ass(self, node):
+    pass
+
+  def stmt_in(self, node):
+    pass
+
+  def stmt_out(self, node):
+    pass
+
+  def stmt_in_tag(self, node):
+    pass
+
+  def stmt_out_tag(self, node):
+    pass
+
+  def stmt_alias(self, node):
+    pass
+
+  def stmt_connect(self, node):
+    pass
+
+  def stmt_assert(self, node):
+    pass
+
+  def stmt_return(self, node):
+    pass
+
+  def stmt_skip(self, node):
+    pass
+
+
+class SubIndex(SubElem):
+  """
+  Substitute an index with a copy of an expression at each use.
+  """
+  def substitute(self, elem):
+    e = super().substitute(elem)
+    return copy.deepcopy(e) if e is not elem else e
+
+
+class CountProcs(InsertOns):
+  """
+  Count the processors InsertOns would use, without inserting any ons.
+  """
+  def on(self, d, stmt):
+    return stmt
+
+  def stmt_par(self, node, parent, d):
+    distribute = node.distribute
+    e = super().stmt_par(node, parent, d)
+    node.distribute = distribute
+    return e
+
+  def stmt_server(self, node, parent, d):
+    distribute = node.distribute
+    e = super().stmt_server(node, parent, d)
+    node.distribute = distribute
+    return e
+
+
+class Chans(ast.NodeVisitor):
+  """
+  Find whether a statement uses a channel.
+  """
+  def __init__(self):
+    self.found = False
+
+  def visit_elem_id(self, node):
+    if node.symbol != None and node.symbol.type in CHAN_TYPES:
+      self.found = True
+
+  visit_elem_sub = visit_elem_id
+  visit_elem_slice = visit_elem_id
+
+
+def uses_chans(stmt):
+  c = Chans()
+  stmt.accept(c)
+  return c.found
+
+def processes(node):
+  return reduce(lambda x, y: x*y.count_value, node.indices, 1)
+
+def num(n):
+  return ast.ExprSingle(ast.ElemNumber(n))
+
+def elem_index(name, count, distributed):
+  """
+  Return a new index over [0 for count].
+  """
+  x = ast.ElemIndexRange(name, num(0), num(count))
+  x.distributed = distributed
+  x.base_value = 0
+  x.count_value = count
+  x.symbol = Symbol(name, T_VAR_SINGLE, None, scope=T_SCOPE_BLOCK)
+  x.symbol.mark = True
+  return x
+
+def elem_id(index):
+  e = ast.ElemId(index.name)
+  e.symbol = index.symbol
+  return e
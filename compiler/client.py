@@ -0,0 +1,137 @@
+#! /usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# A thin client for the compile server (see server.py). This is deliberately
+# independent of the rest of the compiler so that it starts quickly: it sends
+# the arguments and input files to the server and writes back the artifacts
+# and diagnostics it receives.
+
+import sys
+import os
+import json
+import base64
+import socket
+import struct
+import tempfile
+
+SOCKET_ENV = 'SIRE_SOCKET'
+HEADER = struct.Struct('!I')
+
+# The options of the compiler (see main.setup_argparse) followed by a value,
+# and those that may be, with the values they take.
+VALUE_OPTIONS = set(['-o', '-t', '-n', '-j', '--val', '--work-dir',
+  '--rep-fanout', '--grain', '--batch', '--ranks-per-host'])
+OPTIONAL_VALUES = {'--stats': ['text', 'json']}
+
+def default_socket():
+  """
+  The socket path used if none is specified.
+  """
+  if SOCKET_ENV in os.environ and os.environ[SOCKET_ENV]:
+    return os.environ[SOCKET_ENV]
+  return os.path.join(tempfile.gettempdir(),
+      'sire-{}.sock'.format(os.getuid()))
+
+def encode_file(filename):
+  with open(filename, 'rb') as f:
+    return base64.b64encode(f.read()).decode('ascii')
+
+def decode_file(filename, data):
+  d = os.path.dirname(filename)
+  if d and not os.path.isdir(d):
+    os.makedirs(d)
+  with open(filename, 'wb') as f:
+    f.write(base64.b64decode(data.encode('ascii')))
+
+def send_msg(conn, msg):
+  """
+  Send a message as a length-prefixed JSON object.
+  """
+  data = json.dumps(msg).encode('utf-8')
+  conn.sendall(HEADER.pack(len(data)) + data)
+
+def recv_exactly(conn, n):
+  buf = b''
+  while len(buf) < n:
+    s = conn.recv(n - len(buf))
+    if not s:
+      raise EOFError('connection closed')
+    buf += s
+  return buf
+
+def recv_msg(conn):
+  """
+  Receive a length-prefixed JSON object.
+  """
+  (n,) = HEADER.unpack(recv_exactly(conn, HEADER.size))
+  return json.loads(recv_exactly(conn, n).decode('utf-8'))
+
+def inputs(args):
+  """
+  Return the indices of the positional arguments (input files), skipping the
+  values of options.
+  """
+  l = []
+  i = 0
+  while i < len(args):
+    x = args[i]
+    if x in VALUE_OPTIONS:
+      i += 1
+    elif x in OPTIONAL_VALUES:
+      if i+1 < len(args) and args[i+1] in OPTIONAL_VALUES[x]:
+        i += 1
+    elif not x.startswith('-'):
+      l.append(i)
+    i += 1
+  return l
+
+def request(args, path=None):
+  """
+  Build a request from command line arguments. Each positional argument naming
+  an existing file is sent as an input file, with its index in the arguments.
+  If there is no input file, the contents of stdin are sent.
+  """
+  outfile = None
+  files = []
+  for (i, x) in enumerate(args):
+    if i > 0 and args[i-1] == '-o':
+      outfile = x
+  for i in inputs(args):
+    if os.path.isfile(args[i]):
+      files.append([i, args[i], encode_file(args[i])])
+  req = {'args': args, 'files': files, 'outfile': outfile}
+  if not files:
+    req['stdin'] = sys.stdin.read()
+  return req
+
+def compile_remote(args, path=None):
+  """
+  Send a compilation request to the server and write out the results. Return
+  the exit status of the compilation.
+  """
+  path = path if path else default_socket()
+  conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    conn.connect(path)
+    send_msg(conn, request(args))
+    resp = recv_msg(conn)
+  finally:
+    conn.close()
+
+  sys.stdout.write(resp['stdout'])
+  sys.stderr.write(resp['stderr'])
+  for (name, data) in resp['files'].items():
+    decode_file(name, data)
+  return resp['status']
+
+if __name__ == '__main__':
+  try:
+    sys.exit(compile_remote(sys.argv[1:]))
+  except (socket.error, EOFError) as e:
+    sys.stderr.write('Error: could not contact compile server at {}: {}\n'
+        .format(default_socket(), e))
+    sys.exit(1)
@@ -6,76 +6,120 @@
 from walker import NodeWalker
 import ast
 
-class CmpExpr(NodeWalker):
+# Expressions are compared by a canonical key: a small integer identifying the
+# structure of the expression, where expressions that differ only by grouping
+# parentheses, or by the order of the operands of commutative operators, have
+# the same key. Keys are hash-consed: each distinct structure, described in
+# terms of the keys of its subexpressions, is numbered once in a table, so
+# computing the key of a node is linear in its size, and comparing or hashing
+# keys is constant time. The key of a node is cached in its 'key' attribute;
+# this remains valid as long as the expression is not modified.
+
+# Operators whose operands can be reordered
+COMMUTATIVE = set(['+', '*', 'and', 'or', 'xor', '=', '~='])
+
+# Commutative operators whose nested applications can be flattened
+ASSOCIATIVE = set(['+', '*', 'and', 'or', 'xor'])
+
+# The key of each distinct structure
+_table = {}
+
+def intern(structure):
+  k = _table.get(structure)
+  if k == None:
+    k = _table[structure] = len(_table)
+  return k
+
+def expr_key(node):
+  """
+  Return the canonical key of an expression or element.
+  """
+  try:
+    return node.key
+  except AttributeError:
+    node.key = _walker.key(node)
+    return node.key
+
+def cmp_expr(a, b):
   """
   Compare two expressions for equality.
   """
+  return expr_key(a) == expr_key(b)
+
+class ExprKey(NodeWalker):
+  """
+  Compute the canonical key of an expression or element.
+  """
   def __init__(self):
     pass
 
+  def key(self, node):
+    return self.expr(node) if isinstance(node, ast.Expr) else self.elem(node)
+
+  def operands(self, op, node, keys):
+    """
+    Collect the keys of the operands of a chain of applications of an
+    associative operator 'op', through any grouping.
+    """
+    while isinstance(node, ast.ElemGroup) or isinstance(node, ast.ExprSingle):
+      node = node.expr if isinstance(node, ast.ElemGroup) else node.elem
+    if isinstance(node, ast.ExprBinop) and node.op == op:
+      self.operands(op, node.elem, keys)
+      self.operands(op, node.right, keys)
+    else:
+      keys.append(expr_key(node))
+    return keys
+
   # Expressions =========================================
 
-  def expr_single(self, node, expr):
-    return (isinstance(expr, type(node))
-        and self.elem(node.elem, expr.elem))
-
-  def expr_unary(self, node, expr):
-    return (isinstance(expr, type(node))
-        and (node.op == expr.op
-        and self.elem(node.elem, expr.elem)))
-
-  def expr_binop(self, node, expr):
-    return (isinstance(expr, type(node))
-        and node.op == expr.op
-        and self.elem(node.elem, expr.elem) 
-        and self.expr(node.right, expr.right))
-  
-  # Elements= ===========================================
-
-  def elem_group(self, node, expr):
-    return (isinstance(expr, type(node))
-        and self.expr(node.expr, expr.expr))
-
-  def elem_id(self, node, expr):
-    return (isinstance(expr, type(node))
-        and node.name == expr.name)
-    
-  def elem_sub(self, node, expr):
-    return (isinstance(expr, type(node))
-        and node.name == expr.name 
-        and self.expr(node.expr, expr.expr))
-
-  def elem_slice(self, node, expr):
-    return (isinstance(expr, type(node))
-        and node.name == expr.name 
-        and self.expr(node.base, expr.base)
-        and self.expr(node.count, expr.count))
-
-  def elem_index_range(self, node, expr):
-    return (isinstance(expr, type(node))
-        and node.name == expr.name 
-        and self.expr(node.base, expr.base)
-        and self.expr(node.count, expr.count))
-
-  def elem_fcall(self, node, expr):
-    return (isinstance(expr, type(node))
-        and node.name == expr.name 
-        and len(node.args) == len(expr.args) 
-        and all([self.expr(x, y) for x, y in zip(node.args, expr.args)]))
-
-  def elem_number(self, node, expr):
-    return (isinstance(expr, type(node))
-        and node.value == expr.value)
-
-  def elem_boolean(self, node, expr):
-    return (isinstance(expr, type(node))
-        and node.value == expr.value)
-
-  def elem_string(self, node, expr):
-    return (isinstance(expr, type(node))
-        and node.value == expr.value)
-
-  def elem_char(self, node, expr):
-    return (isinstance(expr, type(node)) 
-        and node.value == expr.value)
+  def expr_single(self, node):
+    return expr_key(node.elem)
+
+  def expr_unary(self, node):
+    return intern(('unary', node.op, expr_key(node.elem)))
+
+  def expr_binop(self, node):
+    if node.op in ASSOCIATIVE:
+      keys = self.operands(node.op, node, [])
+    else:
+      keys = [expr_key(node.elem), expr_key(node.right)]
+    if node.op in COMMUTATIVE:
+      keys.sort()
+    return intern(('binop', node.op) + tuple(keys))
+
+  # Elements ============================================
+
+  def elem_group(self, node):
+    return expr_key(node.expr)
+
+  def elem_id(self, node):
+    return intern(('id', node.name))
+
+  def elem_sub(self, node):
+    return intern(('sub', node.name, expr_key(node.expr)))
+
+  def elem_slice(self, node):
+    return intern(('slice', node.name,
+        expr_key(node.base), expr_key(node.count)))
+
+  def elem_index_range(self, node):
+    return intern(('index_range', node.name,
+        expr_key(node.base), expr_key(node.count)))
+
+  def elem_fcall(self, node):
+    return intern(('fcall', node.name)
+        + tuple([expr_key(x) for x in node.args]))
+
+  def elem_number(self, node):
+    return intern(('number', node.value))
+
+  def elem_boolean(self, node):
+    return intern(('boolean', node.value))
+
+  def elem_string(self, node):
+    return intern(('string', node.value))
+
+  def elem_char(self, node):
+    return intern(('char', node.value))
 
+_walker = ExprKey()
@@ -7,6 +7,8 @@ import io
 
 import util
 import config
+import stats
+import transcache
 import definitions as defs
 from util import vmsg
 from util import vhdr
@@ -38,6 +40,8 @@ def translate(ast, sig, child, device, outfile, translate_only, v):
     walker = TranslateMPI(sig, child, buf)
 
   walker.walk_program(ast)
+  if transcache.enabled:
+    transcache.report()
   
   if translate_only:
     outfile = (outfile if outfile!=defs.DEFAULT_OUT_FILE else
@@ -49,7 +53,8 @@ def translate(ast, sig, child, device, outfile, translate_only, v):
   return buf
 
 def build(sig, buf, device, outfile, 
-    compile_only, display_memory, show_calls, save_temps, v):
+    compile_only, display_memory, show_calls, save_temps, v, num_jobs=1,
+    work_dir=None):
   """ 
   Compile the translated AST for the target system.
   """
@@ -58,13 +63,15 @@ def build(sig, buf, device, outfile,
   # Create a Build object
   if device.system == SYSTEM_TYPE_XS1:
     build_xs1(sig, device, buf, outfile, 
-        compile_only, display_memory, show_calls, save_temps, v)
+        compile_only, display_memory, show_calls, save_temps, v, num_jobs,
+        work_dir)
   elif device.system == SYSTEM_TYPE_MPI:
-    build_mpi(device, buf, outfile, compile_only, show_calls, v)
+    build_mpi(device, buf, outfile, compile_only, show_calls, v, num_jobs,
+        work_dir)
 
 def generate(ast, sig, child, device, outfile, 
     translate_only, compile_only, display_memory, 
-    show_calls, save_temps, v):
+    show_calls, save_temps, v, num_jobs=1, work_dir=None):
   """ 
   Generate code intermediate/machine/binary from AST.
   """
@@ -76,9 +83,11 @@ def generate(ast, sig, child, device, outfile,
     defs.load(config.MPI_SYSTEM_PATH+'/'+DEFS_FILE)
   
   # Translate the AST
-  buf = translate(ast, sig, child, device, outfile, translate_only, v)
+  with stats.stage('Translate', ast):
+    buf = translate(ast, sig, child, device, outfile, translate_only, v)
   
   # Compile, assemble and link with the runtime
-  build(sig, buf, device, outfile, compile_only, display_memory, 
-      show_calls, save_temps, v)
+  with stats.stage('Build'):
+    build(sig, buf, device, outfile, compile_only, display_memory, 
+        show_calls, save_temps, v, num_jobs, work_dir)
 
@@ -0,0 +1,382 @@
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+from functools import reduce
+
+import ast
+
+# Recognition of patterns in the connections made by a channel array
+# subscript in a replicator. For each value v of the combined replicator
+# index, an element has a target location t(v), a connection id c(v) and is
+# either the master or the slave end. Rather than selecting each element with
+# a conditional statement, t and c are classified as one of the following
+# closed forms, where w is the offset of v from the start of the range:
+#  - constant:  a
+#  - linear:    a + b*w
+#  - butterfly: a + b*(v xor m), e.g. the neighbours in a hypercube
+#  - strided:   a + b*(w/k) + c*(w rem k), e.g. the parent in a k-ary tree
+#  - mesh:      a + sum_j b_j*((d_j + o_j) rem n_j), where d_j is the jth
+#               index of the replicator (with count n_j) and o_j is 0, 1 or
+#               -1, e.g. the neighbours in a 2D or 3D (toroidal) mesh.
+# Whether an element is the master is either constant or given by a bit of v.
+# A few elements that do not fit an otherwise regular range (such as the node
+# at the root of a tree) are made exceptions and connected individually. Where
+# no single form fits, the range is split into segments with a constant master
+# and each of these is classified.
+
+# The most exceptions allowed in a segment
+MAX_EXCEPTIONS = 2
+
+class Pattern(object):
+  """
+  A closed form of the values at a range of points.
+  """
+  def expr(self, v, start):
+    """
+    Return an expression for the value, given an element 'v' evaluating to
+    the combined index and the start of the range.
+    """
+    pass
+
+  def value(self, v, start):
+    """
+    Return the value at the point 'v'.
+    """
+    pass
+
+class Constant(Pattern):
+  name = 'constant'
+
+  def __init__(self, a):
+    self.a = a
+
+  @staticmethod
+  def fit(vs, ts, dims):
+    if all(x == ts[0] for x in ts):
+      return Constant(ts[0])
+    return None
+
+  def expr(self, v, start):
+    return number(self.a)
+
+  def value(self, v, start):
+    return self.a
+
+class Linear(Pattern):
+  name = 'linear'
+
+  def __init__(self, a, b):
+    self.a = a
+    self.b = b
+
+  @staticmethod
+  def fit(vs, ts, dims):
+    if len(ts) < 2:
+      return None
+    (a, b) = (ts[0], ts[1] - ts[0])
+    if all(t == a + b*(x - vs[0]) for (x, t) in zip(vs, ts)):
+      return Linear(a, b)
+    return None
+
+  def expr(self, v, start):
+    return affine(self.a, [(self.b, offset(v, start))])
+
+  def value(self, v, start):
+    return self.a + self.b*(v - start)
+
+class Butterfly(Pattern):
+  name = 'butterfly'
+
+  def __init__(self, a, b, m):
+    self.a = a
+    self.b = b
+    self.m = m
+
+  @staticmethod
+  def fit(vs, ts, dims):
+    if len(ts) < 2 or min(vs) < 0:
+      return None
+    for j in range(max(vs).bit_length() + 1):
+      m = 1 << j
+      (u0, u1) = (vs[0] ^ m, vs[1] ^ m)
+      if (ts[1] - ts[0]) % (u1 - u0) != 0:
+        continue
+      b = (ts[1] - ts[0]) // (u1 - u0)
+      a = ts[0] - (b * u0)
+      if b != 0 and all(t == a + b*(x ^ m) for (x, t) in zip(vs, ts)):
+        return Butterfly(a, b, m)
+    return None
+
+  def expr(self, v, start):
+    return affine(self.a, [(self.b, binop('xor', ast.ExprSingle(v), number(self.m)))])
+
+  def value(self, v, start):
+    return self.a + self.b*(v ^ self.m)
+
+class Strided(Pattern):
+  name = 'strided'
+
+  def __init__(self, a, b, c, k):
+    self.a = a
+    self.b = b
+    self.c = c
+    self.k = k
+
+  @staticmethod
+  def fit(vs, ts, dims):
+    if len(ts) < 3:
+      return None
+    c = ts[1] - ts[0]
+    k = 2
+    while k < len(ts) and ts[k] - ts[k-1] == c:
+      k += 1
+    if k == len(ts):
+      return None
+    (a, b) = (ts[0], ts[k] - ts[0])
+    if all(t == a + b*((x - vs[0]) // k) + c*((x - vs[0]) % k)
+        for (x, t) in zip(vs, ts)):
+      return Strided(a, b, c, k)
+    return None
+
+  def expr(self, v, start):
+    w = offset(v, start)
+    return affine(self.a, [
+      (self.b, binop('/', w, number(self.k))),
+      (self.c, binop('rem', w, number(self.k)))])
+
+  def value(self, v, start):
+    return self.a + self.b*((v - start) // self.k) + self.c*((v - start) % self.k)
+
+class Mesh(Pattern):
+  name = 'mesh'
+
+  def __init__(self, a, terms, dims):
+    self.a = a
+    self.terms = terms
+    self.dims = dims
+
+  @staticmethod
+  def fit(vs, ts, dims):
+    n = reduce(lambda x, y: x*y, dims, 1)
+    if len(ts) != n or n < 2 or vs[-1] - vs[0] != n - 1:
+      return None
+    strides = [reduce(lambda x, y: x*y, dims[i+1:], 1)
+        for i in range(len(dims))]
+    digits = [[((x - vs[0]) // s) % d for (s, d) in zip(strides, dims)]
+        for x in vs]
+    for offsets in neighbours(dims):
+      # The points where the transformed digits are 0 and each unit vector
+      zero = sum([((d - o) % d) * s
+          for (o, d, s) in zip(offsets, dims, strides)])
+      a = ts[zero]
+      terms = []
+      for (j, (o, d, s)) in enumerate(zip(offsets, dims, strides)):
+        if d > 1:
+          b = ts[zero - (((d - o) % d) * s) + (((1 - o) % d) * s)] - a
+          terms.append((b, o, d, s, j))
+      if all(t == a + sum([b*((ds[j] + o) % d) for (b, o, d, s, j) in terms])
+          for (ds, t) in zip(digits, ts)):
+        return Mesh(a, terms, dims)
+    return None
+
+  def expr(self, v, start):
+    w = offset(v, start)
+    ts = []
+    for (b, o, d, s, j) in self.terms:
+      e = binop('/', w, number(s)) if s > 1 else w
+      if j > 0:
+        e = binop('rem', e, number(d))
+      if o != 0:
+        e = binop('rem', binop('+', e, number(o)), number(d))
+      ts.append((b, e))
+    return affine(self.a, ts)
+
+  def value(self, v, start):
+    x = self.a
+    for (b, o, d, s, j) in self.terms:
+      x += b*((((v - start) // s) % d + o) % d)
+    return x
+
+# Forms in the order they are tried
+PATTERNS = [Constant, Linear, Butterfly, Strided, Mesh]
+
+class Bit(object):
+  """
+  A master/slave selection by bit 'm' of the combined index: the master when
+  the bit is 'value' (0 or 1).
+  """
+  def __init__(self, m, value):
+    self.m = m
+    self.value = value
+
+  @staticmethod
+  def fit(vs, ms):
+    if len(vs) < 2 or min(vs) < 0:
+      return None
+    for j in range(max(vs).bit_length()):
+      m = 1 << j
+      for value in [0, 1]:
+        if all(y == ((x & m != 0) == (value == 1)) for (x, y) in zip(vs, ms)):
+          return Bit(m, value)
+    return None
+
+  def expr(self, v):
+    return binop('=', binop('and', ast.ExprSingle(v), number(self.m)),
+        number(self.m if self.value else 0))
+
+class Segment(object):
+  """
+  A range of the combined index [start, end] with patterns for the target
+  location and connection id, a master (a boolean or a Bit) and a list of
+  single-element Segments for any exceptions. The patterns are relative to
+  'base', the first element that is not an exception.
+  """
+  def __init__(self, start, end, target, connid, master, exceptions=None,
+      base=None):
+    self.start = start
+    self.end = end
+    self.target = target
+    self.connid = connid
+    self.master = master
+    self.exceptions = exceptions if exceptions != None else []
+    self.base = base if base != None else start
+
+def neighbours(dims):
+  """
+  Yield each combination of the offsets 0, 1 and -1 in each dimension.
+  """
+  if not dims:
+    yield []
+    return
+  for x in neighbours(dims[1:]):
+    for o in sorted(set([0, 1 % dims[0], (dims[0] - 1) % dims[0]])):
+      yield [o] + x
+
+def fit(vs, ts, dims):
+  """
+  Return the first pattern to fit the values 'ts' at the points 'vs', or
+  None.
+  """
+  for x in PATTERNS:
+    p = x.fit(vs, ts, dims)
+    if p != None:
+      return p
+  return None
+
+def outliers(vs, ts):
+  """
+  Return the set of positions of the values 'ts' that differ from the first
+  pattern to fit the second half of them, or None.
+  """
+  h = len(ts) // 2
+  for x in PATTERNS:
+    p = x.fit(vs[h:], ts[h:], [len(ts) - h])
+    if p != None:
+      return set([i for (i, (x, t)) in enumerate(zip(vs, ts))
+          if p.value(x, vs[h]) != t])
+  return None
+
+def segment(rows, dims):
+  """
+  Return a Segment for a contiguous list of (v, target, connid, master), or
+  None if its target and connection id cannot be classified.
+  """
+  vs = [x[0] for x in rows]
+  ms = [x[3] for x in rows]
+  if all(x == ms[0] for x in ms):
+    master = ms[0]
+  else:
+    master = Bit.fit(vs, ms)
+    if master == None:
+      return None
+  target = fit(vs, [x[1] for x in rows], dims)
+  connid = fit(vs, [x[2] for x in rows], dims) if target != None else None
+  if target != None and connid != None:
+    return Segment(vs[0], vs[-1], target, connid, master)
+
+  # Otherwise, remove any outliers and classify the remaining elements
+  if len(rows) < 4:
+    return None
+  a = outliers(vs, [x[1] for x in rows])
+  b = outliers(vs, [x[2] for x in rows]) if a != None else None
+  if a == None or b == None or len(a | b) > MAX_EXCEPTIONS:
+    return None
+  rest = [x for (i, x) in enumerate(rows) if not i in (a | b)]
+  vs = [x[0] for x in rest]
+  target = fit(vs, [x[1] for x in rest], [len(rest)])
+  connid = fit(vs, [x[2] for x in rest], [len(rest)])
+  if target == None or connid == None:
+    return None
+  return Segment(rows[0][0], rows[-1][0], target, connid, master,
+      [segment([rows[i]], [1]) for i in sorted(a | b)], vs[0])
+
+def classify(rows, dims):
+  """
+  Given a list of (v, target, connid, master) for each element, in increasing
+  order of v, return a list of Segments covering them, or None if no compact
+  classification is found. 'dims' are the counts of each replicator index.
+  """
+  s = segment(rows, dims)
+  if s != None:
+    return [s]
+
+  # Split the range where the master changes, then try separating the first
+  # or last element of each part
+  runs = [[rows[0]]]
+  for x in rows[1:]:
+    if x[3] == runs[-1][-1][3]:
+      runs[-1].append(x)
+    else:
+      runs.append([x])
+  segments = []
+  for x in runs:
+    s = segment(x, [len(x)])
+    if s != None:
+      segments.append(s)
+      continue
+    (a, b) = (segment(x[:1], [1]), segment(x[1:], [len(x)-1]))
+    if a == None or b == None:
+      (a, b) = (segment(x[:-1], [len(x)-1]), segment(x[-1:], [1]))
+    if a == None or b == None:
+      return None
+    segments += [a, b]
+  if sum([1 + len(x.exceptions) for x in segments]) > len(rows) // 2:
+    return None
+  return segments
+
+# Expression construction ===============================
+
+def number(x):
+  return ast.ExprSingle(ast.ElemNumber(x))
+
+def binop(op, a, b):
+  """
+  Apply a binary operator to two expressions, grouping them as necessary.
+  """
+  a = a.elem if isinstance(a, ast.ExprSingle) else ast.ElemGroup(a)
+  if not isinstance(b, ast.ExprSingle):
+    b = ast.ExprSingle(ast.ElemGroup(b))
+  return ast.ExprBinop(op, a, b)
+
+def offset(v, start):
+  """
+  Return an expression for the offset of the index from the start.
+  """
+  e = ast.ExprSingle(v)
+  return binop('-', e, number(start)) if start != 0 else e
+
+def affine(a, terms):
+  """
+  Return an expression for a + b_1*e_1 + ... + b_n*e_n, omitting zero terms.
+  """
+  e = None
+  for (b, x) in terms:
+    if b == 0:
+      continue
+    t = x if b == 1 else binop('*', number(b), x)
+    e = t if e == None else binop('+', e, t)
+  if e == None:
+    return number(a)
+  return binop('+', e, number(a)) if a != 0 else e
@@ -16,7 +16,19 @@ SYS_NUM_CORES_LOG_CONST  = 'NUM_CORES_LOG'
 SYS_NUM_CORES_SQRT_CONST = 'NUM_CORES_SQRT'
 MAX_PROC_PARAMETERS      = 10
 LABEL_MAIN               = '_main'
+
+# Distribution of replicators
+DEFAULT_REP_FANOUT       = 2
+REP_FANOUT_AUTO          = 'auto'
+
+# Static work estimates (see estimate.py)
+WORK_LOOP_TRIPS          = 10
+WORK_RECURSION           = 10
+WORK_COMM                = 10
                     
+# Definitions read from header files, by path
+loaded                   = {}
+
 # Type enumerations for connect
 CONNECT_MASTER           = 0
 CONNECT_SLAVE            = 1
@@ -39,20 +51,30 @@ def convert_value(s):
   else:
     return s
 
+def read(path):
+  """
+  Read the definitions from a c header file into a dictionary. The result is
+  kept so that each file is only read once.
+  """
+  if not path in loaded:
+    d = {}
+    lines = util.read_file(path, read_lines=True)
+    if lines:
+      for x in lines:
+        frags = x.split()
+        if len(frags) == 3:
+          if frags[0] == '#define':
+            d[frags[1]] = convert_value(frags[2])
+    loaded[path] = d
+  return loaded[path]
+
 def load(path):
   """ 
   Load definitions from a c header file.
   """
-  lines = util.read_file(path, read_lines=True)
-  if lines:
-    for x in lines:
-      frags = x.split()
-      if len(frags) == 3:
-        if frags[0] == '#define':
-          s = convert_value(frags[2])
-          globals()[frags[1]] = s
-          #print("Set global {} = {} ({})".format(frags[1], s, s.__class__.__name__))
+  d = read(path)
+  if d:
+    globals().update(d)
     return True
   else:
     return False
-
@@ -0,0 +1,168 @@
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+import copy
+from functools import reduce
+
+import ast
+import definitions as defs
+from walker import NodeWalker
+from evalexpr import EvalExpr
+from subelem import SubElem
+
+class EstimateWork(NodeWalker):
+  """
+  Estimate the work of a statement, in units of simple statements. Loops are
+  weighted by their trip counts, where these can be evaluated (otherwise
+  WORK_LOOP_TRIPS), channel communications by WORK_COMM, and calls by the
+  work of the procedure called, with the values of its constant arguments.
+  The work of each procedure is found once for each set of values, following
+  the call graph; a call back to a procedure being estimated counts nothing,
+  and the work of each procedure in the cycle is then multiplied by
+  WORK_RECURSION. The work of a procedure that counted a call back to
+  another still being estimated is only kept until that one is done.
+  """
+  def __init__(self, defs):
+    self.defs = dict([(x.name, x) for x in defs])
+    self.procs = {}
+    self.active = []
+    self.recursive = set()  # Positions in active of procedures in a cycle
+    self.env = {}
+    self.deps = set()
+    self.provisional = {}
+
+  def proc(self, name, args=[]):
+    """
+    Return the work of a call to a procedure.
+    """
+    d = self.defs.get(name)
+    if d == None or d.stmt == None:
+      return 1
+    values = [self.value(x) for x in args]
+    env = dict([(x.name, y) for (x, y) in zip(d.formals, values)
+        if isinstance(y, int)])
+    key = (name, tuple(sorted(env.items())))
+    if key in self.procs:
+      return self.procs[key]
+    if name in self.active:
+      i = self.active.index(name)
+      self.recursive.update(range(i, len(self.active)))
+      self.deps.add(i)
+      return 0
+    (self.env, env) = (env, self.env)
+    (self.deps, deps) = (set(), self.deps)
+    self.active.append(name)
+    w = 1 + self.stmt(d.stmt)
+    self.active.pop()
+    self.env = env
+    n = len(self.active)
+    if n in self.recursive:
+      self.recursive.remove(n)
+      w *= defs.WORK_RECURSION
+    self.procs[key] = w
+    # Forget the procedures that counted a call back to this one, and keep
+    # this one only until those it counted a call back to are done
+    [self.procs.pop(x) for x in self.provisional.pop(n, [])]
+    self.deps.discard(n)
+    if self.deps:
+      self.provisional.setdefault(max(self.deps), []).append(key)
+    self.deps |= deps
+    return w
+
+  def value(self, expr):
+    """
+    Evaluate an expression with the values of the arguments of the procedure
+    being estimated, or return None.
+    """
+    if self.env:
+      expr = copy.deepcopy(expr)
+      for (x, y) in self.env.items():
+        expr.accept(SubElem(ast.ElemId(x), ast.ElemNumber(y)))
+    return EvalExpr().expr(expr)
+
+  def calls(self, *nodes):
+    """
+    Return the work of the function calls in some expressions.
+    """
+    c = Calls()
+    [x.accept(c) for x in nodes if x != None]
+    return sum([self.proc(x.name, x.args) for x in c.calls])
+
+  # Statements containing statements
+
+  def stmt_seq(self, node):
+    return sum([self.stmt(x) for x in node.stmt])
+
+  def stmt_par(self, node):
+    return sum([self.stmt(x) for x in node.stmt])
+
+  def stmt_server(self, node):
+    return self.stmt(node.server) + self.stmt(node.client)
+
+  def stmt_rep(self, node):
+    n = reduce(lambda x, y: x*y.count_value, node.indices, 1)
+    return n * self.stmt(node.stmt)
+
+  def stmt_on(self, node):
+    return self.stmt(node.stmt)
+
+  def stmt_if(self, node):
+    return (1 + self.calls(node.cond)
+        + max(self.stmt(node.thenstmt), self.stmt(node.elsestmt)))
+
+  def stmt_while(self, node):
+    return defs.WORK_LOOP_TRIPS * (1 + self.calls(node.cond)
+        + self.stmt(node.stmt))
+
+  def stmt_for(self, node):
+    n = self.value(node.index.count)
+    n = n if isinstance(n, int) and n >= 0 else defs.WORK_LOOP_TRIPS
+    return n * (1 + self.stmt(node.stmt))
+
+  # Statements not containing statements
+
+  def stmt_pcall(self, node):
+    return self.proc(node.name, node.args) + self.calls(*node.args)
+
+  def stmt_ass(self, node):
+    return 1 + self.calls(node.expr)
+
+  def stmt_in(self, node):
+    return defs.WORK_COMM
+
+  def stmt_out(self, node):
+    return defs.WORK_COMM + self.calls(node.expr)
+
+  def stmt_in_tag(self, node):
+    return defs.WORK_COMM
+
+  def stmt_out_tag(self, node):
+    return defs.WORK_COMM + self.calls(node.expr)
+
+  def stmt_connect(self, node):
+    return defs.WORK_COMM
+
+  def stmt_alias(self, node):
+    return 1
+
+  def stmt_assert(self, node):
+    return 1 + self.calls(node.expr)
+
+  def stmt_return(self, node):
+    return 1 + self.calls(node.expr)
+
+  def stmt_skip(self, node):
+    return 0
+
+
+class Calls(ast.NodeVisitor):
+  """
+  Collect the function calls in an expression.
+  """
+  def __init__(self):
+    self.calls = []
+
+  def visit_elem_fcall(self, node):
+    self.calls.append(node)
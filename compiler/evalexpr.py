@@ -29,10 +29,7 @@ class EvalExpr(NodeWalker):
     if a == None:
       return None
 
-    if   node.op == '-': return -a
-    elif node.op == '~': return ~a
-    else:
-      assert 0
+    return unop(node.op, a)
 
   def expr_binop(self, node):
     
@@ -42,24 +39,7 @@ class EvalExpr(NodeWalker):
     if a == None or b == None:
       return None
     
-    if   node.op == '+':   return a + b
-    elif node.op == '-':   return a - b 
-    elif node.op == '*':   return a * b
-    elif node.op == '/':   return floor(a / b)
-    elif node.op == 'rem': return floor(a % b)
-    elif node.op == 'or':  return a | b
-    elif node.op == 'and': return a & b
-    elif node.op == 'xor': return a ^ b
-    elif node.op == '<<':  return a << b
-    elif node.op == '>>':  return a >> b
-    elif node.op == '<':   return 1 if a < b else 0
-    elif node.op == '>':   return 1 if a > b else 0
-    elif node.op == '<=':  return 1 if a <= b else 0 
-    elif node.op == '>=':  return 1 if a >= b else 0
-    elif node.op == '=':   return 1 if a == b else 0
-    elif node.op == '~=':  return 1 if a != b else 0
-    else:
-      assert 0
+    return binop(node.op, a, b)
   
   # Elements= ===========================================
 
@@ -100,3 +80,36 @@ class EvalExpr(NodeWalker):
   def elem_string(self, node):
     return None
 
+# Operators ============================================
+
+def unop(op, a):
+  """
+  Apply a unary operator to a constant value.
+  """
+  if   op == '-': return -a
+  elif op == '~': return ~a
+  else:
+    assert 0
+
+def binop(op, a, b):
+  """
+  Apply a binary operator to two constant values.
+  """
+  if   op == '+':   return a + b
+  elif op == '-':   return a - b 
+  elif op == '*':   return a * b
+  elif op == '/':   return floor(a / b)
+  elif op == 'rem': return floor(a % b)
+  elif op == 'or':  return a | b
+  elif op == 'and': return a & b
+  elif op == 'xor': return a ^ b
+  elif op == '<<':  return a << b
+  elif op == '>>':  return a >> b
+  elif op == '<':   return 1 if a < b else 0
+  elif op == '>':   return 1 if a > b else 0
+  elif op == '<=':  return 1 if a <= b else 0 
+  elif op == '>=':  return 1 if a >= b else 0
+  elif op == '=':   return 1 if a == b else 0
+  elif op == '~=':  return 1 if a != b else 0
+  else:
+    assert 0
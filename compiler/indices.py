@@ -21,6 +21,19 @@ def indices_value(indices, values):
     r += y * mult
   return r
 
+def indices_values(indices):
+  """
+  Given a set of indices, compute their combined value at each point of their
+  iteration space, in the order of the cartesian product of their ranges.
+  """
+  dims = [x.count_value for x in indices]
+  values = [0]
+  for (i, x) in enumerate(indices):
+    c = reduce(lambda x, y: x*y, dims[i+1:], 1)
+    values = [v + (y * c) for v in values 
+        for y in range(x.base_value, x.base_value+x.count_value)]
+  return values
+
 def indices_expr(indices):
   """
   Given a set of indices, return an expression computing their combined value.
@@ -15,10 +15,18 @@ from symboltab import Symbol
 from formlocation import form_location
 from printer import Printer
 from indices import indices_value, indices_expr
+import connpatterns
 
 COMPRESS = True
 DEBUG_COMPRESSION = False
 
+# The fewest elements of a dense connection map to be lowered to tables
+MIN_TABLE_SIZE = 8
+
+# The fewest elements per group for difference compression to be preferred to
+# tables
+MIN_GROUP_SIZE = 4
+
 class InsertConns(NodeWalker):
   """
   Propagate the expanded channel uses up to replicator or composition level and
@@ -105,7 +113,7 @@ class InsertConns(NodeWalker):
       return (tab.lookup_slave_location(chan.name, elem.index, scope) if master else
           tab.lookup_master_location(chan.name, elem.index, scope))
 
-    def create_single_conn(s, chan, scope, i_elem, elem):
+    def create_elem_conn(chan, scope, elem):
       debug(self.debug, 'New connection for index {}'.format(elem.index))
       master = tab.lookup_is_master(chan, elem, scope)
       if master:
@@ -119,13 +127,31 @@ class InsertConns(NodeWalker):
           None, scope=T_SCOPE_PROC)
       connid = tab.lookup_connid(chan.name, elem.index, scope)
       chanid = ast.ExprSingle(ast.ElemNumber(connid))
+      return ast.StmtConnect(chanend, chanid, location, 
+          self.connect_type(chan, master))
+
+    def create_single_conn(s, chan, scope, i_elem, elem):
       cond = ast.ExprBinop('=', i_elem,
           ast.ExprSingle(ast.ElemNumber(elem.indices_value)))
-      conn = ast.StmtConnect(chanend, chanid, location, 
-          self.connect_type(chan, master))
+      conn = create_elem_conn(chan, scope, elem)
       return ast.StmtIf(cond, conn, s) if s!=None else conn
 
-    def create_range_conn(s, chan, i_elem, group):
+    def create_search(i_elem, cases):
+      """
+      Given a list of (start, stmt) in increasing order of start, where each
+      statement makes the connections for indices from its start up to the
+      next, select the statement with a balanced binary search of range
+      tests, so at most log2(n) comparisons are made.
+      """
+      if len(cases) == 1:
+        return cases[0][1]
+      mid = len(cases) // 2
+      cond = ast.ExprBinop('>=', i_elem,
+          ast.ExprSingle(ast.ElemNumber(cases[mid][0])))
+      return ast.StmtIf(cond, create_search(i_elem, cases[mid:]),
+          create_search(i_elem, cases[:mid]))
+
+    def create_range_conn(chan, i_elem, group):
       diff2 = group[0]
       elem0 = group[1][0][0] 
       offset = target_loc(chan, elem0, scope)
@@ -146,14 +172,9 @@ class InsertConns(NodeWalker):
           None, scope=T_SCOPE_PROC)
       connid = tab.lookup_connid(chan.name, elem0.index, scope)
       chanid = ast.ExprSingle(ast.ElemNumber(connid))
-      begin = elem0.indices_value
-      end = group[1][-1][0].indices_value
-      cond = ast.ExprBinop('>=', i_elem, 
-          ast.ExprSingle(ast.ElemNumber(min(begin, end))))
       master = tab.lookup_is_master(chan, elem0, scope)
-      conn = ast.StmtConnect(chanend, chanid, location,
+      return ast.StmtConnect(chanend, chanid, location,
           self.connect_type(chan, master))
-      return ast.StmtIf(cond, conn, s) if s else conn
 
     def create_tree_conn(tab, scope, chan, phase, group_size, base_indices_value, 
         loc_base, loc_diff, connid_min, connid_offset, connid_diff, i_elem):
@@ -241,22 +262,25 @@ class InsertConns(NodeWalker):
           debug(d, '    {:>3}: [{:>3}]->{:>3}'.format(
               elem0.indices_value, elem0.index, offset))
 
-      # If compression was inneffective then abort
-      if len(groups) == len(chan.elems):
+      # If compression was inneffective, or a table would be smaller, then
+      # abort
+      if (len(groups) == len(chan.elems) or (dense(chan) and
+          len(groups) * MIN_GROUP_SIZE > len(chan.elems))):
         debug(d, 'Aborting group diff compression.')
         return None
       
       debug(d, 'Diff compression successful.')
 
       # Construct connection syntax
-      s = None
+      cases = []
       for x in groups:
         elem0 = x[1][0][0]
         if len(x[1]) == 1:
-          s = create_single_conn(s, chan, scope, i_elem, elem0)
+          conn = create_elem_conn(chan, scope, elem0)
         else:
-          s = create_range_conn(s, chan, i_elem, x)
-      return s
+          conn = create_range_conn(chan, i_elem, x)
+        cases.append((elem0.indices_value, conn))
+      return create_search(i_elem, cases)
 
     def conn_tree_groups(chan, s, i_elem, d=DEBUG_COMPRESSION):
       """
@@ -364,15 +388,109 @@ class InsertConns(NodeWalker):
             connid_min, connid_offset, connid_diff, i_elem)
         return create_single_conn(s, chan, scope, i_elem, odd_elem)
 
+    def create_pattern_conn(chan, i_elem, seg, master):
+      chanend = ast.ElemId(chan.chanend)
+      chanend.symbol = Symbol(chan.chanend, self.chanend_type(chan),
+          None, scope=T_SCOPE_PROC)
+      return ast.StmtConnect(chanend, seg.connid.expr(i_elem, seg.base),
+          seg.target.expr(i_elem, seg.base), self.connect_type(chan, master))
+
+    def create_segment_conn(chan, i_elem, seg):
+      if isinstance(seg.master, connpatterns.Bit):
+        s = ast.StmtIf(seg.master.expr(i_elem),
+            create_pattern_conn(chan, i_elem, seg, True),
+            create_pattern_conn(chan, i_elem, seg, False))
+      else:
+        s = create_pattern_conn(chan, i_elem, seg, seg.master)
+      for x in seg.exceptions:
+        cond = ast.ExprBinop('=', i_elem,
+            ast.ExprSingle(ast.ElemNumber(x.start)))
+        s = ast.StmtIf(cond, create_segment_conn(chan, i_elem, x), s)
+      return s
+
+    def conn_patterns(chan, s, i_elem, d=DEBUG_COMPRESSION):
+      """
+      Compress connections by classifying the target locations and connection
+      IDs of ranges of elements as closed forms (see connpatterns.py).
+      """
+      rows = [(x.indices_value, target_loc(chan, x, scope),
+          tab.lookup_connid(chan.name, x.index, scope),
+          tab.lookup_is_master(chan, x, scope)) for x in chan.elems]
+      dims = [x.count_value for x in chan.indices]
+      segments = connpatterns.classify(rows, dims)
+      if segments == None:
+        debug(d, 'Aborting pattern compression.')
+        return None
+      for x in segments:
+        debug(d, '  [{}, {}]: target {}, connid {}, {} exceptions'.format(
+            x.start, x.end, x.target.name, x.connid.name, len(x.exceptions)))
+      debug(d, 'Pattern compression successful.')
+      return create_search(i_elem,
+          [(x.start, create_segment_conn(chan, i_elem, x)) for x in segments])
+
+    def dense(chan):
+      """
+      A connection map is dense if it has an element for each index in its
+      range.
+      """
+      n = len(chan.elems)
+      return (n >= MIN_TABLE_SIZE and
+          chan.elems[-1].indices_value - chan.elems[0].indices_value == n - 1)
+
+    def create_table(name, values, i_elem, base):
+      """
+      Return an expression for the value at the index in a constant table,
+      declaring the table, or just the value if they are all the same.
+      """
+      if all(x == values[0] for x in values):
+        return ast.ExprSingle(ast.ElemNumber(values[0]))
+      if not name in [x.name for x in decls]:
+        decls.append(ast.VarDecl(name, T_VAL_ARRAY,
+            [ast.ExprSingle(ast.ElemNumber(x)) for x in values]))
+      elem = ast.ElemSub(name, connpatterns.offset(i_elem, base))
+      elem.symbol = Symbol(name, T_VAL_ARRAY, None, scope=T_SCOPE_BLOCK)
+      return ast.ExprSingle(elem)
+
+    def conn_table(chan, s, i_elem, d=DEBUG_COMPRESSION):
+      """
+      Look up the target location, connection ID and whether each element is
+      the master, of a dense connection map, in constant tables (which are
+      placed in the constant pool).
+      """
+      if not dense(chan):
+        return None
+      debug(d, 'Creating connection tables.')
+      base = chan.elems[0].indices_value
+      targets = [target_loc(chan, x, scope) for x in chan.elems]
+      connids = [tab.lookup_connid(chan.name, x.index, scope)
+          for x in chan.elems]
+      types = [self.connect_type(chan, tab.lookup_is_master(chan, x, scope))
+          for x in chan.elems]
+      def conn(master):
+        chanend = ast.ElemId(chan.chanend)
+        chanend.symbol = Symbol(chan.chanend, self.chanend_type(chan),
+            None, scope=T_SCOPE_PROC)
+        return ast.StmtConnect(chanend,
+            create_table('_connids', connids, i_elem, base),
+            create_table('_targets', targets, i_elem, base),
+            self.connect_type(chan, master))
+      if all(x == types[0] for x in types):
+        return conn(types[0] != CONNECT_SLAVE)
+      masters = create_table('_masters',
+          [1 if x == CONNECT_MASTER else 0 for x in types], i_elem, base)
+      cond = ast.ExprBinop('=', masters.elem, ast.ExprSingle(ast.ElemNumber(1)))
+      return ast.StmtIf(cond, conn(True), conn(False))
+
     def conn_singles(chan, s, i_elem, d=DEBUG_COMPRESSION):
       """
       Create (uncompressed) connections for each case.
       """
       debug(d, 'Creating uncompressed connection range.')
+      cases = []
       for x in chan.elems:
-        s = create_single_conn(s, chan, scope, i_elem, x)
+        cases.append((x.indices_value, create_elem_conn(chan, scope, x)))
         debug(d, '  {}: {}[{}]'.format(x.indices_value, chan.name, x.index))
-      return s
+      return create_search(i_elem, cases)
 
     # Sort the channel elements into increasing order of indices
     chan.elems = sorted(chan.elems, key=lambda x: x.indices_value)
@@ -382,14 +500,42 @@ class InsertConns(NodeWalker):
     i_elem = ast.ElemId('_i')
     i_elem.symbol = Symbol(i_elem.name, T_VAR_SINGLE, scope=T_SCOPE_BLOCK)
     s = None
+    decls = []
     if COMPRESS:
-      s = conn_tree_groups(chan, s, i_elem)
+      s = conn_patterns(chan, s, i_elem)
+      s = conn_tree_groups(chan, s, i_elem) if s==None else s
       s = conn_diff_groups(chan, s, i_elem) if s==None else s 
+      s = conn_table(chan, s, i_elem) if s==None else s
     s = conn_singles(chan, s, i_elem) if s==None else s
     s = [ast.StmtAss(i_elem, i_expr), s]
-    s = ast.StmtSeq([ast.VarDecl(i_elem.name, T_VAR_SINGLE, None)], s)
+    s = ast.StmtSeq([ast.VarDecl(i_elem.name, T_VAR_SINGLE, None)] + decls, s)
     return s
 
+  def gen_symbolic_conn(self, chan):
+    """
+    Generate the connection of a symbolic channel array subscript (see
+    labelchans.ChanMap). The target of each element is the location of the
+    process using its other end, found by rotating each index by the
+    difference of the offsets of the two subscripts, and each element has the
+    same connection ID and master.
+    """
+    m = chan.map
+    i_expr = indices_expr(chan.indices)
+    i_elem = ast.ElemId('_i')
+    i_elem.symbol = Symbol(i_elem.name, T_VAR_SINGLE, scope=T_SCOPE_BLOCK)
+    start = indices_value(chan.indices, [x.base_value for x in chan.indices])
+    terms = [(m.step*s, (o - p) % d, d, s, j) for (j, (o, p, d, s))
+        in enumerate(zip(m.offsets, m.partner.offsets, m.dims, m.strides))
+        if d > 1]
+    location = connpatterns.Mesh(m.base, terms, m.dims).expr(i_elem, start)
+    chanend = ast.ElemId(chan.chanend)
+    chanend.symbol = Symbol(chan.chanend, self.chanend_type(chan),
+        None, scope=T_SCOPE_PROC)
+    s = ast.StmtConnect(chanend, ast.ExprSingle(ast.ElemNumber(chan.connid)),
+        location, self.connect_type(chan, m.master))
+    return ast.StmtSeq([ast.VarDecl(i_elem.name, T_VAR_SINGLE, None)],
+        [ast.StmtAss(i_elem, i_expr), s])
+
   def insert_connections(self, tab, scope, stmt, chans):
     """
     Insert connections for a process from a list of channel uses (name, index)
@@ -399,7 +545,9 @@ class InsertConns(NodeWalker):
     if len(chans) > 0:
       conns = []
       for x in chans:
-        if x.symbol.scope == T_SCOPE_SERVER or \
+        if x.map != None:
+          conns.append(self.gen_symbolic_conn(x))
+        elif x.symbol.scope == T_SCOPE_SERVER or \
             len(x.elems) == 1:
           conns.append(self.gen_single_conn(tab, scope, x))
         else:
@@ -7,6 +7,7 @@ from functools import reduce
 
 from util import vmsg, debug
 from walker import NodeWalker
+from estimate import EstimateWork
 import ast
 
 class InsertOns(NodeWalker):
@@ -19,12 +20,28 @@ class InsertOns(NodeWalker):
   is translated as::
 
     { foo() || on 1 do par i in [0 for N] do bar() || on N+1 do baz() }
+
+  The ons inserted are recorded in 'ons', and for each distributed parallel
+  composition outside a replicator, in pre-order, 'pars' records the
+  statement, its location and the number of processors used by each process
+  (so each is given a contiguous block of them, which placement.py may
+  reorder). 'size' is the total number of processors used.
+
+  With 'balance' set, processes with little work share processors (see
+  share).
   """
-  def __init__(self, device, errorlog, debug=False):
+  def __init__(self, device, errorlog, balance=False, debug=False):
     self.device = device
     self.errorlog = errorlog
+    self.balance = balance
     self.debug = debug
     self.defs = None
+    self.work = None
+    self.v = False
+    self.ons = []
+    self.pars = []
+    self.size = 0
+    self.reps = 0
 
   # Program ============================================
 
@@ -32,9 +49,13 @@ class InsertOns(NodeWalker):
   
     # All processes have been flattened into 'main'
     self.defs = node.defs
+    self.v = v
+    if self.balance:
+      self.work = EstimateWork(node.defs)
     debug(self.debug, 'd before program = {}'.format(0))
     d = self.stmt(node.defs[-1].stmt, node.defs[-1].name, 0)
     debug(self.debug, 'd after program = {}'.format(d))
+    self.size = d
     
     # Check the available number of processors has not been exceeded
     if d > self.device.num_cores():
@@ -45,6 +66,75 @@ class InsertOns(NodeWalker):
     # Report processor usage
     vmsg(v, '  {}/{} processors used'.format(d, self.device.num_cores()))
 
+  def on(self, d, stmt):
+    """
+    Prefix a process with an on for location d.
+    """
+    s = ast.StmtOn(ast.ExprSingle(ast.ElemNumber(d)), stmt)
+    self.ons.append(s)
+    return s
+
+  def share(self, node, d, sizes, marks, e):
+    """
+    Let the processes of a parallel composition that each use one processor
+    share them, as threads, using the work estimated for each (see
+    estimate.py). Processes are taken in decreasing order of work and each is
+    given the first processor with room for it (starting with that of the
+    first process), so that no processor has more work than the most heavily
+    loaded of the composition would alone, or more processes than may share
+    a core (see Device.num_process_threads). The blocks of the processes are
+    then laid out again in order, moving the ons inserted in each. Return the
+    number of processors used.
+    """
+    if 0 in sizes:
+      return e
+    work = [self.work.stmt(x) for x in node.stmt]
+    limit = self.device.num_process_threads()
+    capacity = max([w / n for (w, n) in zip(work, sizes)])
+    cores = [[work[0], [0]]] if sizes[0] == 1 else []
+    core = {}
+    single = [i for i in range(1, len(sizes)) if sizes[i] == 1]
+    for i in sorted(single, key=lambda i: (-work[i], i)):
+      for (j, x) in enumerate(cores):
+        if (x[0] + work[i] <= capacity
+            and (limit == None or len(x[1]) < limit)):
+          break
+      else:
+        j = len(cores)
+        cores.append([0, []])
+      cores[j][0] += work[i]
+      cores[j][1].append(i)
+      core[i] = j
+    if all([len(x[1]) == 1 for x in cores]):
+      return e
+
+    # Lay out the blocks again
+    starts = [d + sum(sizes[:i]) for i in range(len(sizes))]
+    locations = {0: d} if sizes[0] == 1 else {}
+    free = d + sizes[0]
+    for i in range(1, len(sizes)):
+      if sizes[i] == 1 and core[i] in locations:
+        start = locations[core[i]]
+        sizes[i] = 0
+      else:
+        start = free
+        free += sizes[i]
+        if sizes[i] == 1:
+          locations[core[i]] = start
+      (o0, p0, o1, p1) = marks[i]
+      for x in self.ons[o0:o1]:
+        x.expr.elem.value += start - starts[i]
+      for x in self.pars[p0:p1]:
+        x[1] += start - starts[i]
+
+    vmsg(self.v, '  {} processes{} on {} processors'.format(len(sizes),
+      ' at {}'.format(node.coord) if node.coord else '', free - d))
+    for (j, x) in enumerate(cores):
+      if len(x[1]) > 1:
+        vmsg(self.v, '    processes {} share processor {} (work {})'.format(
+          ', '.join([str(y) for y in sorted(x[1])]), locations[j], x[0]))
+    return free - d
+
   # Statements ==========================================
 
   # Main is flattened so this won't be called
@@ -57,22 +147,33 @@ class InsertOns(NodeWalker):
     """
     For processes in parallel composition, add 'on' prefixes to provide simple
     compile-time distribution. If any process is already prefixed with an 'on',
-    then do not add any (this is mainly for the test cases).
+    then do not add any (this is mainly for the test cases). Processes not
+    distributed run as threads of one processor.
     """
     if node.distribute:
       if any([isinstance(x, ast.StmtOn) for x in node.stmt]):
         self.errorlog.report_error("parallel composition contains 'on's")
         return 0
+      sizes = []
+      marks = [None]
+      if self.reps == 0:
+        self.pars.append([node, d, sizes])
       e = self.stmt(node.stmt[0], parent, d)
+      sizes.append(e)
       debug(self.debug, 'd before par = {}'.format(d))
       for (i, x) in enumerate(node.stmt[1:]):
-        node.stmt[i+1] = ast.StmtOn(ast.ExprSingle(ast.ElemNumber(d+e)), x)
-        e += self.stmt(x, parent, d+e)
+        mark = (len(self.ons), len(self.pars))
+        node.stmt[i+1] = self.on(d+e, x)
+        sizes.append(self.stmt(x, parent, d+e))
+        marks.append(mark + (len(self.ons), len(self.pars)))
+        e += sizes[-1]
+      if self.balance:
+        e = self.share(node, d, sizes, marks, e)
       debug(self.debug, 'd after par = {}'.format(d))
       node.distribute = False
       return e
     else:
-      return 0
+      return 1
 
   def stmt_server(self, node, parent, d):
     """
@@ -82,7 +183,7 @@ class InsertOns(NodeWalker):
       debug(self.debug, 'd before server = {}'.format(d))
       e = self.stmt(node.server, parent, d)
       debug(self.debug, 'd after server = {}'.format(e))
-      node.client = ast.StmtOn(ast.ExprSingle(ast.ElemNumber(d)), node.client)
+      node.client = self.on(d, node.client)
       e += self.stmt(node.client, parent, d)
       debug(self.debug, 'd after client = {}'.format(e))
       node.distribute = False
@@ -102,7 +203,9 @@ class InsertOns(NodeWalker):
     """
     debug(self.debug, 'd before rep = {}'.format(d))
     offset = reduce(lambda x, y: x*y.count_value, node.indices, 1)
+    self.reps += 1
     e = self.stmt(node.stmt, parent, d)
+    self.reps -= 1
     e = (e * offset)
     debug(self.debug, 'd after rep = {}'.format(e))
     return e
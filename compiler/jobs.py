@@ -0,0 +1,102 @@
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import util
+from util import vmsg
+from util import CommandError
+from error import Error
+
+# A scheduler for the external commands of a build. A build is given as a list
+# of jobs, each naming the jobs it depends on, and each job is started as soon
+# as all of its dependencies have completed. Jobs are run by a bounded pool of
+# threads, each of which waits on a subprocess. The messages, output and
+# errors of each job are captured and then reported in the order the jobs
+# were given, so the output of a build does not depend on the number of jobs.
+
+class Job(object):
+  """
+  A single step in a build. By default this executes the command 'args' in
+  the directory 'cwd', but any function 'run' that takes 'args' and returns
+  the output of the step, raising a CommandError if it fails, can be given.
+  Any other exception it raises fails the job in the same way.
+   - msg is a verbose message describing the job.
+   - quiet jobs do not display their output.
+  """
+  def __init__(self, name, args, deps=[], run=None, msg=None, quiet=False,
+      cwd=None):
+    self.name = name
+    self.args = args
+    self.deps = deps
+    self.run = run if run else lambda x: util.execute(x, cwd)
+    self.msg = msg
+    self.quiet = quiet
+    self.started = False
+    self.output = None
+    self.error = None
+
+def execute(job):
+  try:
+    job.output = job.run(job.args)
+  except Exception as e:
+    job.error = e
+
+def run(jobs, num_procs=1, show_calls=False, v=False):
+  """
+  Run a list of jobs over a pool of 'num_procs' threads. If a job fails, no
+  more are started and an Error is raised once those running have completed.
+  """
+  names = set([x.name for x in jobs])
+  assert all([d in names for x in jobs for d in x.deps])
+  waiting = list(jobs)
+  done = set()
+  running = {}
+  failed = False
+
+  with ThreadPoolExecutor(max(1, num_procs)) as pool:
+    while True:
+      if not failed:
+        for x in [x for x in waiting if all([d in done for d in x.deps])]:
+          waiting.remove(x)
+          x.started = True
+          running[pool.submit(execute, x)] = x
+      if not running:
+        break
+      (finished, pending) = wait(running, return_when=FIRST_COMPLETED)
+      for f in finished:
+        x = running.pop(f)
+        f.result()
+        if x.error:
+          failed = True
+        else:
+          done.add(x.name)
+
+  # A job can only be left waiting if its dependencies are cyclic
+  assert failed or not waiting
+
+  report([x for x in jobs if x.started], show_calls, v)
+  if failed:
+    raise Error()
+
+def report(jobs, show_calls, v):
+  """
+  Report the messages, commands and output of each job in order.
+  """
+  for x in jobs:
+    if x.msg:
+      vmsg(v, x.msg)
+    if show_calls:
+      print(' '.join(x.args))
+    if isinstance(x.error, CommandError):
+      sys.stderr.write(str(x.error))
+    elif x.error:
+      sys.stderr.write('Error: job {} failed:\n\n{}'.format(x.name,
+          ''.join(traceback.format_exception(type(x.error), x.error,
+            x.error.__traceback__))))
+    elif not x.quiet:
+      print(x.output, end='')
@@ -6,7 +6,8 @@
 import sys
 import copy
 import collections
-from itertools import product
+from functools import reduce
+from itertools import product, repeat
 
 import ast
 from util import debug
@@ -15,13 +16,20 @@ from typedefs import *
 from chantab import ChanTable
 from subelem import SubElem
 from evalexpr import EvalExpr
-from cmpexpr import CmpExpr
+from affine import expand, linear, rotation
+from vecexpr import evaluate
+from cmpexpr import expr_key
 from indices import *
 
 from printer import Printer
 
 DISPLAY_CHANTAB = False 
 
+# Replicators with at least this many points may be labelled symbolically
+# (see symbolic_map); smaller ones are always expanded, so the connections of
+# their elements can be classified in the simplest form (see connpatterns.py).
+MIN_SYMBOLIC_SIZE = 256
+
 class LabelChans(NodeWalker):
   """
   For each procedure definition, construct a table which records for each use
@@ -35,6 +43,40 @@ class LabelChans(NodeWalker):
     self.errorlog = errorlog
     self.debug = debug
 
+  def values(self, indices, expr, relative):
+    """
+    Evaluate an expression at each point of the iteration space of a set of
+    indices, in the order of their cartesian product. Each index takes its
+    value, or its offset from its base if 'relative' is set. Affine forms are
+    evaluated in closed form, and other expressions with a compiled kernel.
+    Otherwise the values of the indices are substituted into a copy of the
+    expression at each point.
+    """
+    ranges = [range(x.base_value, x.base_value+x.count_value) if not relative
+        else range(0, x.count_value) for x in indices]
+    names = [x.name for x in indices]
+    values = expand(expr, names, ranges)
+    if values != None:
+      return values
+    values = evaluate(expr, names, ranges)
+    if values != None:
+      return values
+
+    values = []
+    for x in product(*ranges):
+
+      # Deep copy expressions so we can modify them
+      e = copy.deepcopy(expr)
+
+      # Substitute index variables for values
+      for (y, z) in zip(indices, x):
+        e.accept(SubElem(ast.ElemId(y.name), ast.ElemNumber(z)))
+
+      # Evaluate the expressions
+      values.append(EvalExpr().expr(e))
+
+    return values
+
   def single_channel(self, indices, tab, stmt, name, chanend, chan_set):
     """
     Process a single (non-subscripted) channel use by evaluating its location
@@ -44,33 +86,12 @@ class LabelChans(NodeWalker):
     """
     #print(Printer().expr(stmt.location))
     if indices:
-      elem = ChanElem(None, None, None, None)
+      elem = ChanElem(None, None)
       
-      # Iterate over cartesian product of iterator ranges
-      ranges = [range(x.base_value, x.base_value+x.count_value) for x in indices]
-      for x in product(*ranges):
-
-        # Deep copy expressions so we can modify them
-        location_expr = copy.deepcopy(stmt.location)
-
-        # Substitute index variables for values
-        index_values = []
-        for (y, z) in zip(indices, x):
-          location_expr.accept(SubElem(ast.ElemId(y.name),
-            ast.ElemNumber(z-y.base_value)))
-
-        # Evaluate the expressions
-        location_value = EvalExpr().expr(location_expr)
-
-        # Add to the table
-        tab.insert(name, None, location_value, chanend, chan_set)
-        
-        # Add the location to the channel element
-        elem.add_location(location_value)
-        
-        debug(self.debug, '  {} at {} (chanend {})'.format(
-          name, location_value, chanend))
-     
+      # Evaluate the location over the cartesian product of iterator ranges
+      # and add each to the table and the channel element
+      elem.locations = self.values(indices, stmt.location, True)
+      tab.insert_all(name, repeat(None), elem.locations, chanend, chan_set)
       elem.location = elem.locations[0]
       return [elem]
     
@@ -79,7 +100,7 @@ class LabelChans(NodeWalker):
       tab.insert(name, None, location_value, chanend, chan_set)
       debug(self.debug, ' {} at {} (chanend {})'.format(
           name, location_value, chanend))
-      return [ChanElem(None, location_value, None, None)]
+      return [ChanElem(None, location_value)]
 
 
   def subscript_channel(self, indices, tab, stmt, name, expr, chanend, chan_set):
@@ -89,43 +110,88 @@ class LabelChans(NodeWalker):
     channel table and corresponding expansion.
     """
     #print(Printer().expr(stmt.location))
-    chan_elems = []
 
-    # Iterate over cartesian product of iterator ranges
-    ranges = [range(x.base_value, x.base_value+x.count_value) for x in indices]
-    for x in product(*ranges):
+    # Evaluate the index and location over the cartesian product of iterator
+    # ranges
+    index_values = self.values(indices, expr, False)
+    location_values = self.values(indices, stmt.location, True)
 
-      # Deep copy expressions so we can modify them
-      index_expr = copy.deepcopy(expr)
-      location_expr = copy.deepcopy(stmt.location)
+    # Add them to the table
+    self.expand_symbolic(tab, name)
+    tab.insert_all(name, index_values, location_values, chanend, chan_set)
 
-      # Substitute index variables for values
-      index_values = []
-      for (y, z) in zip(indices, x):
-        index_expr.accept(SubElem(ast.ElemId(y.name), ast.ElemNumber(z)))
-        location_expr.accept(SubElem(ast.ElemId(y.name),
-          ast.ElemNumber(z-y.base_value)))
-        index_values.append(z)
+    # Create the expanded channel uses
+    return [ChanElem(x, y, z) for (x, y, z) in 
+        zip(index_values, location_values, indices_values(indices))]
 
-      # Evaluate the expressions
-      index_value = EvalExpr().expr(index_expr)
-      location_value = EvalExpr().expr(location_expr)
-
-      # Add to the table
-      tab.insert(name, index_value, location_value, chanend, chan_set)
-
-      # Add the expanded channel use to a list
-      chan_elems.append(ChanElem(
-        index_value, location_value, indices, index_values))
-
-      debug(self.debug, '  {}[{}] at {} (chanend {})'.format(
-        name, index_value, location_value, chanend))
-    
-    return chan_elems
+  def symbolic_map(self, tab, indices, use, stmt):
+    """
+    Return a ChanMap if the elements of a channel array subscript in a
+    replicator need not be enumerated, or None. This is possible when no
+    element of the array is in the table, the subscript is a rotation of the
+    indices (see affine.rotation) and the location of the process is linear
+    (and one-to-one) in the combined index. Whether the array is then used by
+    exactly two such subscripts, as the master and slave ends of each element,
+    is checked with its declaration (see check_symbolic).
+    """
+    names = [x.name for x in indices]
+    dims = [x.count_value for x in indices]
+    if (reduce(lambda x, y: x*y, dims, 1) < MIN_SYMBOLIC_SIZE
+        or len(set(names)) < len(names) or use.symbol.type != T_CHAN_ARRAY
+        or not use.symbol.scope in [T_SCOPE_PROC, T_SCOPE_BLOCK]):
+      return None
+    c = tab.resolve(use.name)
+    if c == None or c.is_used():
+      return None
+    r = rotation(use.expr, indices)
+    location = linear(stmt.location, names)
+    if r == None or location == None:
+      return None
+    strides = [reduce(lambda x, y: x*y, dims[j+1:], 1)
+        for j in range(len(dims))]
+    (base, coeffs) = location
+    step = coeffs.get(names[max([j for (j, d) in enumerate(dims) if d > 1])], 0)
+    if step == 0 or any(d > 1 and coeffs.get(x, 0) != step*s
+        for (x, d, s) in zip(names, dims, strides)):
+      return None
+    return ChanMap(stmt, r[0], r[1], dims, strides, base, step, c)
+
+  def check_symbolic(self, tab, name):
+    """
+    Check the symbolic uses of a channel array declared in the current scope
+    are exactly two rotations of the same indices onto the same range, with
+    the same locations, and pair them as the master and slave of each element.
+    Otherwise, expand them.
+    """
+    c = tab.resolve(name)
+    if len(c.symbolic) == 2:
+      (a, b) = [x.map for x in c.symbolic]
+      if (a.key() == b.key() and a.offsets != b.offsets
+          and a.start + reduce(lambda x, y: x*y, a.dims, 1) <= c.size):
+        (a.partner, b.partner) = (b, a)
+        (a.master, b.master) = (True, False)
+        return
+    self.expand_symbolic(tab, name)
+
+  def expand_symbolic(self, tab, name):
+    """
+    Expand the symbolic uses of a channel array (in the order they were made)
+    into elements in the table. This is done before any other element of the
+    array is added, so the master and slave ends are those they would have
+    been.
+    """
+    c = tab.resolve(name)
+    if c != None and c.symbolic:
+      (sets, c.symbolic) = (c.symbolic, [])
+      for x in sets:
+        x.elems = self.subscript_channel(x.indices, tab, x.map.stmt, x.name,
+            x.expr, x.chanend, x)
+        x.map = None
 
   def expand_uses(self, tab, indices, chan_uses, stmt):
     """
-    For each channel use, expand it into a set of elements.
+    For each channel use, expand it into a set of elements, or leave it
+    symbolic (see symbolic_map).
     """
     chans = []
     for x in chan_uses.uses:
@@ -133,7 +199,13 @@ class LabelChans(NodeWalker):
           x.symbol.type == T_CHAN_ARRAY:
         chanend = tab.new_chanend()
         chan_set = ChanElemSet(x.name, x.expr, x.symbol, indices, chanend)
-        if x.expr == None:
+        m = self.symbolic_map(tab, indices, x, stmt) if indices else None
+        if m != None:
+          chan_set.map = m
+          chan_set.elems = []
+          m.chanset = chan_set
+          m.channels.symbolic.append(chan_set)
+        elif x.expr == None:
           chan_set.elems = self.single_channel(
               indices, tab, stmt, x.name, chanend, chan_set)
         else:
@@ -150,22 +222,22 @@ class LabelChans(NodeWalker):
     """
     for x in decls:
       if x.type == T_CHAN_SINGLE:
-        tab.insert(x.name, None, None, None, None, decl=True)
+        tab.declare(x.name)
       elif x.type == T_CHAN_ARRAY:
-        tab.insert(x.name, None, None, None, None, decl=True)
+        tab.declare(x.name, x.symbol.value)
       else:
         pass
 
-  def check_chan(self, name, index, chan_elem):
+  def check_chan(self, name, index, locations):
     """
-    Check each ChanItem entry in the table is valid: contains both master and 
+    Check each channel element in the table is valid: has both master and 
     one slave location. 
     """
     #print('Checking chan '+name+' {}'.format(index))
     c = '{}{}'.format(name, '' if index==None else '[{}]'.format(index) )
-    if not chan_elem.locations:
+    if not locations:
       self.errorlog.report_warning('channel '+c+' is not used')
-    elif len(chan_elem.locations) == 1:
+    elif len(locations) == 1:
       self.errorlog.report_error('channel '+c+' has no slave connection')
     # NOTE: this is valid with server connections
     #elif len(locations) > 2:
@@ -178,11 +250,12 @@ class LabelChans(NodeWalker):
     """
     for x in decls:
       if x.type == T_CHAN_SINGLE:
-        self.check_chan(x.name, None, tab.lookup(x.name, None))
+        self.check_chan(x.name, None, tab.lookup_locations(x.name, None))
       elif x.type == T_CHAN_ARRAY:
-        for y in range(x.symbol.value):
-          if tab.contains(x.name, y): 
-            self.check_chan(x.name, y, tab.lookup(x.name, y))
+        self.check_symbolic(tab, x.name)
+        for (y, i) in tab.resolve(x.name).elements():
+          if 0 <= y < x.symbol.value:
+            self.check_chan(x.name, y, tab.lookup_locations(x.name, y))
       else:
         pass
 
@@ -377,34 +450,37 @@ class LabelChans(NodeWalker):
 
 class ChanUse(object):
   """
-  A channel use.
+  A channel use, identified by the name of the channel and the key of its
+  subscript expression.
   """
   def __init__(self, name, expr, symbol):
     self.name = name
     self.expr = expr
     self.symbol = symbol
+    self.ident = (name, expr_key(expr) if expr else None)
 
   def __eq__(self, x):
-    if not self.expr:
-      return self.name == x.name
-    else:
-      return (self.name == x.name and 
-          CmpExpr().expr(self.expr, x.expr))
+    return self.ident == x.ident
 
   def __ne__(self, x):
     return not self.__eq__(x)
 
+  def __hash__(self):
+    return hash(self.ident)
+
 
 class ChanUseSet(object):
   """
-  A set of unique channel uses.
+  A set of unique channel uses, in the order they were added.
   """
   def __init__(self, init=[]):
     self.uses = []
+    self.idents = set()
     [self.add(x) for x in init]
 
   def add(self, use):
-    if not any(x == use for x in self.uses):
+    if not use.ident in self.idents:
+      self.idents.add(use.ident)
       self.uses.append(use)
 
   def update(self, useset):
@@ -422,15 +498,13 @@ class ChanElem(object):
    - An (integer) index value
    - The location of the use at the index (in order to retrieve the entry from
      the channel table).
-   - The values of the iterators yeilding index.
+   - The combined value of the iterators yeilding index.
   """  
-  def __init__(self, index, location, indices, index_values):
+  def __init__(self, index, location, indices_value=None):
     self.index = index
     self.location = location
-    self.indices_value = None
+    self.indices_value = indices_value
     self.locations = []
-    if indices != None and index_values != None:
-      self.indices_value = indices_value(indices, index_values)
 
   # This is a bit messy but a simple way to reflect that a single channel can
   # be shared in a client replicator of a server.
@@ -456,5 +530,37 @@ class ChanElemSet(object):
     self.indices = indices
     self.chanend = chanend
     self.elems = None
+    self.map = None
     self.connid = -1
 
+class ChanMap(object):
+  """
+  The elements of a channel array subscript in a replicator that are left
+  symbolic rather than enumerated. The subscript is 'start' plus a rotation of
+  the indices (with counts 'dims' and row-major 'strides') by 'offsets' (see
+  affine.rotation), and the location of the process at the offset w of the
+  combined index is 'base' + 'step'*w. 'channels' are those of the array's
+  declaration, 'partner' is the map of the other end of each element and
+  'master' is set if this is the master end.
+  """
+  def __init__(self, stmt, start, offsets, dims, strides, base, step,
+      channels):
+    self.stmt = stmt
+    self.start = start
+    self.offsets = offsets
+    self.dims = dims
+    self.strides = strides
+    self.base = base
+    self.step = step
+    self.channels = channels
+    self.partner = None
+    self.master = None
+    self.chanset = None
+
+  def key(self):
+    """
+    Two maps can be paired if their indices, locations and ranges are the
+    same.
+    """
+    return ([(x.name, x.base_value, x.count_value) for x in
+        self.chanset.indices], self.base, self.step, self.start)
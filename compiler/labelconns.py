@@ -8,40 +8,134 @@ from typedefs import *
 
 class LabelConns(NodeWalker):
   """
-  Label connections with identifers by performing a greedy colouring of
-  ChanElemSets.
+  Label connections with identifers. Two ChanElemSets are connected if they
+  contain opposite ends of the same channel element, and each connected
+  component of ChanElemSets (found with a union-find) is a connection that is
+  given a single identifier, except where its elements must be distinguished
+  (see offsets).
 
-  TODO: Recognise tree-connection patterns and ensure the assignment of
-  connection IDs is compatible with the compression scheme.
+  Identifiers need only be unique among connections that can be open at the
+  same time. As the connection requests of a par or server statement are all
+  completed when it finishes, connections of channels declared in statements
+  that run one after another (or exclusively) can share identifiers, whereas
+  those in nested statements or in different branches of a par or server
+  cannot. Server connections remain open, so are never shared, and as any
+  procedures can run at the same time, each uses a separate range.
+
+  The identifier of each element of a channel array is its component's plus
+  an offset, so identifiers remain regular over the elements of a replicator
+  and can be computed in closed form (see connpatterns.py). The elements of a
+  symbolic ChanElemSet (see labelchans.ChanMap) are not enumerated: it is
+  joined with the set of its partner and, as each of its elements connects a
+  different pair of locations, the component needs a single identifier.
   """
   def __init__(self):
     self.connid_count = 0
 
-  def fill(self, tab, scope, chanset, connid):
-    # Assign connid to all elements of the ChanElemSet
-    [tab.set_connid(chanset.name, y.index, scope, connid) for y in chanset.elems]
-
   def assign(self, tab, scope, chans):
+    """
+    Record a list of ChanElemSets, with the entry in the channel table of each
+    of their elements, and join each with the sets containing the other ends
+    of its elements.
+    """
     for x in chans:
-      if x.symbol.type == T_CHAN_SINGLE or \
+      if x.map != None:
+        self.sets.append((x, []))
+        self.parent.setdefault(id(x), x)
+        self.union(x, x.map.partner.chanset)
+      elif x.symbol.type == T_CHAN_SINGLE or \
           x.symbol.type == T_CHAN_ARRAY:
-        x.connid = self.connid_count
-        self.connid_count += 1
-        for y in x.elems:
-          chan_item = tab.lookup(x.name, y.index, scope)
-          if chan_item.connid != x.connid:
-            chanset = tab.lookup_chanset(x, y, scope)
-            self.fill(tab, scope, chanset, x.connid)
+        elems = [tab.lookup(x.name, y.index, scope) for y in x.elems]
+        self.sets.append((x, elems))
+        self.parent.setdefault(id(x), x)
+        partners = {}
+        for (c, i) in elems:
+          for z in c.chansets(i):
+            partners[id(z)] = z
+        [self.union(x, z) for z in partners.values()]
+
+  def find(self, x):
+    root = x
+    while self.parent[id(root)] is not root:
+      root = self.parent[id(root)]
+    while x is not root:
+      (self.parent[id(x)], x) = (root, self.parent[id(x)])
+    return root
+
+  def union(self, x, y):
+    self.parent.setdefault(id(y), y)
+    (x, y) = (self.find(x), self.find(y))
+    if x is not y:
+      self.parent[id(y)] = x
+
+  def components(self):
+    """
+    Return a dictionary mapping the Channels of each declaration to a list of
+    the roots of its connected components.
+    """
+    comps = {}
+    seen = set()
+    for (x, elems) in self.sets:
+      root = self.find(x)
+      c = elems[0][0] if elems else x.map.channels if x.map != None else None
+      if not id(root) in seen and c != None:
+        seen.add(id(root))
+        comps.setdefault(id(c), []).append(root)
+    return comps
+
+  def offsets(self):
+    """
+    Elements of a component connecting the same pair of locations must be
+    distinguished, so number each element among those of its component with
+    the same master and slave locations. Return the offset of each element
+    and the number of identifiers each component needs.
+    """
+    offsets = {}
+    widths = {}
+    pairs = {}
+    for (x, elems) in self.sets:
+      root = id(self.find(x))
+      for (c, i) in elems:
+        if not (id(c), i) in offsets:
+          k = (root, c.master[i], c.slave[i])
+          n = pairs.get(k, 0)
+          offsets[(id(c), i)] = n
+          pairs[k] = n + 1
+          if n > 0:
+            widths[root] = max(widths.get(root, 1), n + 1)
+    return (offsets, widths)
+
+  def label(self, node):
+    """
+    Allocate identifiers to each connected component and label the elements
+    of every ChanElemSet with the identifier of its component.
+    """
+    comps = self.components()
+    (offsets, widths) = self.offsets()
+    alloc = AllocConns(comps, widths)
+    self.connid_count += alloc.stmt(node.stmt, self.connid_count)
+    for x in comps.values():
+      for y in x:
+        if not id(y) in alloc.connids:
+          alloc.connids[id(y)] = self.connid_count
+          self.connid_count += widths.get(id(y), 1)
+    for (x, elems) in self.sets:
+      x.connid = alloc.connids.get(id(self.find(x)), -1)
+      for (c, i) in elems:
+        c.connid[i] = x.connid + offsets[(id(c), i)]
 
   # Program ============================================
 
   def walk_program(self, node):
     [self.defn(x) for x in node.defs]
-  
+
   def defn(self, node):
+    self.sets = []
+    self.parent = {}
     self.assign(node.chantab, None, node.chans)
     self.stmt(node.stmt, node.chantab, None)
-  
+    self.label(node)
+
   # Statements ==========================================
 
   # Statements with lists of ChanElemSets
@@ -60,7 +154,7 @@ class LabelConns(NodeWalker):
   def stmt_rep(self, node, tab, scope):
     self.assign(tab, scope, node.chans)
     self.stmt(node.stmt, tab, scope)
-    
+
   def stmt_on(self, node, tab, scope):
     self.assign(tab, scope, node.chans)
     self.stmt(node.stmt, tab, scope)
@@ -114,3 +208,91 @@ class LabelConns(NodeWalker):
   def stmt_return(self, node, tab, scope):
     pass
 
+
+class AllocConns(NodeWalker):
+  """
+  Allocate identifiers to the connections of the channels declared in each
+  par statement of a procedure, from a base identifier, given the number of
+  identifiers each connection needs. The connections of a
+  par are numbered first, then those in each of its branches follow on from
+  each other. The statements of a seq or the branches of an if all start from
+  the same base. Each statement returns the number of identifiers it uses.
+  Connections of channels declared in a server statement are left
+  unallocated.
+  """
+  def __init__(self, comps, widths):
+    self.comps = comps
+    self.widths = widths
+    self.connids = {}
+
+  def declared(self, scope):
+    """
+    Return the components of channels declared in a scope.
+    """
+    return [y for x in scope.tab.values() for y in self.comps.get(id(x), [])]
+
+  # Statements ==========================================
+
+  def stmt_par(self, node, base):
+    n = base
+    for x in self.declared(node.scope):
+      self.connids[id(x)] = n
+      n += self.widths.get(id(x), 1)
+    for x in node.stmt:
+      n += self.stmt(x, n)
+    return n - base
+
+  def stmt_server(self, node, base):
+    n = self.stmt(node.server, base)
+    return n + self.stmt(node.client, base + n)
+
+  def stmt_seq(self, node, base):
+    return max([self.stmt(x, base) for x in node.stmt] + [0])
+
+  def stmt_if(self, node, base):
+    return max(self.stmt(node.thenstmt, base), self.stmt(node.elsestmt, base))
+
+  def stmt_rep(self, node, base):
+    return self.stmt(node.stmt, base)
+
+  def stmt_on(self, node, base):
+    return self.stmt(node.stmt, base)
+
+  def stmt_while(self, node, base):
+    return self.stmt(node.stmt, base)
+
+  def stmt_for(self, node, base):
+    return self.stmt(node.stmt, base)
+
+  def stmt_skip(self, node, base):
+    return 0
+
+  def stmt_pcall(self, node, base):
+    return 0
+
+  def stmt_ass(self, node, base):
+    return 0
+
+  def stmt_in(self, node, base):
+    return 0
+
+  def stmt_out(self, node, base):
+    return 0
+
+  def stmt_in_tag(self, node, base):
+    return 0
+
+  def stmt_out_tag(self, node, base):
+    return 0
+
+  def stmt_alias(self, node, base):
+    return 0
+
+  def stmt_connect(self, node, base):
+    return 0
+
+  def stmt_assert(self, node, base):
+    return 0
+
+  def stmt_return(self, node, base):
+    return 0
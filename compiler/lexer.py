@@ -3,8 +3,35 @@
 # University of Illinois/NCSA Open Source License posted in
 # LICENSE.txt and at <http://github.xcore.com/>
 
+from bisect import bisect_left
 import ply.lex as lex
 
+class Source(object):
+  """
+  An input being lexed: its name and the offsets of the newlines lexed so
+  far, from which the line and column of a position are found by bisection.
+  """
+  __slots__ = ('name', 'newlines')
+
+  def __init__(self, name):
+    self.name = name
+    self.newlines = []
+
+  def line(self, lexpos):
+    return bisect_left(self.newlines, lexpos) + 1
+
+  def column(self, lexpos):
+    i = bisect_left(self.newlines, lexpos)
+    return lexpos - (self.newlines[i-1] if i > 0 else 0) + 1
+
+  # A source is shared by the coordinates of any copy of the AST.
+  def __copy__(self):
+    return self
+
+  def __deepcopy__(self, memo):
+    return self
+
+
 class Lexer(object):
   """
   A lexer object for the sire langauge.
@@ -15,6 +42,7 @@ class Lexer(object):
     """
     self.error_func = error_func
     self.filename = ''
+    self.source = Source(self.filename)
     self.lineno = 0
     self.lexpos = 0
 
@@ -26,6 +54,7 @@ class Lexer(object):
     self.lexer = lex.lex(object=self, **kwargs)
 
   def reset(self):
+    self.source = Source(self.filename)
     self.lexer.lineno = 1
   
   def input(self, text):
@@ -37,22 +66,11 @@ class Lexer(object):
   def data(self):
     return self.lexer.lexdata
 
-  def findcol(self, input, lexpos):
-    """ 
-    Compute the column given the input and lexpos.
-    """
-    last_cr = input.rfind('\n', 0, lexpos)
-    if last_cr < 0:
-      last_cr = 0
-    column = (lexpos - last_cr) + 1
-    return column
-
   def _error(self, msg, token):
     """ 
     Generic lexer error.
     """
-    self.error_func(msg, token.lineno, 
-        self.findcol(self.lexer.lexdata, token.lexpos))
+    self.error_func(msg, token.lexpos)
     self.lexer.skip(1)
  
   # Reserved tokens
@@ -169,6 +187,7 @@ class Lexer(object):
   def t_NEWLINE(self, t):
     r'[\n\r]'
     t.lexer.lineno += 1
+    self.source.newlines.append(t.lexpos)
 
   # Comment
   def t_COMMENT(self, t):
@@ -4,30 +4,30 @@
 # LICENSE.txt and at <http://github.xcore.com/>
 
 import sys
+from collections import deque
+
 import ast
 from walker import NodeWalker
 from display import Display
 
 class Liveness(NodeWalker):
-  """ 
-  An AST walker class to perform liveness analysis. We perform a post-order
-  traversal to perform a backwards analysis.
+  """
+  An AST walker class to perform liveness analysis over the control-flow
+  graph built by BuildCFG. For each procedure, the variables in the use and
+  def sets are numbered, so each set is an integer bit-vector, and the in and
+  out sets are found with a worklist: statements are first visited in
+  post-order of the graph (reverse post-order of the reversed graph, so the
+  successors of a statement are visited before it, except around loops), and
+  a statement is revisited only when the in set of one of its successors
+  changes.
+
+  The sets of each statement are given as bit-vectors (use_bits, def_bits,
+  in_bits and out_bits), and the in and out sets also as (frozen) sets of
+  variables (inp and out), which later passes read.
   """
   def __init__(self):
     pass
 
-  def compute(self, stmt):
-    """
-    Compute the in and out sets for a stmt. Return true if there was a
-    change in the in and out sets.
-    """
-    inp = stmt.inp.copy()
-    out = stmt.out.copy()
-    stmt.inp = stmt.use | (stmt.out - stmt.defs)
-    stmt.out = set()
-    [stmt.out.update(x.inp) for x in stmt.succ]
-    return len(inp^stmt.inp)>0 or len(out^stmt.out)>0
-
   def print_livesets(self, stmt):
     print(stmt)
     print('Use: {}'.format(stmt.use))
@@ -38,94 +38,184 @@ class Liveness(NodeWalker):
 
   def run(self, node, debug=False):
     """
-    Iteratively perform liveness analysis until there is no change in the in
-    and out sets.
+    Perform liveness analysis for each procedure.
     """
-    #node.accept(Display(self.print_livesets))
-    
-    while any([self.stmt(x.stmt) if x.stmt else False for x in node.defs]):
-      if debug: 
-        print('=========================================================')
-        node.accept(Display(self.print_livesets))
-        print('=========================================================')
-
+    [self.defn(x) for x in node.defs if x.stmt]
     if debug:
       node.accept(Display(self.print_livesets))
-  
+
+  def defn(self, node):
+    self.stmts = []
+    self.stmt(node.stmt)
+    stmts = self.order(self.stmts)
+    variables = Variables()
+    for x in stmts:
+      x.use_bits = variables.bits(x.use)
+      x.def_bits = variables.bits(x.defs)
+      x.in_bits = 0
+      x.out_bits = 0
+    self.solve(stmts)
+    for x in stmts:
+      x.inp = variables.view(x.in_bits)
+      x.out = variables.view(x.out_bits)
+
+  def order(self, stmts):
+    """
+    Return the statements of a procedure (including any reached only through
+    the graph) in post-order of a depth-first search of the graph from the
+    first, followed by any not reached from it, such as the branches of a
+    server.
+    """
+    seen = set()
+    order = []
+    for x in stmts:
+      if id(x) in seen:
+        continue
+      seen.add(id(x))
+      stack = [(x, iter(x.succ))]
+      while stack:
+        (y, succ) = stack[-1]
+        z = next(succ, None)
+        if z == None:
+          order.append(y)
+          stack.pop()
+        elif not id(z) in seen:
+          seen.add(id(z))
+          stack.append((z, iter(z.succ)))
+    return order
+
+  def solve(self, stmts):
+    """
+    Compute the in and out sets of each statement with a worklist:
+      out(s) = union of in(t) over each successor t of s
+      in(s)  = use(s) | (out(s) - def(s))
+    """
+    pred = {}
+    for x in stmts:
+      for y in x.succ:
+        pred.setdefault(id(y), []).append(x)
+    work = deque(stmts)
+    queued = set([id(x) for x in stmts])
+    while work:
+      x = work.popleft()
+      queued.discard(id(x))
+      out = 0
+      for y in x.succ:
+        out |= y.in_bits
+      x.out_bits = out
+      inp = x.use_bits | (out & ~x.def_bits)
+      if inp != x.in_bits:
+        x.in_bits = inp
+        for y in pred.get(id(x), []):
+          if not id(y) in queued:
+            queued.add(id(y))
+            work.append(y)
+
   # Statements ==========================================
 
+  # Collect the statements of a procedure
+
   def stmt_seq(self, node):
-    a = any([self.stmt(x) for x in reversed(node.stmt)])
-    b = self.compute(node)
-    return a or b
+    self.stmts.append(node)
+    [self.stmt(x) for x in node.stmt]
 
   def stmt_par(self, node):
-    a = any([self.stmt(x) for x in node.stmt])
-    b = self.compute(node)
-    return a or b
+    self.stmts.append(node)
+    [self.stmt(x) for x in node.stmt]
 
   def stmt_server(self, node):
-    a = self.stmt(node.server)
-    b = self.stmt(node.client)
-    c = self.compute(node)
-    return a or b or c
+    self.stmts.append(node)
+    self.stmt(node.server)
+    self.stmt(node.client)
 
   def stmt_if(self, node):
-    a = self.stmt(node.thenstmt)
-    b = self.stmt(node.elsestmt)
-    c = self.compute(node)
-    return a or b or c
+    self.stmts.append(node)
+    self.stmt(node.thenstmt)
+    self.stmt(node.elsestmt)
 
   def stmt_while(self, node):
-    a = self.stmt(node.stmt)
-    b = self.compute(node)
-    return a or b
+    self.stmts.append(node)
+    self.stmt(node.stmt)
 
   def stmt_for(self, node):
-    a = self.stmt(node.stmt)
-    b = self.compute(node)
-    return a or b
+    self.stmts.append(node)
+    self.stmt(node.stmt)
 
   def stmt_rep(self, node):
-    b = self.stmt(node.stmt)
-    a = self.compute(node)
-    return a or b
+    self.stmts.append(node)
+    self.stmt(node.stmt)
 
   def stmt_on(self, node):
-    b = self.stmt(node.stmt)
-    a = self.compute(node)
-    return a or b
+    self.stmts.append(node)
+    self.stmt(node.stmt)
 
   def stmt_skip(self, node):
-    return self.compute(node)
+    self.stmts.append(node)
 
   def stmt_pcall(self, node):
-    return self.compute(node)
+    self.stmts.append(node)
 
   def stmt_ass(self, node):
-    return self.compute(node)
+    self.stmts.append(node)
 
   def stmt_in(self, node):
-    return self.compute(node)
+    self.stmts.append(node)
 
   def stmt_out(self, node):
-    return self.compute(node)
+    self.stmts.append(node)
 
   def stmt_in_tag(self, node):
-    return self.compute(node)
+    self.stmts.append(node)
 
   def stmt_out_tag(self, node):
-    return self.compute(node)
+    self.stmts.append(node)
 
   def stmt_alias(self, node):
-    return self.compute(node)
+    self.stmts.append(node)
 
   def stmt_connect(self, node):
-    return self.compute(node)
+    self.stmts.append(node)
 
   def stmt_assert(self, node):
-    return self.compute(node)
+    self.stmts.append(node)
 
   def stmt_return(self, node):
-    return self.compute(node)
+    self.stmts.append(node)
+
 
+class Variables(object):
+  """
+  The variables of a procedure, each numbered by its position in a bit-vector
+  when it is first seen. Variables are the elements of use and def sets, so
+  are equal if they have the same name (or, for the indices of replicators,
+  are the same object). Those first seen in the same set are numbered in
+  order of name, so the bit-vectors do not depend on the order of sets.
+  """
+  def __init__(self):
+    self.bit = {}
+    self.elems = []
+    self.views = {0: frozenset()}
+
+  def bits(self, elems):
+    """
+    Return the bit-vector of a set of variables.
+    """
+    v = 0
+    for x in sorted(elems, key=lambda x: x.name):
+      i = self.bit.get(x)
+      if i == None:
+        i = self.bit[x] = len(self.elems)
+        self.elems.append(x)
+      v |= 1 << i
+    return v
+
+  def view(self, bits):
+    """
+    Return the set of variables of a bit-vector. Equal bit-vectors share the
+    same set.
+    """
+    s = self.views.get(bits)
+    if s == None:
+      s = self.views[bits] = frozenset([x for (i, x) in enumerate(self.elems)
+          if bits >> i & 1])
+    return s
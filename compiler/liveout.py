@@ -3,6 +3,7 @@
 # University of Illinois/NCSA Open Source License posted in
 # LICENSE.txt and at <http://github.xcore.com/>
 
+import ast
 from walker import NodeWalker
 
 class LiveOut(NodeWalker):
@@ -63,7 +64,9 @@ class LiveOut(NodeWalker):
     return self.stmt(node.stmt, succ)
 
   def stmt_rep(self, node, succ):
-    return self.stmt(node.stmt, succ)
+    # The indices are bound by the replicator, so are not live after it.
+    return self.stmt(node.stmt, succ) - set([ast.ElemId(x.name)
+      for x in node.indices])
     
   def stmt_on(self, node, succ):
     return self.stmt(node.stmt, succ)
@@ -16,6 +16,9 @@ from errorlog import ErrorLog
 from util import vmsg, vhdr
 import util
 import config
+import stats
+import objcache
+import transcache
 import definitions as defs
 from parser import Parser
 from dump import Dump
@@ -26,11 +29,13 @@ from semantics import Semantics
 from buildcfg import BuildCFG
 from liveness import Liveness
 from insertons import InsertOns
+from chunkreps import ChunkReps
 from expandprocs import ExpandProcs
 from flattenpar import FlattenPar
 from transformserver import TransformServer
 from labelprocs import LabelProcs
 from labelchans import LabelChans
+from placement import Placement
 from labelconns import LabelConns
 from displayconns import DisplayConns
 from insertids import InsertIds
@@ -43,13 +48,21 @@ from removedecls import RemoveDecls
 from children import Children
 
 from codegen import generate
+from codegen import DEFS_FILE
+from server import serve
+from batch import run_batch
+from client import default_socket
 from target.config import set_device
 from target.config import TARGET_SYSTEMS
 from target.config import DEFAULT_NUM_CORES
 from target.config import DEFAULT_TARGET_SYSTEM
+from ast import ExprSingle, ElemNumber
 
 # Globals
 v = False
+warm_parser = None # A parser built in advance by the compile server
+parse_log = True
+parsed_asts = {}   # ASTs parsed in advance for batch jobs, by (file, vals)
 
 def setup_argparse():
   """ 
@@ -63,6 +76,10 @@ def setup_argparse():
   p.add_argument('infile', nargs='?', metavar='<input-file>', default=None,
       help='input filename')
   
+  p.add_argument('--val', action='append', metavar='<name>=<value>',
+      dest='vals', default=None,
+      help='override the value of a top-level val definition')
+  
   p.add_argument('-o', nargs=1, metavar='<file>', 
       dest='outfile', default=None,
       help="output filename (default: '"+defs.DEFAULT_OUT_FILE+".<ext>')")
@@ -76,6 +93,11 @@ def setup_argparse():
   p.add_argument('-n', nargs=1, metavar='<n>', type=int, 
       dest='num_cores', default=[DEFAULT_NUM_CORES],
       help='number of cores (default: {})'.format(DEFAULT_NUM_CORES))
+
+  p.add_argument('--ranks-per-host', metavar='<n>', type=parse_ranks,
+      dest='ranks_per_host', default=None,
+      help='number of ranks on each host of an MPI system, giving the '
+      +'distances between them (default: all on one host)')
  
   # Modes
 
@@ -121,6 +143,10 @@ def setup_argparse():
       dest='save_temps',
       help='do not discard any intermediate files')
  
+  p.add_argument('--work-dir', metavar='<dir>', dest='work_dir', default=None,
+      help='build in <dir> and keep its contents (default: a temporary '
+      +'directory)')
+ 
   p.add_argument('-D', action='store_true',
       dest='disable_transformations',
       help='disable AST transformations')
@@ -129,8 +155,104 @@ def setup_argparse():
       dest='display_memory',
       help='display memory usage information')
  
+  p.add_argument('--rep-fanout', metavar='<k>', type=parse_fanout,
+      dest='rep_fanout', default=defs.DEFAULT_REP_FANOUT,
+      help=('number of children of each process distributing a replicator, '
+      +'a power of 2, or \'{}\' to choose it from the threads available '
+      +'(default: {})').format(defs.REP_FANOUT_AUTO, defs.DEFAULT_REP_FANOUT))
+ 
+  p.add_argument('--grain', metavar='<G>', type=parse_grain,
+      dest='grain', default=None,
+      help='run the processes of each replicator in chunks of <G> on each '
+      +'processor (default: only as needed to fit the processors '
+      +'available)')
+ 
+  p.add_argument('--balance', action='store_true', dest='balance',
+      help='let distributed processes with little estimated work share '
+      +'processors')
+ 
+  p.add_argument('--place', action='store_true', dest='place',
+      help='reorder distributed processes to reduce the hop distance between '
+      +'those connected by channels')
+ 
+  p.add_argument('--server', nargs='?', metavar='<socket>',
+      dest='server', const=default_socket(), default=None,
+      help='run as a compile server listening on a Unix socket '
+      +'(default: {})'.format(default_socket()))
+ 
+  p.add_argument('--no-positions', action='store_false', dest='positions',
+      help='do not track the source positions of productions while parsing '
+      +'large generated inputs (errors in them may then be reported at the '
+      +'start of the file)')
+ 
+  p.add_argument('--no-cache', action='store_true', dest='no_cache',
+      help='do not use the cache of runtime object files')
+ 
+  p.add_argument('--clear-cache', action='store_true', dest='clear_cache',
+      help='empty the cache of runtime object files')
+ 
+  p.add_argument('--incremental', action='store_true', dest='incremental',
+      help='reuse the cached translation of unchanged procedures and '
+      +'assembly of an unchanged program')
+ 
+  p.add_argument('--batch', metavar='<job-file>', dest='batch', default=None,
+      help='compile each job (a line of arguments) in a job file')
+ 
+  p.add_argument('-j', nargs=1, metavar='<n>', type=int,
+      dest='num_jobs', default=[os.cpu_count()],
+      help='number of jobs to run in parallel (default: {})'.format(
+        os.cpu_count()))
+ 
+  p.add_argument('--stats', nargs='?', choices=stats.STATS_FORMATS,
+      const=stats.STATS_TEXT, dest='stats', default=None,
+      help='record time, memory and AST size for each compilation stage '
+      +'and report them as {} (default: {})'.format(
+        ' or '.join(stats.STATS_FORMATS), stats.STATS_TEXT))
+ 
   return p
 
+def parse_grain(s):
+  """
+  Parse the grain of replicators: a positive integer.
+  """
+  try:
+    g = int(s)
+  except ValueError:
+    g = 0
+  if g < 1:
+    raise argparse.ArgumentTypeError(
+        "invalid grain '{}': must be a positive integer".format(s))
+  return g
+
+def parse_ranks(s):
+  """
+  Parse the number of MPI ranks on each host: a positive integer.
+  """
+  try:
+    n = int(s)
+  except ValueError:
+    n = 0
+  if n < 1:
+    raise argparse.ArgumentTypeError(
+        "invalid ranks per host '{}': must be a positive integer".format(s))
+  return n
+
+def parse_fanout(s):
+  """
+  Parse the fan-out of replicator distribution: a power of 2 (at least 2) or
+  'auto'.
+  """
+  if s == defs.REP_FANOUT_AUTO:
+    return s
+  try:
+    k = int(s)
+  except ValueError:
+    k = 0
+  if k < 2 or k & (k-1) != 0:
+    raise argparse.ArgumentTypeError(
+        "'{}' is not a power of 2 or '{}'".format(s, defs.REP_FANOUT_AUTO))
+  return k
+
 def setup_globals(a):
   """ 
   Setup global variables representing compilation parameters.
@@ -145,8 +267,10 @@ def setup_globals(a):
   # System paramters
   global target_system
   global num_cores
+  global ranks_per_host
   target_system = a.target_system[0]
   num_cores = int(a.num_cores[0])
+  ranks_per_host = a.ranks_per_host
 
   # Modes
   global build_only
@@ -171,17 +295,61 @@ def setup_globals(a):
 
   # Other
   global save_temps
+  global work_dir
   global disable_transformations
   global display_memory
+  global rep_fanout
+  global grain
+  global balance
+  global place
+  global stats_format
+  global positions
   save_temps = a.save_temps
+  work_dir = os.path.abspath(a.work_dir) if a.work_dir else None
   disable_transformations = a.disable_transformations
   display_memory = a.display_memory
+  rep_fanout = a.rep_fanout
+  grain = a.grain
+  balance = a.balance
+  place = a.place
+  stats_format = a.stats
+  positions = a.positions
+
+  # Object cache
+  global no_cache
+  global incremental
+  global clear_cache
+  no_cache = a.no_cache
+  incremental = a.incremental
+  clear_cache = a.clear_cache
+
+  # Server and batch
+  global server_socket
+  global batch_file
+  global num_jobs
+  server_socket = a.server
+  batch_file = a.batch
+  num_jobs = max(1, a.num_jobs[0])
 
   # Input/output targets
   global infile
   global outfile
   infile = a.infile
   outfile = a.outfile[0] if a.outfile else defs.DEFAULT_OUT_FILE
+  
+  # Value overrides
+  global vals
+  vals = tuple(a.vals) if a.vals else ()
+
+def create_parser(errorlog):
+  """
+  Create a parser, or reuse one that has been built in advance.
+  """
+  if warm_parser == None:
+    return Parser(errorlog, lex_optimise=True, 
+        yacc_debug=False, yacc_optimise=False)
+  warm_parser.error = errorlog
+  return warm_parser
 
 def produce_ast(input_file, errorlog, log=True):
   """ 
@@ -200,10 +368,19 @@ def produce_ast(input_file, errorlog, log=True):
   else:
     logger = 0
    
-  # Create the parser and produce the AST
-  parser = Parser(errorlog, lex_optimise=True, 
-      yacc_debug=False, yacc_optimise=False)
-  ast = parser.parse(input_file, infile, debug=logger)
+  # Create the parser and produce the AST, unless it has already been parsed
+  if (infile, vals) in parsed_asts:
+    ast = parsed_asts[(infile, vals)]
+  else:
+    with stats.stage('Parser'):
+      parser = create_parser(errorlog)
+    with stats.stage('Parse') as s:
+      ast = parser.parse(input_file, infile, debug=logger,
+          tracking=positions)
+    if s:
+      s.nodes_after = stats.count_nodes(ast)
+    if ast:
+      override_vals(ast, vals, errorlog)
   
   if errorlog.any():
     raise QuietError()
@@ -224,13 +401,56 @@ def produce_ast(input_file, errorlog, log=True):
 
   return ast
 
+def override_vals(ast, vals, errorlog):
+  """
+  Replace the values of top-level val definitions with those given as
+  '<name>=<value>' on the command line.
+  """
+  for x in vals:
+    (name, sep, value) = x.partition('=')
+    try:
+      value = int(value, 0)
+    except ValueError:
+      errorlog.report_error("invalid value override '{}'".format(x))
+      continue
+    decls = [y for y in ast.decls if y.name == name]
+    if not decls:
+      errorlog.report_error("no val definition '{}' to override".format(name))
+      continue
+    for y in decls:
+      y.expr = ExprSingle(ElemNumber(value))
+
+def parse_job(args):
+  """
+  Run the front end for a batch job, once for each distinct source and set of
+  value overrides. Any errors are left to be reported by the job itself.
+  """
+  setup_globals(setup_argparse().parse_args(args))
+  if not infile or (infile, vals) in parsed_asts:
+    return
+  errorlog = ErrorLog()
+  stderr = sys.stderr
+  sys.stderr = io.StringIO()
+  try:
+    ast = create_parser(errorlog).parse(util.read_file(infile), infile,
+        tracking=positions)
+    if ast:
+      override_vals(ast, vals, errorlog)
+  except Error:
+    ast = None
+  finally:
+    sys.stderr = stderr
+  if ast and not errorlog.any():
+    parsed_asts[(infile, vals)] = ast
+
 def semantic_analysis(sym, sig, ast, device, errorlog):
   """ 
   Perform semantic analysis on an AST.
   """
   vmsg(v, "Performing semantic analysis")
   sem = Semantics(sym, sig, device, errorlog)
-  sem.walk_program(ast)
+  with stats.stage('Semantics', ast):
+    sem.walk_program(ast)
   
   # Check for any errors
   if errorlog.any():
@@ -242,75 +462,107 @@ def semantic_analysis(sym, sig, ast, device, errorlog):
 
   return sem
 
-def transform_ast(sem, sym, sig, ast, errorlog, device, v):
+def transform_ast(sem, sym, sig, ast, errorlog, device, v,
+    fanout=defs.DEFAULT_REP_FANOUT, grain=None, balance=False, place=False):
   """
   Perform transformations on the AST.
   """
 
   # 1. Distribute processes
   vmsg(v, "Expanding processes")
-  ExpandProcs(sig, ast).walk_program(ast)
+  with stats.stage('ExpandProcs', ast):
+    ExpandProcs(sig, ast).walk_program(ast)
   if errorlog.any(): raise Error()
 
+  # 1a. Divide replicators into chunks
+  vmsg(v, "Dividing replicators")
+  with stats.stage('ChunkReps', ast):
+    ChunkReps(device, grain).walk_program(ast, v)
+
   # 2. Flatten nested parallel composition
   #vmsg(v, "Flattening nested parallel composition")
   #FlattenPar().walk_program(ast)
 
   # 3. Distribute processes
   vmsg(v, "Distributing processes")
-  InsertOns(device, errorlog).walk_program(ast, v)
+  with stats.stage('InsertOns', ast):
+    ons = InsertOns(device, errorlog, balance)
+    ons.walk_program(ast, v)
   if errorlog.any(): raise Error()
 
   # 4. Label process locations
   vmsg(v, "Labelling processes")
-  LabelProcs(sym, device).walk_program(ast)
+  with stats.stage('LabelProcs', ast):
+    LabelProcs(sym, device).walk_program(ast)
 
   # 5. Label channels
   vmsg(v, "Labelling channels")
-  LabelChans(device, errorlog).walk_program(ast)
+  with stats.stage('LabelChans', ast):
+    LabelChans(device, errorlog).walk_program(ast)
   if errorlog.any(): raise Error()
 
+  # 5a. Place processes (and label them and their channels again), with
+  # any warnings already reported
+  if place:
+    vmsg(v, "Placing processes")
+    with stats.stage('Placement', ast):
+      if Placement(device, ons, v).run(ast):
+        LabelProcs(sym, device).walk_program(ast)
+        LabelChans(device, ErrorLog()).walk_program(ast)
+
   # 6. Label connections
   vmsg(v, "Labelling connections")
-  LabelConns().walk_program(ast)
+  with stats.stage('LabelConns', ast):
+    LabelConns().walk_program(ast)
   
   #DisplayConns(device).walk_program(ast)
 
   # 7. Insert channel ends
   vmsg(v, "Inserting connections")
-  InsertConns(sym).walk_program(ast)
+  with stats.stage('InsertConns', ast):
+    InsertConns(sym).walk_program(ast)
 
   # 8. Rename channel uses
   vmsg(v, "Renaming channel uses")
-  RenameChans().walk_program(ast)
+  with stats.stage('RenameChans', ast):
+    RenameChans().walk_program(ast)
  
   # 9. Build the control-flow graph and initialise sets for liveness analysis
   vmsg(v, "Building the control flow graph")
-  BuildCFG().run(ast)
+  with stats.stage('BuildCFG', ast):
+    BuildCFG().run(ast)
 
   # 10. Perform liveness analysis
   vmsg(v, "Performing liveness analysis")
-  Liveness().run(ast)
+  with stats.stage('Liveness', ast):
+    Liveness().run(ast)
   
   # 13. Transform server processes
   vmsg(v, "Transforming server processes")
-  TransformServer().walk_program(ast)
+  with stats.stage('TransformServer', ast):
+    TransformServer().walk_program(ast)
 
   # 11. Transform parallel composition
   vmsg(v, "Transforming parallel composition")
-  TransformPar(sem, sig).walk_program(ast)
+  with stats.stage('TransformPar', ast):
+    TransformPar(sem, sig).walk_program(ast)
+  if errorlog.any(): raise Error()
  
   # 12. Transform parallel replication
   vmsg(v, "Transforming parallel replication")
-  TransformRep(sym, sem, sig, device).walk_program(ast)
+  with stats.stage('TransformRep', ast):
+    TransformRep(sym, sem, sig, device, fanout).walk_program(ast)
+  if errorlog.any(): raise Error()
   
   # 14. Flatten nested calls
   vmsg(v, "Flattening nested calls")
-  FlattenCalls(sig).walk_program(ast)
+  with stats.stage('FlattenCalls', ast):
+    FlattenCalls(sig).walk_program(ast)
   
   # 15. Remove unused declarations
   vmsg(v, "Removing unused declarations")
-  RemoveDecls().walk_program(ast)
+  with stats.stage('RemoveDecls', ast):
+    RemoveDecls().walk_program(ast)
    
   # Display (pretty-print) the transformed AST
   if pprint_trans_ast: 
@@ -323,11 +575,29 @@ def child_analysis(sig, ast):
   """
   vmsg(v, "Performing child analysis")
   child = Children(sig)
-  ast.accept(child)
-  child.build()
+  with stats.stage('Children', ast):
+    ast.accept(child)
+    child.build()
   #child.display()
   return child
 
+def start_server(path):
+  """
+  Build the parser and read the system definitions once, then serve
+  compilation requests. Each request is compiled in a forked copy of this
+  process so nothing is shared between them.
+  """
+  global warm_parser
+  global parse_log
+  vmsg(v, 'Building parser')
+  warm_parser = Parser(ErrorLog(), lex_optimise=True, 
+      yacc_debug=False, yacc_optimise=False)
+  parse_log = False
+  vmsg(v, 'Reading definitions')
+  defs.read(config.XS1_SYSTEM_PATH+'/'+DEFS_FILE)
+  defs.read(config.MPI_SYSTEM_PATH+'/'+DEFS_FILE)
+  serve(main, path, v)
+
 def main(args):
   
   try:
@@ -340,8 +610,32 @@ def main(args):
     a = argp.parse_args(args)
     setup_globals(a)
 
+    # Setup the runtime object cache
+    objcache.init(not no_cache)
+    transcache.init(incremental, v)
+    if clear_cache:
+      objcache.clear(v)
+      if not infile:
+        return 0
+
+    # Run as a compile server
+    if server_socket:
+      start_server(server_socket)
+      return 0
+
+    # Run a batch of jobs
+    if batch_file:
+      global parse_log
+      global warm_parser
+      parse_log = False
+      warm_parser = create_parser(ErrorLog())
+      return 1 if run_batch(batch_file, main, parse_job, num_jobs, v) else 0
+
+    # Start recording compilation statistics
+    stats.init(stats_format != None)
+
     # Create a (valid) target system device oject (before anything else)
-    device = set_device(target_system, num_cores)
+    device = set_device(target_system, num_cores, ranks_per_host)
     
     # Read the input from stdin or from a file 
     vhdr(v, 'Front end')
@@ -357,7 +651,7 @@ def main(args):
           False, True, compile_only, display_memory, show_calls, v)
 
     # Parse the input file and produce an AST
-    ast = produce_ast(input_file, errorlog)
+    ast = produce_ast(input_file, errorlog, parse_log)
 
     # Perform semantic analysis on the AST
     sym = SymbolTable(errorlog)
@@ -366,7 +660,8 @@ def main(args):
     
     # Perform AST transformations for channels and reps
     if not disable_transformations:
-      transform_ast(sem, sym, sig, ast, errorlog, device, v)
+      transform_ast(sem, sym, sig, ast, errorlog, device, v, rep_fanout,
+          grain, balance, place)
 
     # Perform child analysis
     child = child_analysis(sig, ast)
@@ -375,7 +670,7 @@ def main(args):
     vhdr(v, 'Generating code for {}'.format(device))
     generate(ast, sig, child, device, outfile, 
         translate_only, compile_only, 
-        display_memory, show_calls, save_temps, v)
+        display_memory, show_calls, save_temps, v, num_jobs, work_dir)
 
   # Handle (expected) system exits
   except SystemExit:
@@ -405,6 +700,15 @@ def main(args):
     sys.stderr.write("Unexpected error: {}\n".format(sys.exc_info()[0]))
     raise
     return 1
+
+  # Report any compilation statistics
+  finally:
+    if stats.enabled:
+      stats.report(stats_format, {
+          'version': defs.VERSION, 
+          'infile': infile if infile else 'stdin', 
+          'target': target_system, 
+          'num_cores': num_cores})
   
   return 0
 
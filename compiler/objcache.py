@@ -0,0 +1,224 @@
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+import os
+import re
+import shutil
+import hashlib
+import tempfile
+import subprocess
+
+import util
+from util import vmsg
+
+CACHE_PATH_ENV = 'SIRE_CACHE'
+CACHE_SIZE_ENV = 'SIRE_CACHE_SIZE'
+DEFAULT_CACHE_SIZE = 256 # MB
+TMP_PREFIX = '.tmp'
+
+# A content-addressed cache of object files compiled from the runtime and
+# builtin sources. Each entry is named by a hash of everything that can affect
+# the object produced:
+#  - the command, with the output file name removed;
+#  - the version reported by the tool;
+#  - the contents of the source file and of every header it includes that can
+#    be found in its directory or the include paths (this covers the generated
+#    device.h).
+# Other files, such as translated procedures, can be stored under their own
+# keys with lookup and store. Entries are written atomically so the cache can
+# be shared by concurrent compilations. The cache is bounded in size by
+# evicting the least recently used entries, where a hit updates the
+# modification time of an entry.
+
+# Globals
+enabled = False
+path = None
+max_size = DEFAULT_CACHE_SIZE * 1000000
+versions = {}
+
+INCLUDE = re.compile(r'^\s*#\s*include\s*[<"]([^>"]+)[>"]', re.MULTILINE)
+
+def init(enable=True):
+  """
+  (Re)initialise the cache from the environment.
+  """
+  global enabled
+  global path
+  global max_size
+  enabled = enable
+  path = os.environ.get(CACHE_PATH_ENV)
+  if not path:
+    path = os.path.join(os.environ.get('XDG_CACHE_HOME',
+        os.path.expanduser('~/.cache')), 'sire')
+  if os.environ.get(CACHE_SIZE_ENV):
+    max_size = int(os.environ[CACHE_SIZE_ENV]) * 1000000
+
+def tool_version(tool):
+  """
+  Return (and remember) the version string of a tool, or an empty string if
+  it cannot be run.
+  """
+  if not tool in versions:
+    try:
+      versions[tool] = subprocess.run([tool, '--version'],
+          stdout=subprocess.PIPE, stderr=subprocess.STDOUT).stdout
+    except OSError:
+      versions[tool] = b''
+  return versions[tool]
+
+def include_dirs(args):
+  return [args[i+1] for (i, x) in enumerate(args[:-1]) if x == '-I']
+
+def hash_source(h, srcfile, dirs, seen, cwd=''):
+  """
+  Add the contents of a source file and all the headers it includes that can
+  be found to a hash. Relative names are relative to the directory 'cwd',
+  and only the names themselves are hashed.
+  """
+  if srcfile in seen:
+    return
+  seen.add(srcfile)
+  with open(os.path.join(cwd, srcfile), 'rb') as f:
+    contents = f.read()
+  h.update(srcfile.encode('utf-8'))
+  h.update(contents)
+  for x in INCLUDE.findall(contents.decode('utf-8', 'replace')):
+    for d in [os.path.dirname(srcfile)] + dirs:
+      header = os.path.normpath(os.path.join(d, x))
+      if os.path.isfile(os.path.join(cwd, header)):
+        hash_source(h, header, dirs, seen, cwd)
+        break
+
+def key(args, srcfile, objfile, cwd=''):
+  """
+  Compute the cache key for compiling 'srcfile' to 'objfile' with 'args'.
+  """
+  h = hashlib.sha256()
+  h.update('\0'.join([x for x in args if x != objfile]).encode('utf-8'))
+  h.update(tool_version(args[0]))
+  hash_source(h, srcfile, include_dirs(args), set(), cwd)
+  return h.hexdigest()
+
+def execute(args, srcfile, objfile, cwd=None):
+  """
+  Execute a command compiling 'srcfile' to 'objfile', in the directory 'cwd'
+  if given, unless its output is already cached. Return the output of the
+  command.
+  """
+  if not enabled:
+    return util.execute(args, cwd)
+
+  entry = entry_name(key(args, srcfile, objfile, cwd or ''))
+  objfile = os.path.join(cwd or '', objfile)
+  try:
+    shutil.copyfile(entry+'.o', objfile)
+    with open(entry+'.log', 'r') as f:
+      s = f.read()
+    os.utime(entry+'.o')
+    return s
+  except IOError:
+    pass
+
+  s = util.execute(args, cwd)
+  insert(entry, objfile, s)
+  return s
+
+def call(args, srcfile, objfile, v=False, cwd=None):
+  """
+  As util.call, but using the cache.
+  """
+  return util.call(args, v, lambda x: execute(x, srcfile, objfile, cwd))
+
+def entry_name(k):
+  return os.path.join(path, k[:2], k)
+
+def lookup(k, ext):
+  """
+  Return the contents of the file cached for key 'k' with extension 'ext', or
+  None if there is no such file.
+  """
+  name = entry_name(k)+ext
+  try:
+    with open(name, 'r') as f:
+      s = f.read()
+    os.utime(name)
+    return s
+  except IOError:
+    return None
+
+def store(k, ext, data):
+  """
+  Cache a file for key 'k' with extension 'ext'.
+  """
+  try:
+    write(entry_name(k)+ext, data)
+    evict()
+  except (IOError, OSError):
+    pass
+
+def write(name, data):
+  """
+  Atomically write a file in the cache.
+  """
+  d = os.path.dirname(name)
+  os.makedirs(d, exist_ok=True)
+  (fd, tmp) = tempfile.mkstemp(dir=d, prefix=TMP_PREFIX)
+  with os.fdopen(fd, 'w') as f:
+    f.write(data)
+  os.replace(tmp, name)
+
+def insert(entry, objfile, output):
+  """
+  Add a new entry to the cache, then evict entries if it has grown too large.
+  Failure to write to the cache is not an error.
+  """
+  try:
+    write(entry+'.log', output)
+    (fd, tmp) = tempfile.mkstemp(dir=os.path.dirname(entry),
+        prefix=TMP_PREFIX)
+    os.close(fd)
+    shutil.copyfile(objfile, tmp)
+    os.replace(tmp, entry+'.o')
+    evict()
+  except (IOError, OSError):
+    pass
+
+def entries():
+  """
+  Return a list of (mtime, size, file) for each entry in the cache, where
+  the output of a command is counted with its object file.
+  """
+  es = []
+  for (dirpath, dirnames, filenames) in os.walk(path):
+    for x in filenames:
+      if not (x.endswith('.log') or x.startswith(TMP_PREFIX)):
+        name = os.path.join(dirpath, x)
+        try:
+          st = os.stat(name)
+          es.append((st.st_mtime, st.st_size, name))
+        except OSError:
+          pass
+  return es
+
+def evict():
+  """
+  Remove the least recently used entries until the cache fits its size.
+  """
+  es = sorted(entries())
+  total = sum([x[1] for x in es])
+  for (mtime, size, name) in es:
+    if total <= max_size:
+      break
+    util.remove_file(name)
+    if name.endswith('.o'):
+      util.remove_file(name[:-2]+'.log')
+    total -= size
+
+def clear(v=False):
+  """
+  Remove every entry in the cache.
+  """
+  vmsg(v, 'Clearing object cache '+path)
+  shutil.rmtree(path, ignore_errors=True)
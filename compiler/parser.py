@@ -13,19 +13,39 @@ import ast
 
 class Coord(object):
   """ 
-  Coordinates (file, line, col) of a syntactic element.
+  Coordinates (file, line, col) of a syntactic element, kept as its position
+  in the source and found only when they are formatted.
   """
-  def __init__(self, file, line, column=None):
-    self.file = file
-    self.line = line
-    self.column = column
-    #print('new coord: {}:{}'.format(line, column))
+  __slots__ = ('source', 'lexpos')
+
+  def __init__(self, source, lexpos):
+    self.source = source
+    self.lexpos = lexpos
+
+  @property
+  def file(self):
+    return self.source.name
+
+  @property
+  def line(self):
+    return self.source.line(self.lexpos)
+
+  @property
+  def column(self):
+    return self.source.column(self.lexpos)
 
   def __str__(self):
     str = "%s:%s" % (self.file, self.line)
     if self.column: str += ":%s" % self.column
     return str
 
+  # Coordinates are not changed, so copies can share them.
+  def __copy__(self):
+    return self
+
+  def __deepcopy__(self, memo):
+    return self
+
 
 class Parser(object):
   """ 
@@ -51,9 +71,11 @@ class Parser(object):
         debug=yacc_debug, 
         optimize=yacc_optimise)
 
-  def parse(self, text, filename='', debug=0):
+  def parse(self, text, filename='', debug=0, tracking=True):
     """ 
-    Parse a file and return the AST.
+    Parse a file and return the AST. Without tracking, the positions of
+    productions are not followed (for large generated inputs), so only those
+    of tokens are known and the others are given the start of the file.
     """
     if filename:
       self.filename = os.path.basename(filename)
@@ -62,24 +84,22 @@ class Parser(object):
     self.lexer.filename = self.filename
     self.lexer.reset()
     return self.parser.parse(text, lexer=self.lexer, debug=debug,
-        tracking=True)
+        tracking=tracking)
 
   def coord(self, p, index=1):
     """ 
     Return a coordinate for a production.
     """
-    return Coord(file=self.filename, line=p.lineno(index), 
-        column=self.lexer.findcol(self.lexer.data(), p.lexpos(index)))
+    return Coord(self.lexer.source, p.lexpos(index))
   
   def tcoord(self, t):
     """ 
     Return a coordinate for a token.
     """
-    return Coord(file=self.filename, line=t.lineno, 
-        column=self.lexer.findcol(self.lexer.data(), t.lexpos))
+    return Coord(self.lexer.source, t.lexpos)
 
-  def lex_error(self, msg, line, col):
-    self.error.report_error(msg, Coord(line, col))
+  def lex_error(self, msg, lexpos):
+    self.error.report_error(msg, Coord(self.lexer.source, lexpos))
 
   def parse_error(self, msg, coord=None, discard=True):
     self.error.report_error(msg, coord)
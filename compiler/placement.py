@@ -0,0 +1,192 @@
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+from collections import Counter
+from itertools import product
+
+import ast
+from util import vmsg
+
+class Placement(object):
+  """
+  Reorder the blocks of processors InsertOns gives the processes of each
+  distributed parallel composition, so processes connected by channels are
+  close in the topology of the device (see Device.hops).
+
+  The channel graph is taken from the channel tables built by LabelChans: each
+  element of a channel connects the locations of its ends, and the weight of an
+  edge is the number of elements connecting them. Placement then minimises the
+  total weighted hop distance with a greedy mapping. The compositions are
+  visited in pre-order; the first process of each stays at the location of the
+  composition and the block at the next free location is given to the remaining
+  process most strongly connected to the processes already placed, adding least
+  to the total distance to them (the earliest in the composition if there is a
+  tie). Blocks are moved whole, so the processes of a replicator stay
+  contiguous, and the placement is kept only if it reduces the total.
+
+  Programs that place processes explicitly with on are not changed.
+  """
+  def __init__(self, device, ons, v=False):
+    self.device = device
+    self.ons = ons
+    self.v = v
+    self.before = None
+    self.after = None
+
+  def run(self, node):
+    """
+    Place the processes of 'main', updating the inserted ons. Return True if
+    any were moved (so the locations of processes and channels must be
+    labelled again).
+    """
+    main = node.defs[-1]
+    graph = ChannelGraph(self.ons.ons)
+    main.accept(graph)
+    if graph.explicit:
+      vmsg(self.v, '  processes placed explicitly')
+      return False
+    self.edges = graph.edges()
+    self.adj = {}
+    for ((a, b), w) in self.edges.items():
+      self.adj.setdefault(a, []).append((b, w))
+      self.adj.setdefault(b, []).append((a, w))
+
+    n = max([self.ons.size] + [x+1 for x in self.adj.keys()])
+    self.place = list(range(n))
+    self.before = self.cost(self.place)
+    [self.par(d, sizes) for (x, d, sizes) in self.ons.pars]
+    self.after = self.cost(self.place)
+    if self.after >= self.before:
+      self.place = list(range(n))
+      self.after = self.before
+    vmsg(self.v, '  hop cost {} before placement, {} after'.format(
+        self.before, self.after))
+    if self.after == self.before:
+      return False
+
+    for x in self.ons.ons:
+      x.expr.elem.value = self.place[x.expr.elem.value]
+    return True
+
+  def cost(self, place):
+    """
+    Return the total weighted hop distance of a placement.
+    """
+    return sum([w * self.device.hops(place[a], place[b])
+      for ((a, b), w) in self.edges.items()])
+
+  def par(self, d, sizes):
+    """
+    Place the blocks of the processes of a parallel composition at d. Each
+    location l of the block of a process moves by the same amount, so
+    self.place[l] is its location relative to the start of the block.
+    """
+    if 0 in sizes:
+      return
+    starts = [d + sum(sizes[:i]) for i in range(len(sizes))]
+    owner = {}
+    for i in range(1, len(sizes)):
+      for l in range(starts[i], starts[i]+sizes[i]):
+        owner[l] = i
+    pending = list(range(1, len(sizes)))
+    free = self.place[d] + sizes[0]
+    while pending:
+      (w, c, i) = min([(-self.weight(starts[i], sizes[i], owner, pending),
+          self.shift_cost(starts[i], sizes[i], free - self.place[starts[i]],
+            owner, pending), i) for i in pending])
+      self.shift(starts[i], sizes[i], free - self.place[starts[i]])
+      pending.remove(i)
+      free += sizes[i]
+
+  def weight(self, start, size, owner, pending):
+    """
+    Return the weight of the edges of a block to the processes placed.
+    """
+    i = owner[start]
+    return sum([w for l in range(start, start+size)
+      for (m, w) in self.adj.get(l, [])
+      if owner.get(m) != i and not owner.get(m) in pending])
+
+  def shift_cost(self, start, size, delta, owner, pending):
+    """
+    Return the weighted hop distance of the edges of a block moved by delta,
+    to the processes placed and within itself.
+    """
+    c = 0
+    i = owner[start]
+    for l in range(start, start+size):
+      for (m, w) in self.adj.get(l, []):
+        j = owner.get(m)
+        if j == i:
+          if m > l:
+            c += w * self.device.hops(self.place[l]+delta, self.place[m]+delta)
+        elif not j in pending:
+          c += w * self.device.hops(self.place[l]+delta, self.place[m])
+    return c
+
+  def shift(self, start, size, delta):
+    for l in range(start, start+size):
+      self.place[l] += delta
+
+
+class ChannelGraph(ast.NodeVisitor):
+  """
+  Collect the edges between the locations of the ends of each channel
+  declared in a procedure, and whether any process is placed by an on other
+  than those inserted.
+  """
+  def __init__(self, ons):
+    self.ons = set([id(x) for x in ons])
+    self.scopes = []
+    self.explicit = False
+
+  def visit_stmt_seq(self, node):
+    if getattr(node, 'scope', None) != None:
+      self.scopes.append(node.scope)
+
+  visit_stmt_par = visit_stmt_seq
+  visit_stmt_server = visit_stmt_seq
+
+  def visit_stmt_on(self, node):
+    if not id(node) in self.ons:
+      self.explicit = True
+
+  def edges(self):
+    """
+    Return a Counter of the elements connecting each pair of locations.
+    """
+    edges = Counter()
+    def add(a, b):
+      if (isinstance(a, int) and isinstance(b, int) and a != b
+          and min(a, b) >= 0):
+        edges[(min(a, b), max(a, b))] += 1
+    for s in self.scopes:
+      for c in s.tab.values():
+        for (x, i) in c.elements():
+          l = c.locations(i)
+          [add(l[0], y) for y in l[1:]]
+        for x in c.symbolic:
+          m = x.map
+          if m.master and m.partner != None:
+            for (a, b) in symbolic_edges(m, m.partner):
+              add(a, b)
+    return edges
+
+
+def symbolic_edges(a, b):
+  """
+  Return the pairs of locations connected by the elements of a pair of
+  ChanMaps: the process at the offset w of the combined index uses element
+  start + sum_j s_j*((w_j + o_j) rem n_j), so for each element the offset
+  of the process at either end is found by inverting the rotation.
+  """
+  pairs = []
+  for q in product(*[range(n) for n in a.dims]):
+    (x, y) = (0, 0)
+    for (j, n) in enumerate(a.dims):
+      x += a.strides[j] * ((q[j] - a.offsets[j]) % n)
+      y += b.strides[j] * ((q[j] - b.offsets[j]) % n)
+    pairs.append((a.base + a.step*x, b.base + b.step*y))
+  return pairs
@@ -79,6 +79,10 @@ class Printer(NodeWalker):
     elif node.type == T_VAR_ARRAY:
       return 'var {}[{}]'.format(node.name, self.expr(node.expr))
     
+    elif node.type == T_VAL_ARRAY:
+      return 'val {}[{}] is [{}]'.format(node.name, len(node.expr),
+          ', '.join([self.expr(x) for x in node.expr]))
+    
     elif node.type == T_REF_ARRAY:
       return node.name+'[]'
    
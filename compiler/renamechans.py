@@ -4,7 +4,7 @@
 # LICENSE.txt and at <http://github.xcore.com/>
 
 from walker import NodeWalker
-from cmpexpr import CmpExpr
+from cmpexpr import cmp_expr
 from symboltab import Symbol
 from typedefs import *
 import ast
@@ -40,7 +40,7 @@ class RenameChans(NodeWalker):
 
     elif isinstance(elem, ast.ElemSub) and elem.symbol.type == T_CHAN_ARRAY:
       for x in chans:
-        if elem.name == x.name and CmpExpr().expr(elem.expr, x.expr):
+        if elem.name == x.name and cmp_expr(elem.expr, x.expr):
           t = T_CHANEND_SINGLE
           if x.symbol.scope == T_SCOPE_SERVER:
             t = T_CHANEND_SERVER_SINGLE
@@ -82,7 +82,7 @@ class RenameChans(NodeWalker):
 
     #elif isinstance(elem, ast.ElemSub) and elem.symbol.type == T_CHANEND_ARRAY:
     #  for x in chans:
-    #    if elem.name == x.name and CmpExpr().expr(elem.expr, x.expr):
+    #    if elem.name == x.name and cmp_expr(elem.expr, x.expr):
     #      s = Symbol(x.chanend, T_CHANEND_SINGLE, T_SCOPE_PROC)
     #      e = ast.ElemId(x.chanend)
     #      e.symbol = s
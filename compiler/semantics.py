@@ -396,7 +396,9 @@ class Semantics(NodeWalker):
   def decl(self, node):
 
     # Children
-    if node.expr:
+    if node.type == T_VAL_ARRAY:
+      [self.expr(x) for x in node.expr]
+    elif node.expr:
       self.expr(node.expr)
     
     # Check the symbol doesn't already exist in scope
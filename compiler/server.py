@@ -0,0 +1,134 @@
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+import sys
+import os
+import io
+import socket
+import signal
+import shutil
+import tempfile
+import traceback
+
+import util
+from util import vmsg
+from client import default_socket
+from client import send_msg, recv_msg
+from client import encode_file, decode_file
+
+BACKLOG = 16
+INPUT_DIR = 'inputs'
+
+# The compile server is a long-lived process that has already imported the
+# compiler, built the parser and loaded the system definitions. Each request
+# is handled in a child process forked from it, so that all of the
+# per-compilation state (the symbol and signature tables, the error log and
+# the module-level globals of main, definitions, config and the build
+# modules) is a private copy that is discarded when the request completes.
+
+def serve(compile, path=None, v=False):
+  """
+  Listen for compilation requests on a Unix socket. 'compile' is called with
+  the argument list of each request and returns an exit status.
+  """
+  path = path if path else default_socket()
+  util.remove_file(path)
+  sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  sock.bind(path)
+  sock.listen(BACKLOG)
+  vmsg(v, 'Compile server listening on '+path)
+
+  # Let children be reaped automatically
+  signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+  try:
+    while True:
+      (conn, addr) = sock.accept()
+      pid = os.fork()
+      if pid == 0:
+        # Restore the default so the build can wait on external commands
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        sock.close()
+        try:
+          handle(conn, compile)
+        finally:
+          conn.close()
+          os._exit(0)
+      conn.close()
+
+  except KeyboardInterrupt:
+    pass
+
+  finally:
+    sock.close()
+    util.remove_file(path)
+
+def handle(conn, compile):
+  """
+  Handle a single request in a temporary working directory: write out the
+  input files, run the compiler capturing its output and return everything
+  it produced.
+  """
+  req = recv_msg(conn)
+  workdir = tempfile.mkdtemp(prefix='sire-')
+  try:
+    os.chdir(workdir)
+    (args, inputs, outputs) = localise(req)
+    resp = {'stdout': '', 'stderr': '', 'files': {}}
+    resp['status'] = run(compile, args, req.get('stdin', ''), resp)
+
+    # Return everything produced in the working directory
+    for (dirpath, dirnames, filenames) in os.walk('.'):
+      for x in filenames:
+        name = os.path.normpath(os.path.join(dirpath, x))
+        if not name in inputs:
+          resp['files'][outputs.get(name, name)] = encode_file(name)
+    send_msg(conn, resp)
+
+  finally:
+    os.chdir('/')
+    shutil.rmtree(workdir, ignore_errors=True)
+
+def localise(req):
+  """
+  Write the input files into the working directory and rewrite the arguments
+  to refer to them. Each is written in its own directory, keeping its name, so
+  inputs with the same name from different directories are kept apart. Return
+  the new arguments, the set of input file names and a map from local output
+  names to the names requested by the client.
+  """
+  args = list(req['args'])
+  inputs = set()
+  outputs = {}
+  for (i, (index, name, data)) in enumerate(req['files']):
+    local = os.path.join(INPUT_DIR, str(i), os.path.basename(name))
+    decode_file(local, data)
+    inputs.add(local)
+    args[index] = local
+  if req['outfile']:
+    local = os.path.basename(req['outfile'])
+    outputs[local] = req['outfile']
+    i = args.index('-o')
+    args[i+1] = local
+  return (args, inputs, outputs)
+
+def run(compile, args, stdin, resp):
+  """
+  Run the compiler with its standard streams redirected into the response.
+  """
+  streams = (sys.stdin, sys.stdout, sys.stderr)
+  sys.stdin = io.StringIO(stdin)
+  sys.stdout = io.StringIO()
+  sys.stderr = io.StringIO()
+  try:
+    status = compile(args)
+  except BaseException:
+    traceback.print_exc()
+    status = 1
+  finally:
+    resp['stdout'] = sys.stdout.getvalue()
+    resp['stderr'] = sys.stderr.getvalue()
+    (sys.stdin, sys.stdout, sys.stderr) = streams
+  return status
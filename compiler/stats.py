@@ -0,0 +1,187 @@
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+import sys
+import os
+import time
+import json
+import resource
+import tracemalloc
+import threading
+from contextlib import contextmanager
+
+from ast import NodeVisitor
+
+# Report formats
+STATS_TEXT = 'text'
+STATS_JSON = 'json'
+STATS_FORMATS = [STATS_TEXT, STATS_JSON]
+
+# Globals
+enabled = False
+stages = []
+active = []
+
+class CountNodes(NodeVisitor):
+  """
+  An AST visitor to count the number of nodes in a tree. Every node calls
+  down() exactly once when it accepts a visitor.
+  """
+  def __init__(self):
+    self.count = 0
+
+  def down(self, tag):
+    self.count += 1
+
+class CompileStage(object):
+  """
+  A record of the resources used by a single stage of compilation:
+   - wall and CPU time (in seconds), CPU time is split between this process
+     and any external commands it waited on.
+   - peak memory (in bytes) traced during the stage.
+   - the number of AST nodes before and after the stage.
+  """
+  def __init__(self, name, depth):
+    self.name = name
+    self.depth = depth
+    self.wall = 0
+    self.cpu = 0
+    self.child_cpu = 0
+    self.peak = 0
+    self.nodes_before = None
+    self.nodes_after = None
+
+  def as_dict(self):
+    return {
+      'name':         self.name,
+      'depth':        self.depth,
+      'wall':         self.wall,
+      'cpu':          self.cpu,
+      'child_cpu':    self.child_cpu,
+      'peak_memory':  self.peak,
+      'nodes_before': self.nodes_before,
+      'nodes_after':  self.nodes_after,
+    }
+
+def init(enable=False):
+  """
+  (Re)initialise the statistics. Memory tracing is only started when stats
+  are enabled as it slows down compilation considerably.
+  """
+  global enabled
+  global stages
+  global active
+  enabled = enable
+  stages = []
+  active = []
+  if enabled and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+def count_nodes(node):
+  """
+  Return the number of nodes in an AST.
+  """
+  if node == None:
+    return None
+  c = CountNodes()
+  node.accept(c)
+  return c.count
+
+def child_cpu_time():
+  r = resource.getrusage(resource.RUSAGE_CHILDREN)
+  return r.ru_utime + r.ru_stime
+
+@contextmanager
+def stage(name, ast=None):
+  """
+  Record the statistics of a compilation stage executed in the body of a
+  with statement. Stages may be nested, in which case the peak memory of an
+  inner stage also contributes to the outer one.
+  """
+  if not enabled:
+    yield None
+    return
+
+  if threading.current_thread() is not threading.main_thread():
+    yield from concurrent_stage(name)
+    return
+
+  s = CompileStage(name, len(active))
+  stages.append(s)
+  s.nodes_before = count_nodes(ast)
+
+  # Fold the peak so far into the enclosing stage before resetting it
+  if active:
+    active[-1].peak = max(active[-1].peak, tracemalloc.get_traced_memory()[1])
+  tracemalloc.reset_peak()
+  active.append(s)
+
+  wall = time.perf_counter()
+  cpu = time.process_time()
+  child_cpu = child_cpu_time()
+  try:
+    yield s
+  finally:
+    s.wall = time.perf_counter() - wall
+    s.cpu = time.process_time() - cpu
+    s.child_cpu = child_cpu_time() - child_cpu
+    s.peak = max(s.peak, tracemalloc.get_traced_memory()[1])
+    s.nodes_after = count_nodes(ast)
+    active.pop()
+    if active:
+      active[-1].peak = max(active[-1].peak, s.peak)
+    tracemalloc.reset_peak()
+
+def concurrent_stage(name):
+  """
+  Record a stage run in another thread (by the build job scheduler) while the
+  main thread waits inside an enclosing stage. Only the wall time and the CPU
+  time of the thread are recorded as memory tracing and the CPU time of child
+  processes cannot be separated between concurrent stages.
+  """
+  s = CompileStage(name, len(active))
+  stages.append(s)
+  wall = time.perf_counter()
+  cpu = time.thread_time()
+  try:
+    yield s
+  finally:
+    s.wall = time.perf_counter() - wall
+    s.cpu = time.thread_time() - cpu
+
+def command_name(args):
+  """
+  Give an external command a short stage name, e.g. 'xcc program.xc ->
+  program.S'.
+  """
+  out = args[args.index('-o')+1] if '-o' in args[:-1] else None
+  files = [os.path.basename(x) for x in args[1:]
+      if not x.startswith('-') and x != out and '.' in os.path.basename(x)]
+  name = ' '.join([os.path.basename(args[0])] + files[:1])
+  return name if out == None else name+' -> '+os.path.basename(out)
+
+def report(fmt, info={}, buf=None):
+  """
+  Write out a report of all the recorded stages in either a human-readable
+  or a JSON format.
+  """
+  buf = buf if buf else sys.stdout
+  if fmt == STATS_JSON:
+    d = dict(info)
+    d['stages'] = [x.as_dict() for x in stages]
+    buf.write(json.dumps(d, indent=2)+'\n')
+    return
+
+  def value(x):
+    return '{:>8}'.format('-' if x == None else x)
+
+  buf.write('{:<40} {:>9} {:>9} {:>9} {:>10} {:>8} {:>8}\n'.format(
+      'Stage', 'Wall(s)', 'CPU(s)', 'Child(s)', 'Peak(KB)', 'Before', 'After'))
+  buf.write('-'*99+'\n')
+  for x in stages:
+    buf.write('{:<40} {:>9.3f} {:>9.3f} {:>9.3f} {:>10,.1f} {} {}\n'.format(
+        ('  '*x.depth+x.name)[:40], x.wall, x.cpu, x.child_cpu,
+        x.peak/1000, value(x.nodes_before), value(x.nodes_after)))
+  buf.flush()
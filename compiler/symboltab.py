@@ -42,8 +42,9 @@ class SymbolTable(object):
       s = self.scopes[-1][TAB][x]
       debug(self.debug, "  Popped '{}' type {}".format(s.name, s.type))
 
-      # If symbol hasn't been used, give a warning
-      if not s.mark and warn_unused:
+      # If symbol hasn't been used, give a warning (unless it was made by the
+      # compiler: identifiers in the source cannot begin with '_')
+      if not s.mark and warn_unused and not s.name.startswith('_'):
         self.error.report_warning("'{}' declared but not used".format(s.name))
    
     tab = self.scopes.pop()
@@ -8,17 +8,17 @@ from target.definitions import *
 from target.xs1.device import get_xs1_device
 from target.mpi.device import get_mpi_device
 
-def set_device(target_system, num_cores):
+def set_device(target_system, num_cores, ranks_per_host=None):
   """ 
   Return a device object representing the target system with a specified
-  number of cores.
+  number of cores (and, for MPI, the number of ranks on each host).
   """
   # XS1
   if target_system == SYSTEM_TYPE_XS1:
     return get_xs1_device(num_cores)
   # MPI
   elif target_system == SYSTEM_TYPE_MPI:
-    return get_mpi_device(num_cores)
+    return get_mpi_device(num_cores, ranks_per_host)
 
   # Otherwise
   else:
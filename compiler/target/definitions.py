@@ -19,6 +19,8 @@ XS1_BINARY_FILE_EXT   = 'xe'
 XS1_DEVICE_TYPE_G     = 'G'
 XS1_DEVICE_TYPE_L     = 'L'
 
+XS1_NUM_THREADS       = 8
+
 # MPI definitions
 
 MPI_SOURCE_FILE_EXT   = 'c'
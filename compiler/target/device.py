@@ -15,6 +15,30 @@ class Device(object):
 
   def num_cores(self):
     return self.num_nodes
+
+  def num_threads(self):
+    """
+    Return the number of threads available on each core, or None if it is
+    not limited.
+    """
+    return None
+
+  def num_process_threads(self):
+    """
+    Return the number of processes that may share a core as threads, half
+    its threads (leaving the rest for those the processes create), or None
+    if it is not limited.
+    """
+    n = self.num_threads()
+    return n // 2 if n != None else None
+
+  def hops(self, a, b):
+    """
+    Return the distance between cores a and b, as the number of links a
+    message between them crosses. Without a model of the interconnect, every
+    other core is one hop away.
+    """
+    return 0 if a == b else 1
   
   def __str__(self):
     return '{}{}{}'.format(
@@ -14,6 +14,9 @@ from math import floor
 import definitions as defs
 import config
 import util
+import objcache
+import jobs
+from jobs import Job
 from util import vmsg
 from error import Error
 import builtin
@@ -32,10 +35,13 @@ RUNTIME_FILES = ['main.c', 'slave.c', 'source.c', 'host.c']
 BUILTIN_FILES = ['builtins.c']
 
 def build_mpi(device, buf, outfile, 
-        compile_only, show_calls=False, v=False):
+        compile_only, show_calls=False, v=False, num_jobs=1, 
+        work_dir=None):
     """
     Run the build process to create either the assembly output or the complete
-    binary.
+    binary. The build takes place in its own work directory, 'work_dir' or a
+    temporary one, and only the binary is moved out of it. The external
+    commands are run by the job scheduler with up to 'num_jobs' at once.
     """
     # Add the include paths once they have been set
     include_dirs = ['-I', '.']
@@ -46,87 +52,99 @@ def build_mpi(device, buf, outfile,
     COMPILE_FLAGS += include_dirs
     ASSEMBLE_FLAGS += include_dirs
 
+    with util.work_dir(work_dir, False, v) as d:
+        build(device, buf, outfile, compile_only, show_calls, v, num_jobs,
+                d, work_dir == None)
+
+def build(device, buf, outfile, compile_only, show_calls, v, num_jobs, d,
+        clean=True):
+    """
+    Run the build in the work directory 'd'. The output file is relative to
+    the working directory of the process.
+    """
     try:
         
         # Create headers
-        create_headers(device, v)
+        create_headers(device, d, v)
 
         if compile_only:
             raise SystemExit() 
 
         # Compile the program and runtime
-        assemble_str(PROGRAM, buf.getvalue(), show_calls, v)
+        util.write_file(os.path.join(d, PROGRAM), buf.getvalue())
         buf.close()
-        assemble_runtime(show_calls, v)
-        assemble_builtins(show_calls, v)
-        link(show_calls, v)
+        jobs.run([assemble_job(PROGRAM, d)]
+                + runtime_jobs(d) + builtin_jobs(d) + [link_job(d)],
+                num_jobs, show_calls, v)
 
         # Rename the output file
         outfile = (outfile if outfile!=defs.DEFAULT_OUT_FILE else
                 outfile+'.'+device.binary_file_ext())
-        os.rename(BINARY, outfile)
+        util.move_file(os.path.join(d, BINARY), outfile)
 
         vmsg(v, 'Produced file: '+outfile)
 
     finally:
-        cleanup(v)
+        if clean:
+            cleanup(d, v)
 
-def create_headers(device, v):
+def create_headers(device, d, v):
     vmsg(v, 'Creating device header '+DEVICE_HDR)
     s = ''
     s += '#define NUM_CORES {}\n'.format(device.num_cores())
-    util.write_file(DEVICE_HDR, s)
+    util.write_file(os.path.join(d, DEVICE_HDR), s)
 
-def assemble_str(name, string, show_calls, v, cleanup=True):
+def assemble_job(srcfile, d):
     """ 
-    Assemble a buffer containing a c program.
+    Assemble a c program.
     """
-    srcfile = name + '.c'
-    outfile = name + '.o'
-    vmsg(v, 'Assembling '+srcfile+' -> '+outfile)
-    util.write_file(srcfile, string)
-    util.call([MPICC, srcfile, '-o', outfile] + ASSEMBLE_FLAGS, show_calls)
-    if cleanup: 
-        os.remove(srcfile)
-
-def assemble_runtime(show_calls, v):
-    vmsg(v, 'Compiling runtime:')
-    for x in RUNTIME_FILES:
-        objfile = x+'.o'
-        vmsg(v, '  '+x+' -> '+objfile)
-        util.call([MPICC, config.MPI_RUNTIME_PATH+'/'+x, 
-            '-o', objfile] + ASSEMBLE_FLAGS, show_calls)
+    outfile = srcfile + '.o'
+    return Job(outfile, [MPICC, srcfile, '-o', outfile] + ASSEMBLE_FLAGS,
+            msg='Assembling '+srcfile+' -> '+outfile, quiet=True, cwd=d)
 
-def assemble_builtins(show_calls, v):
-    vmsg(v, 'Compiling builtins:')
-    for x in BUILTIN_FILES:
+def object_jobs(cc, path, files, d):
+    js = []
+    for x in files:
         objfile = x+'.o'
-        vmsg(v, '  '+x+' -> '+objfile)
-        util.call([CC, config.MPI_SYSTEM_PATH+'/'+x, 
-            '-o', objfile] + ASSEMBLE_FLAGS, show_calls)
-
-def link(show_calls, v):
+        srcfile = path+'/'+x
+        js.append(Job(objfile, [cc, srcfile, '-o', objfile] + ASSEMBLE_FLAGS,
+                run=lambda args, s=srcfile, o=objfile: 
+                    objcache.execute(args, s, o, d),
+                msg='  '+x+' -> '+objfile, quiet=True))
+    return js
+
+def runtime_jobs(d):
+    js = object_jobs(MPICC, config.MPI_RUNTIME_PATH, RUNTIME_FILES, d)
+    js[0].msg = 'Compiling runtime:\n'+js[0].msg
+    return js
+
+def builtin_jobs(d):
+    js = object_jobs(CC, config.MPI_SYSTEM_PATH, BUILTIN_FILES, d)
+    js[0].msg = 'Compiling builtins:\n'+js[0].msg
+    return js
+
+def link_job(d):
     """ 
     Link the complete executable.
     """
-    vmsg(v, 'Linking executable -> '+BINARY)
-    util.call([MPICC, 'program.c.o'] 
+    objs = ([PROGRAM+'.o'] 
         + [x+'.o' for x in RUNTIME_FILES] 
-        + [x+'.o' for x in BUILTIN_FILES]
-        + ['-o', BINARY] 
-        + LINK_FLAGS, 
-        show_calls)
+        + [x+'.o' for x in BUILTIN_FILES])
+    return Job(BINARY, [MPICC] + objs + ['-o', BINARY] + LINK_FLAGS, objs, 
+            msg='Linking executable -> '+BINARY, quiet=True, cwd=d)
 
-def cleanup(v):
+def cleanup(d, v):
     """ 
-    Renanme the output file and delete any temporary files.
+    Renanme the output file and delete any temporary files in the work
+    directory 'd'.
     """
     vmsg(v, 'Cleaning up')
     
     # Remove specific files
-    util.remove_file(DEVICE_HDR)
+    util.remove_file(os.path.join(d, DEVICE_HDR))
+    util.remove_file(os.path.join(d, PROGRAM))
     
     # Remove runtime objects
-    for x in glob.glob('*.o'):
+    for x in glob.glob(os.path.join(d, '*.o')):
         util.remove_file(x)
 
@@ -7,8 +7,21 @@ from target.definitions import *
 from target.device import Device
 
 class MPIDevice(Device):
-    def __init__(self, name, num_nodes):
+    def __init__(self, name, num_nodes, ranks_per_host=None):
         super(MPIDevice, self).__init__(SYSTEM_TYPE_MPI, None, name, num_nodes)
+        self.ranks_per_host = ranks_per_host
+
+    def hops(self, a, b):
+        """
+        Ranks on the same host communicate through shared memory (one hop)
+        and others over the network (two). By default all ranks are on one
+        host.
+        """
+        if a == b:
+            return 0
+        if self.ranks_per_host == None:
+            return 1
+        return 1 if a // self.ranks_per_host == b // self.ranks_per_host else 2
     
     def source_file_ext(self):
         return MPI_SOURCE_FILE_EXT
@@ -19,6 +32,6 @@ class MPIDevice(Device):
     def binary_file_ext(self):
         return MPI_BINARY_FILE_EXT
 
-def get_mpi_device(num_cores):
-    return MPIDevice(SYSTEM_TYPE_MPI, num_cores)
+def get_mpi_device(num_cores, ranks_per_host=None):
+    return MPIDevice(SYSTEM_TYPE_MPI, num_cores, ranks_per_host)
 
@@ -178,6 +178,9 @@ class TranslateMPI(NodeWalker):
       return 'int '+node.name+';'
     elif node.type == T_VAL_SINGLE:
       return '#define '+node.name+' {}'.format(self.expr(node.expr))
+    elif node.type == T_VAL_ARRAY:
+      return 'const int {}[{}] = {{{}}};'.format(node.name, len(node.expr),
+          ', '.join([self.expr(x) for x in node.expr]))
     elif node.type == T_CHANEND_SINGLE:
       return 'chanend'
     elif node.type == T_CHAN_SINGLE:
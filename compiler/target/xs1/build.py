@@ -15,6 +15,10 @@ import math
 import definitions as defs
 import config
 import util
+import objcache
+import jobs
+import transcache
+from jobs import Job
 from util import vmsg
 from error import Error
 import builtin
@@ -65,10 +69,13 @@ RUNTIME_FILES = [
   
 def build_xs1(sig, device, program_buf, outfile, 
     compile_only, display_memory, 
-    show_calls=False, save_temps=False, v=False):
+    show_calls=False, save_temps=False, v=False, num_jobs=1, work_dir=None):
   """ 
   Run the build process to create either the assembly output or the complete
-  binary.
+  binary. The build takes place in its own work directory, 'work_dir' or a
+  temporary one, and only the output file is moved out of it. The external
+  commands of a complete build are run by the job scheduler with up to
+  'num_jobs' at once.
   """
   # Add the include paths once they have been set
   include_dirs = ['-I', '.']
@@ -79,54 +86,65 @@ def build_xs1(sig, device, program_buf, outfile,
   COMPILE_FLAGS += include_dirs
   ASSEMBLE_FLAGS += include_dirs
 
+  with util.work_dir(work_dir, save_temps, v) as d:
+    build(sig, device, program_buf, outfile, compile_only, display_memory,
+        show_calls, save_temps or work_dir, v, num_jobs, d)
+
+def build(sig, device, program_buf, outfile, compile_only, display_memory,
+    show_calls, save_temps, v, num_jobs, d):
+  """
+  Run the build in the work directory 'd'. The output file is relative to
+  the working directory of the process.
+  """
   # Try to run the build, pass any Error or SystemExit exceptions along to
   # main driver after having cleaned up and temporary files.
   try:
 
     # Create headers
-    create_headers(device, v)
-
-    # Generate the assembly
-    (lines, cp) = generate_assembly(sig, program_buf, show_calls, v, save_temps)
+    create_headers(device, d, v)
 
     if compile_only:
       
+      # Generate the assembly
+      (lines, cp) = generate_assembly(sig, program_buf, d, show_calls, v,
+          save_temps)
+
       # Write the program back out and assemble
-      util.write_file(PROGRAM_ASM, ''.join(lines))
+      util.write_file(os.path.join(d, PROGRAM_ASM), ''.join(lines))
 
       # Rename the output file
       outfile = (outfile if outfile!=defs.DEFAULT_OUT_FILE else
           outfile+'.'+device.assembly_file_ext())
-      os.rename(PROGRAM_ASM, outfile)
+      util.move_file(os.path.join(d, PROGRAM_ASM), outfile)
 
       raise SystemExit() 
 
-    # Write the program back out and assemble
-    assemble_str(PROGRAM, 'S', ''.join(lines), show_calls, v)
-
-    # Write the cp out and assemble
-    assemble_str(CONST_POOL, 'S', ''.join(cp), show_calls, v)
-
-    # Output and assemble the master jump table
+    # Write out the program and the master jump table
+    util.write_file(os.path.join(d, PROGRAM_SRC), program_buf.getvalue())
+    program_buf.close()
     buf = io.StringIO()
     build_master_tab_init(sig, buf, v)
-    #print(buf.getvalue())
-    assemble_str(MASTER_TABLES, 'S', buf.getvalue(), show_calls, v, save_temps)
-
-    # Assemble and link the rest
-    assemble_runtime(device, show_calls, v)
-    link_master(device, show_calls, v)
-    link_slave(device, show_calls, v)
-    replace_images(show_calls, v)
+    util.write_file(os.path.join(d, MASTER_TABLES+'.S'), buf.getvalue())
+
+    # Compile, assemble and link everything
+    jobs.run(
+        [compile_job(PROGRAM, d), modify_job(sig, d)]
+        + [assemble_job(PROGRAM, d, ['modify']),
+           assemble_job(CONST_POOL, d, ['modify']),
+           assemble_job(MASTER_TABLES, d)]
+        + runtime_jobs(d)
+        + [link_master_job(d), link_slave_job(d)]
+        + replace_images_jobs(d),
+        num_jobs, show_calls, v)
     
     # Dump memory usage information
     if display_memory:
-      dump_memory_use()
+      dump_memory_use(d)
 
     # Append XE to header in output file
     outfile = (outfile if outfile!=defs.DEFAULT_OUT_FILE else
         outfile+'.se')
-    append_header(device, outfile, show_calls, v)
+    append_header(device, d, outfile, show_calls, v)
     vmsg(v, 'Produced file: '+outfile)
 
   except Error as e:
@@ -140,9 +158,9 @@ def build_xs1(sig, device, program_buf, outfile,
     
   finally:
     if not save_temps:
-      cleanup(v)
+      cleanup(d, v)
 
-def create_headers(device, v):
+def create_headers(device, d, v):
   vmsg(v, 'Creating device header '+DEVICE_HDR)
   s =  '#define NUM_CORES {}\n'.format(device.num_cores())
   s += '#define NUM_CORES_LOG {}\n'.format(
@@ -158,72 +176,93 @@ def create_headers(device, v):
   #  s +=  '#define XS1_G\n'
   #elif device.type == XS1_DEVICE_TYPE_L:
   #  s +=  '#define XS1_L\n'
-  util.write_file(DEVICE_HDR, s)
+  util.write_file(os.path.join(d, DEVICE_HDR), s)
 
-def generate_assembly(sig, buf, show_calls, v, save_temps):
+def generate_assembly(sig, buf, d, show_calls, v, save_temps):
   """ 
   Given the program buffer containing the XC translation, generate the program
   and constant pool assembly.
   """
 
   # Compile the program into an assembly file
-  compile_str(PROGRAM, buf.getvalue(), show_calls, v, save_temps)
+  compile_str(PROGRAM, buf.getvalue(), d, show_calls, v, save_temps)
   buf.close()
 
   # Read the assembly back in
-  lines = util.read_file(PROGRAM_ASM, read_lines=True)
+  lines = util.read_file(os.path.join(d, PROGRAM_ASM), read_lines=True)
 
   # Make modifications
   (lines, cp) = modify_assembly(sig, lines, v)
   
   return (lines, cp)
 
-def compile_str(name, string, show_calls, v, save_temps=True):
+def compile_str(name, string, d, show_calls, v, save_temps=True):
   """ 
-  Compile a buffer containing an XC program.
+  Compile a buffer containing an XC program in the work directory 'd'.
   """
   srcfile = name + '.xc'
   outfile = name + '.S'
   vmsg(v, 'Compiling '+srcfile+' -> '+outfile)
-  util.write_file(srcfile, string)
-  util.call([XCC, srcfile, '-o', outfile] + COMPILE_FLAGS, v=show_calls)
+  util.write_file(os.path.join(d, srcfile), string)
+  util.call([XCC, srcfile, '-o', outfile] + COMPILE_FLAGS, v=show_calls,
+      run=lambda x: util.execute(x, d))
   if not save_temps:
-    os.remove(srcfile)
+    os.remove(os.path.join(d, srcfile))
 
-def assemble_str(name, ext, string, show_calls, v, save_temps=False):
+def compile_job(name, d):
   """ 
-  Assemble a buffer containing an XC or assembly program.
+  Compile an XC program to assembly. When compiling incrementally, the
+  assembly of the whole program is cached, since it is compiled as a single
+  unit (see transcache.py).
   """
-  srcfile = name + '.' + ext
+  srcfile = name + '.xc'
+  outfile = name + '.S'
+  run = None
+  if transcache.enabled:
+    run = lambda args: objcache.execute(args, srcfile, outfile, d)
+  return Job(outfile, [XCC, srcfile, '-o', outfile] + COMPILE_FLAGS, run=run,
+      msg='Compiling '+srcfile+' -> '+outfile, quiet=True, cwd=d)
+
+def modify_job(sig, d):
+  """ 
+  Modify the compiled program assembly and extract the constant pool.
+  """
+  def modify(args):
+    lines = util.read_file(os.path.join(d, PROGRAM_ASM), read_lines=True)
+    (lines, cp) = modify_assembly(sig, lines, False)
+    util.write_file(os.path.join(d, PROGRAM_ASM), ''.join(lines))
+    util.write_file(os.path.join(d, CONST_POOL+'.S'), ''.join(cp))
+    return ''
+  return Job('modify', [], [PROGRAM_ASM], modify, 
+      msg='Modifying assembly output')
+
+def assemble_job(name, d, deps=[]):
+  """ 
+  Assemble an assembly program.
+  """
+  srcfile = name + '.S'
   outfile = name + '.o'
-  vmsg(v, 'Assembling '+srcfile+' -> '+outfile)
-  util.write_file(srcfile, string)
-  if ext == 'xc':
-    s = util.call([XCC, srcfile, '-o', outfile] + ASSEMBLE_FLAGS, v=show_calls)
-    print(s, end='')
-  elif ext == 'S':
-    s = util.call([XAS, srcfile, '-o', outfile], v=show_calls)
-    print(s, end='')
-  if not save_temps: 
-    os.remove(srcfile)
-
-def assemble_runtime(device, show_calls, v):
-  vmsg(v, 'Compiling runtime:')
+  return Job(outfile, [XAS, srcfile, '-o', outfile], deps,
+      msg='Assembling '+srcfile+' -> '+outfile, cwd=d)
+
+def runtime_jobs(d):
+  js = []
   for x in RUNTIME_FILES:
     objfile = x+'.o'
-    vmsg(v, '  '+x+' -> '+objfile)
-    s = util.call([XCC, config.XS1_RUNTIME_PATH+'/'+x, 
-      '-o', objfile] + ASSEMBLE_FLAGS, v=show_calls)
-    print(s, end='')
-
-def link_master(device, show_calls, v):
+    srcfile = config.XS1_RUNTIME_PATH+'/'+x
+    js.append(Job(objfile, [XCC, srcfile, '-o', objfile] + ASSEMBLE_FLAGS,
+        run=lambda args, s=srcfile, o=objfile: objcache.execute(args, s, o, d),
+        msg='  '+x+' -> '+objfile))
+  js[0].msg = 'Compiling runtime:\n'+js[0].msg
+  return js
+
+def link_master_job(d):
   """ 
   The jump table must be located at _cp and the common elements of the
   constant and data pools must be in the same positions relative to _cp and
   _dp in the master and slave images.
   """
-  vmsg(v, 'Linking master -> '+MASTER_XE)
-  s = util.call([XCC, target_1core(), 
+  objs = [
     'system.S.o', 
     'system.xc.o',
     'control.xc.o',
@@ -240,17 +279,16 @@ def link_master(device, show_calls, v):
     'util.xc.o',
     MASTER_TABLES+'.o', 
     CONST_POOL+'.o',
-    'globals.S.o',
-    '-o', MASTER_XE] + LINK_FLAGS, 
-    v=show_calls)
-  print(s, end='')
+    'globals.S.o']
+  return Job(MASTER_XE, [XCC, target_1core()] + objs 
+      + ['-o', MASTER_XE] + LINK_FLAGS, objs, 
+      msg='Linking master -> '+MASTER_XE, cwd=d)
 
-def link_slave(device, show_calls, v):
+def link_slave_job(d):
   """
   As above.
   """
-  vmsg(v, 'Linking slave -> '+SLAVE_XE)
-  s = util.call([XCC, target_1core(), 
+  objs = [
     'system.S.o', 
     'system.xc.o',
     'control.xc.o',
@@ -264,22 +302,32 @@ def link_slave(device, show_calls, v):
     'pointer.c.o', 
     'util.xc.o', 
     CONST_POOL+'.o',
-    'globals.S.o',
-    '-o', SLAVE_XE] + LINK_FLAGS,
-    v=show_calls)
-  print(s, end='')
-
-def replace_images(show_calls, v):
-  vmsg(v, 'Creating new executable')
-  util.call([XCC, target_2core(), config.XS1_RUNTIME_PATH+'/container.xc', '-o', FINAL_XE])
-  util.call([XOBJDUMP, '--split', MASTER_XE], v=show_calls)
-  util.call([XOBJDUMP, FINAL_XE, '-r', '0,0,image_n0c0.elf'], v=show_calls)
-  util.call([XOBJDUMP, '--split', SLAVE_XE], v=show_calls)
-  util.call([XOBJDUMP, FINAL_XE, '-r', '0,1,image_n0c0.elf'], v=show_calls)
-
-def append_header(device, outfile, show_calls, v):
+    'globals.S.o']
+  return Job(SLAVE_XE, [XCC, target_1core()] + objs 
+      + ['-o', SLAVE_XE] + LINK_FLAGS, objs,
+      msg='Linking slave -> '+SLAVE_XE, cwd=d)
+
+def replace_images_jobs(d):
+  """
+  Replace the images in a 2-core container with the master and slave. Each
+  split writes the same image file so these steps are run in sequence.
+  """
+  return [
+    Job(FINAL_XE, [XCC, target_2core(), 
+      config.XS1_RUNTIME_PATH+'/container.xc', '-o', FINAL_XE], 
+      msg='Creating new executable', quiet=True, cwd=d),
+    Job('split-master', [XOBJDUMP, '--split', MASTER_XE], 
+      [MASTER_XE], quiet=True, cwd=d),
+    Job('replace-master', [XOBJDUMP, FINAL_XE, '-r', '0,0,image_n0c0.elf'], 
+      [FINAL_XE, 'split-master'], quiet=True, cwd=d),
+    Job('split-slave', [XOBJDUMP, '--split', SLAVE_XE], 
+      [SLAVE_XE, 'replace-master'], quiet=True, cwd=d),
+    Job('replace-slave', [XOBJDUMP, FINAL_XE, '-r', '0,1,image_n0c0.elf'], 
+      ['split-slave'], quiet=True, cwd=d)]
+
+def append_header(device, d, outfile, show_calls, v):
   vmsg(v, 'Appending binary header')
-  xe = open(FINAL_XE, "rb")
+  xe = open(os.path.join(d, FINAL_XE), "rb")
   se = open(outfile, "wb")
   try:
     se.write(bytes('SIRE', 'UTF-8'))
@@ -289,131 +337,112 @@ def append_header(device, outfile, show_calls, v):
     xe.close()
     se.close()
 
+# Matchers for the assembly post-processor
+FUNCTION_TOP    = re.compile(r'\.cc_top [_A-Za-z][A-Za-z0-9_]*\.function')
+FUNCTION_BOTTOM = re.compile(r'\.cc_bottom [_A-Za-z][A-Za-z0-9_]*\.function')
+CP_RODATA       = '\t.section .cp.rodata, "ac", @progbits\n'
+
 def modify_assembly(sig, lines, v):
   """ 
-  Perform modifications on assembly output.
+  Perform modifications on assembly output in a single pass over the lines,
+  producing the modified program and the constant pool:
+
+  1. Extract constant sections only within the elimination block of a
+     function. This covers all constants local to a function. This is to
+     differentiate constants associated with and declared global.
+      - Don't include elimination blocks for strings.
+      - Make extracted labels global (and extern in the program).
+     NOTE: this assumes a constant section will be terminated with a .text,
+     (which may not always be true?).
+
+  2. Insert bottom labels for each mobile procedure. I.e. look for the
+     structure and insert:
+     > .globl <bottom-label>
+       foo:
+       ...
+     > <bottom-label>
+       .cc_bottom foo.function
+
+  3. Rewrite calls to program functions to branch through the jump table.
   """
   vmsg(v, 'Modifying assembly output')
-  
-  #print(''.join(lines))
-  (lines, cp) = extract_constants(lines, v)
-  lines = insert_bottom_labels(sig, lines, v)
-  #lines = insert_frame_sizes(sig, lines, v)
-  lines = rewrite_calls(sig, lines, v)
-  lines.insert(0, '###### MODIFIED ######\n')
-  #print(''.join(lines))
 
-  return (lines, cp)
-
-def extract_constants(lines, v):
-  """ 
-  Extract constant sections only within the elimination block of a function.
-  This covers all constants local to a function. This is to differentiate
-  constants associated with and declared global.
-   - Don't include elimination blocks for strings.
-   - Make extracted labels global.
-  NOTE: this assumes a constant section will be terminated with a .text,
-  (which may not always be true?).
-  """
-  vmsg(v, '  Extracting constants')
-  cp = []
+  # Index the mobile procedure labels and the jump table offset of each
+  # function that is called through it
+  procs = {}
+  for (i, x) in enumerate(sig.mobile_proc_names):
+    procs.setdefault(x+':\n', (i, x))
+  calls = {}
+  for (i, x) in enumerate(builtin.runtime_functions + sig.mobile_proc_names):
+    calls.setdefault(x, '\tbla cp[{}+{}]\n'.format(defs.LABEL_JUMP_TABLE,
+        i*defs.BYTES_PER_WORD))
+
+  externs = []
   new = []
+  cp = []
+  pending = [] # Procedures waiting for a bottom label
   sect = False
   func = False
+
   for x in lines:
 
-    # If we have entered a function elimination block
-    if re.match(r'\.cc_top [_A-Za-z][A-Za-z0-9_]*\.function', x):
+    # If we have entered or left a function elimination block
+    if FUNCTION_TOP.match(x):
       func = True
-
-    # If we have left
-    if re.match(r'\.cc_bottom [_A-Za-z][A-Za-z0-9_]*\.function', x):
+    if FUNCTION_BOTTOM.match(x):
       func = False
 
     if func:
 
-      # If this is a cp section
-      if x.find('.section .cp') >= 0:
+      # If this is a cp section, or we have left it
+      if '.section .cp' in x:
         sect = True
-      
-      # If we have left the cp section
-      if x.find('.text') >= 0:
+      if '.text' in x:
         sect = False
 
-      if sect: 
-        # If we are in the seciton: replace labels with externs, 
-        # declare them as global in the new cp.
+      if sect:
+        # If we are in the section: replace labels with externs, declare
+        # them as global in the new cp.
         if x.find(':\n') > 0:
           cp.append('\t.globl '+x[:-2]+'\n')
-          new.insert(0, '\t.extern '+x[:-2]+'\n')
-        
-        # Rename .const4 and const8 to rodata
-        if x.find('.section .cp.const') >= 0:
-          x = '\t.section .cp.rodata, "ac", @progbits\n'
-
-        # Leave .call and .globreads where they are
-        if (x.find('.call')!=-1 or x.find('.globread')!=-1):
-          new.append(x)
-        # Omit elimination directives (for strings), 
-        elif (x.find('.cc_top')==-1 and x.find('.cc_bottom')==-1):
-          cp.append(x)
-
-      # If we're outside a cp section, add to a new list
-      else:
-        if x.find('.text')==-1:
-          new.append(x)
-    
-    # If we're outside a function block, add to a new list
-    else:
-      new.append(x)
-
-  return (new, cp)
+          externs.append('\t.extern '+x[:-2]+'\n')
 
-def insert_bottom_labels(sig, lines, v):
-  """
-  Insert bottom labels for each function.
-  """
-  # Look for the structure and insert:
-  # > .globl <bottom-label>
-  #   foo:
-  #   ...
-  # > <bottom-label>
-  #   .cc_bottom foo.function
-  
-  vmsg(v, '  Inserting function labels')
-  
-  # For each function, for each line...
-  # (Create a new list and modify it each time...)
-  b = False
-  for x in sig.mobile_proc_names:
-    new = []
-    for (i, y) in enumerate(lines):
-      new.append(y)
-      if y == x+':\n' and not b:
-        new.insert(len(new)-1, 
-            '.globl '+function_label_bottom(x)+'\n')
-        b = True
-      elif y[0] == '.' and b:
-        if y.split()[0] == '.cc_bottom':
-          new.insert(len(new)-1, 
-              function_label_bottom(x)+':\n')
-          b = False
-    lines = new
-
-  return lines
-
-def rewrite_calls(sig, lines, v):
-  """ 
-  Rewrite calls to program functions to branch through the jump table.
-  """
-  vmsg(v, '  Rewriting calls')
-  for (i, x) in enumerate(lines):
-    frags = x.strip().split()
-    names = builtin.runtime_functions + sig.mobile_proc_names 
-    if frags and frags[0] == 'bl' and frags[1] in names:
-      lines[i] = '\tbla cp[{}+{}]\n'.format(defs.LABEL_JUMP_TABLE, 
-          names.index(frags[1])*defs.BYTES_PER_WORD)
-  return lines
+        # Rename .const4 and const8 to rodata
+        if '.section .cp.const' in x:
+          x = CP_RODATA
+
+        # Leave .call and .globreads where they are, omit elimination
+        # directives (for strings)
+        if not ('.call' in x or '.globread' in x):
+          if not ('.cc_top' in x or '.cc_bottom' in x):
+            cp.append(x)
+          continue
+
+      # Drop .text directives outside a cp section
+      elif '.text' in x:
+        continue
+
+    # Bottom labels
+    if x in procs:
+      p = procs[x]
+      if not p in pending:
+        new.append('.globl '+function_label_bottom(p[1])+'\n')
+        pending.append(p)
+    elif pending and x[0] == '.' and x.split()[0] == '.cc_bottom':
+      for (i, y) in sorted(pending):
+        new.append(function_label_bottom(y)+':\n')
+      pending = []
+
+    # Calls
+    elif 'bl' in x:
+      frags = x.split()
+      if frags[0] == 'bl' and frags[1] in calls:
+        x = calls[frags[1]]
+
+    new.append(x)
+
+  externs.reverse()
+  return (['###### MODIFIED ######\n'] + externs + new, cp)
 
 def build_master_tab_init(sig, buf, v):
   assert (len(sig.mobile_proc_names) + defs.JUMP_INDEX_OFFSET) <= defs.JUMP_TABLE_SIZE
@@ -454,7 +483,7 @@ def build_master_tab_init(sig, buf, v):
       len(sig.mobile_proc_names))
   buf.write('\t.space {}\n'.format(remaining*defs.BYTES_PER_WORD))
 
-def dump_memory_use():
+def dump_memory_use(d):
   TEXT  = 0
   DATA  = 1
   BSS   = 2
@@ -463,11 +492,13 @@ def dump_memory_use():
   def size(v):
     return '{:>6} {:>8}'.format(v, '({:,.2f}KB)'.format(v/1000))
 
-  s = util.call([XOBJDUMP, '--size', MASTER_XE])
+  s = util.call([XOBJDUMP, '--size', MASTER_XE],
+      run=lambda x: util.execute(x, d))
   m = re.findall(r' *([0-9]+) *([0-9]+) *([0-9]+) *([0-9]+)', s)
   master_sizes = [int(x) for x in m[0]]
   assert len(m) == 1
-  s = util.call([XOBJDUMP, '--size', SLAVE_XE])
+  s = util.call([XOBJDUMP, '--size', SLAVE_XE],
+      run=lambda x: util.execute(x, d))
   m = re.findall(r' *([0-9]+) *([0-9]+) *([0-9]+) *([0-9]+)', s)
   slave_sizes = [int(x) for x in m[0]]
   assert len(m) == 1
@@ -512,27 +543,25 @@ def dump_memory_use():
   print('  Total:                '+size(slave_total))
   print('  Remaining:            '+size(slave_remaining))
 
-def cleanup(v):
+def cleanup(d, v):
   """ 
-  Renanme the output file and delete any temporary files.
+  Renanme the output file and delete any temporary files in the work
+  directory 'd'.
   """
   vmsg(v, 'Cleaning up')
   
   # Remove specific files
-  util.remove_file(MASTER_XE)
-  util.remove_file(SLAVE_XE)
-  util.remove_file('image_n0c0.elf')
-  util.remove_file('config.xml')
-  util.remove_file('platform_def.xn')
-  util.remove_file('program_info.txt')
-  util.remove_file(DEVICE_HDR)
+  for x in [MASTER_XE, SLAVE_XE, 'image_n0c0.elf', 'config.xml',
+      'platform_def.xn', 'program_info.txt', DEVICE_HDR, FINAL_XE,
+      PROGRAM_ASM, CONST_POOL+'.S', PROGRAM_SRC, MASTER_TABLES+'.S']:
+    util.remove_file(os.path.join(d, x))
   
   # Remove unused master images
-  for x in glob.glob('image_n*c*elf'):
+  for x in glob.glob(os.path.join(d, 'image_n*c*elf')):
     util.remove_file(x)
 
   # Remove runtime objects
-  for x in glob.glob('*.o'):
+  for x in glob.glob(os.path.join(d, '*.o')):
     util.remove_file(x)
 
 def target_1core():
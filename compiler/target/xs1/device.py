@@ -15,6 +15,23 @@ class XS1Device(Device):
   def num_cores(self):
     return self.num_nodes * self.num_cores_per_node
 
+  def num_threads(self):
+    return XS1_NUM_THREADS
+
+  def hops(self, a, b):
+    """
+    The nodes of an XS1 system are connected as a hypercube, with the cores of
+    an XS1-G node connected by its switch, and each XS1-L core a node of its
+    own. A message crosses a link for each bit in which the node numbers
+    differ, and one more to or from a core within an XS1-G node.
+    """
+    if a == b:
+      return 0
+    if self.type == XS1_DEVICE_TYPE_L:
+      return bin(a ^ b).count('1')
+    (x, y) = (a // self.num_cores_per_node, b // self.num_cores_per_node)
+    return 1 + bin(x ^ y).count('1')
+
   def source_file_ext(self):
     return XS1_SOURCE_FILE_EXT
 
@@ -42,10 +59,12 @@ AVAILABLE_XS1_DEVICES = [
 ]
 
 def get_xs1_device(num_cores):
-  return XS1Device(XS1_DEVICE_TYPE_L, 'XS1-L{}A'.format(num_cores), 1, num_cores)
-  #d = [x for x in AVAILABLE_XS1_DEVICES if num_cores==x.num_cores()]
-  #if len(d) > 0:
-  #  return d[0]
-  #else:
-  #  raise Error('invalid XS1 target ({} cores)'.format(num_cores))
-
+  """
+  Return the board of AVAILABLE_XS1_DEVICES with a number of cores, or
+  otherwise a system of that many XS1-L cores.
+  """
+  d = [x for x in AVAILABLE_XS1_DEVICES if num_cores == x.num_cores()]
+  if len(d) > 0:
+    return d[0]
+  return XS1Device(XS1_DEVICE_TYPE_L, 'XS1-L{}A'.format(num_cores),
+      num_cores, 1)
@@ -136,12 +136,10 @@ def gen_on(t, node, chans):
 
     # Procedures: (jumpindex)*
     t.comment('Proc: parent '+proc_name)
-    n = celem(n, defs.JUMP_INDEX_OFFSET
-        +t.sig.mobile_proc_names.index(proc_name))
+    n = celem(n, defs.JUMP_INDEX_OFFSET+t.child.index[proc_name])
     for x in t.child.children[proc_name]:
       t.comment('Proc: child '+x)
-      n = celem(n, defs.JUMP_INDEX_OFFSET
-          +t.sig.mobile_proc_names.index(x))
+      n = celem(n, defs.JUMP_INDEX_OFFSET+t.child.index[x])
 
     # Call runtime TODO: length argument?
     t.out('{}({}, _closure);'.format(defs.LABEL_CREATE_PROCESS, 
@@ -4,12 +4,14 @@
 # LICENSE.txt and at <http://github.xcore.com/>
 
 import sys
+import io
 
 from typedefs import *
 import definitions as defs
 import config
 import ast
 import builtin
+import transcache
 from util import read_file
 from walker import NodeWalker
 from blocker import Blocker
@@ -267,6 +269,9 @@ class TranslateXS1(NodeWalker):
       return 'int '+node.name+';'
     elif node.type == T_VAL_SINGLE:
       return '#define {} ({})'.format(node.name, self.expr(node.expr))
+    elif node.type == T_VAL_ARRAY:
+      return 'const int {}[{}] = {{{}}};'.format(node.name, len(node.expr),
+          ', '.join([self.expr(x) for x in node.expr]))
     elif node.type == T_CHANEND_SINGLE:
       chans[node.name] = defs.CONNECT_MASTER
       return 'unsigned '+node.name+';'
@@ -291,13 +296,39 @@ class TranslateXS1(NodeWalker):
     self.out(s)
 
   def definition(self, node, names):
+    """
+    Translate a procedure definition, or reuse its cached translation. Each
+    definition is buffered separately so its translation can be cached.
+    """
+    self.parent = node.name
+    first = self.label_counter
+    if transcache.enabled:
+      key = transcache.fingerprint(node, self.sig, self.child, names)
+      t = transcache.lookup(key, node.name)
+      if t:
+        self.out(transcache.renumber(t.text, 0, t.num_labels, first))
+        self.label_counter += t.num_labels
+        return
+    
+    blocker = self.blocker
+    self.blocker = Blocker(self, io.StringIO())
+    self.procedure(node, names)
+    self.blocker.output()
+    text = self.blocker.buf.getvalue()[:-1]
+    self.blocker = blocker
+    self.out(text)
+    
+    if transcache.enabled:
+      transcache.store(key, transcache.Translation(transcache.renumber(text,
+        first, self.label_counter, -first), self.label_counter - first))
+
+  def procedure(self, node, names):
     self.out('// cp[{}]'.format(names.index(node.name)))
     self.out('#pragma unsafe arrays')
     s = 'void' if node.type == T_PROC else 'int'
     s += ' {}({}){}'.format(self.procedure_name(node.name),
         ', '.join([self.param(x) for x in node.formals]),
         ';' if not node.stmt else '')
-    self.parent = node.name
     self.out(s)
     
     if node.stmt:
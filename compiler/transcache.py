@@ -0,0 +1,185 @@
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+import os
+import re
+import glob
+import json
+import hashlib
+
+import config
+import objcache
+from util import vmsg
+
+TRANSLATION_EXT = '.json'
+
+# A cache of the translation of each procedure definition, for incremental
+# compilation. A procedure is identified by a fingerprint of everything its
+# translation depends on:
+#  - the structure of its (transformed) AST, including the annotations made
+#    by each pass, but not source positions;
+#  - for itself and each procedure it refers to: its position in the jump
+#    table, its formal parameters and its children;
+#  - the source of the translator itself.
+# The labels allocated by the translator are unique over the whole program,
+# so they depend on the procedures before it. A translation is stored with
+# its labels numbered from zero and they are renumbered from the translator's
+# label counter when it is reused. Entries are stored in the object cache
+# (see objcache.py).
+#
+# Only translations are cached per procedure: program.xc is compiled by xcc
+# as a single unit (the procedures share its globals, and the local labels
+# and constant pool of each function are numbered over the whole unit), so
+# its assembly is cached as a whole (see target/xs1/build.py).
+
+# Globals
+enabled = False
+verbose = False
+hits = 0
+misses = 0
+salt = None
+
+# Attributes not part of the structure of a node: source positions, the
+# edges of the control-flow graph (which link to other statements), the keys
+# of expressions (which depend on the order they were computed in) and the
+# liveness bit-vectors (which give the sets hashed as inp and out, with bits
+# numbered over the whole procedure).
+SKIP_ATTRS = set(['coord', 'pred', 'succ', 'key', 'use_bits', 'def_bits',
+    'in_bits', 'out_bits'])
+
+# The labels allocated by the translator (see TranslateXS1.get_label)
+LABEL = re.compile(r'\b_L([0-9]+)\b')
+
+class Translation(object):
+  """
+  The translation of a procedure, with its labels numbered from zero, and
+  the number of labels it allocated.
+  """
+  def __init__(self, text, num_labels):
+    self.text = text
+    self.num_labels = num_labels
+
+def init(enable=False, v=False):
+  global enabled
+  global verbose
+  global hits
+  global misses
+  enabled = enable and objcache.enabled
+  verbose = v
+  hits = 0
+  misses = 0
+
+def translator_salt():
+  """
+  Return (and remember) a hash of the source of the XS1 translator and the
+  XS1 system definitions.
+  """
+  global salt
+  if not salt:
+    h = hashlib.sha256()
+    d = os.path.dirname(os.path.abspath(__file__))
+    files = sorted(glob.glob(d+'/target/xs1/*.py')) + [d+'/blocker.py',
+        d+'/transcache.py', config.XS1_SYSTEM_PATH+'/definitions.h']
+    for x in files:
+      with open(x, 'rb') as f:
+        h.update(f.read())
+    salt = h.digest()
+  return salt
+
+def fields(x):
+  """
+  Return a dictionary of the attributes of an object.
+  """
+  d = dict(getattr(x, '__dict__', {}))
+  for c in type(x).__mro__:
+    for y in getattr(c, '__slots__', ()):
+      if hasattr(x, y):
+        d[y] = getattr(x, y)
+  return d
+
+def hash_value(h, x, names, seen):
+  """
+  Add a value to a hash, recording any procedure names in 'names'.
+  """
+  if x is None or isinstance(x, (str, int, float, bool)):
+    h.update(repr(x).encode('utf-8'))
+  elif isinstance(x, (list, tuple)):
+    h.update(b'[')
+    for y in x:
+      hash_value(h, y, names, seen)
+    h.update(b']')
+  elif isinstance(x, (set, frozenset)):
+    h.update(repr(sorted([repr(y) for y in x])).encode('utf-8'))
+  elif isinstance(x, dict):
+    h.update(b'{')
+    for k in sorted(x.keys(), key=repr):
+      h.update(repr(k).encode('utf-8'))
+      hash_value(h, x[k], names, seen)
+    h.update(b'}')
+  elif id(x) in seen:
+    h.update(b'<ref>')
+  else:
+    seen.add(id(x))
+    h.update(type(x).__name__.encode('utf-8'))
+    d = fields(x)
+    if 'name' in d and isinstance(d['name'], str):
+      names.add(d['name'])
+    for k in sorted(d.keys()):
+      if not k in SKIP_ATTRS:
+        h.update(k.encode('utf-8'))
+        hash_value(h, d[k], names, seen)
+
+def fingerprint(node, sig, child, jump_names):
+  """
+  Return the fingerprint of a procedure definition.
+  """
+  h = hashlib.sha256(translator_salt())
+  names = set([node.name])
+  hash_value(h, node, names, set())
+
+  # The signatures of the procedures it refers to
+  for x in sorted(names):
+    if sig.sig_exists(x):
+      h.update(x.encode('utf-8'))
+      hash_value(h, jump_names.index(x) if x in jump_names else None,
+          set(), set())
+      hash_value(h, sig.get_params(x), set(), set())
+      hash_value(h, [(y, jump_names.index(y) if y in jump_names else None)
+          for y in child.children.get(x, [])], set(), set())
+
+  return h.hexdigest()
+
+def lookup(k, name):
+  """
+  Return the cached translation of a procedure, or None.
+  """
+  s = objcache.lookup(k, TRANSLATION_EXT)
+  global hits
+  global misses
+  if s == None:
+    misses += 1
+    vmsg(verbose, '  translated '+name)
+    return None
+  hits += 1
+  vmsg(verbose, '  reused translation of '+name)
+  d = json.loads(s)
+  return Translation(d['text'], d['num_labels'])
+
+def store(k, t):
+  objcache.store(k, TRANSLATION_EXT,
+      json.dumps({'text': t.text, 'num_labels': t.num_labels}))
+
+def renumber(text, first, last, offset):
+  """
+  Add 'offset' to the number of each label in [first, last) in a translation.
+  """
+  def f(m):
+    n = int(m.group(1))
+    return '_L{}'.format(n + offset) if first <= n < last else m.group(0)
+  return LABEL.sub(f, text)
+
+def report():
+  vmsg(verbose, 'Translation cache: {} hit{}, {} miss{}'.format(
+    hits, '' if hits == 1 else 's', misses, '' if misses == 1 else 'es'))
@@ -150,8 +150,10 @@ class TransformPar(NodeWalker):
     # Replicated parallel statements are more restrivtive
     var_to_param = rep_var_to_param if len(indices)>0 else par_var_to_param
     
-    # For each variable in the live-in set add accordingly to formals and actuals.
-    for x in live:
+    # For each variable in the live-in set add accordingly to formals and
+    # actuals, in order of name so the translation does not depend on the
+    # order of the set.
+    for x in sorted(live, key=lambda x: x.name):
       
       # Don't include constant values.
       if x.symbol.type == T_VAL_SINGLE and \
@@ -191,7 +193,8 @@ class TransformPar(NodeWalker):
     name = self.sig.unique_process_name()
 
     # Create the local declarations (excluding values)
-    [decls.append(self.create_decl(x)) for x in local_decls]
+    [decls.append(self.create_decl(x))
+        for x in sorted(local_decls, key=lambda x: x.name)]
     
     # Create the new process definition
     if isinstance(stmt, ast.StmtSeq) or isinstance(stmt, ast.StmtPar):
@@ -210,6 +213,13 @@ class TransformPar(NodeWalker):
     c = ast.StmtPcall(name, actuals)
     return (d, c)
 
+  def is_process(self, stmt):
+    """
+    Return if a statement is a call to a procedure that can be run as a
+    process (i.e. it is defined in the program).
+    """
+    return isinstance(stmt, ast.StmtPcall) and self.sig.is_mobile(stmt.name)
+
   # Program ============================================
 
   def walk_program(self, node):
@@ -237,9 +247,9 @@ class TransformPar(NodeWalker):
   def stmt_par(self, node, indices):
     p = []
     p += self.stmt(node.stmt[0], indices)
-    # We only need to transform statements [1:].
+    # We only need to transform statements [1:] (and calls to builtins).
     for (i, x) in enumerate(node.stmt[1:]):
-      if not isinstance(x, ast.StmtPcall):
+      if not self.is_process(x):
         if(self.debug):
           print('Transforming par {} from {}'.format(i, x))
         (proc, node.stmt[i+1]) = self.stmt_to_process(x, indices)
@@ -251,7 +261,7 @@ class TransformPar(NodeWalker):
   def stmt_server(self, node, indices):
     p = []
     p += self.stmt(node.server, indices)
-    if not isinstance(node.client, ast.StmtPcall):
+    if not self.is_process(node.client):
       if(self.debug):
         print('Transforming server client')
       (proc, node.client) = self.stmt_to_process(node.client, indices)
@@ -21,6 +21,15 @@ from symboltab import Symbol
 
 from printer import Printer
 
+def levels(k, m):
+  """
+  Return the number of levels of a k-ary tree with at least m leaves.
+  """
+  l = 0
+  while k ** l < m:
+    l = l + 1
+  return l
+
 class TransformRep(NodeWalker):
   """
   An AST walker to transform replicated parallel statements. We must check for
@@ -50,14 +59,74 @@ class TransformRep(NodeWalker):
       ...
       _d(0, next-pow-2(N*M), N*M, procid(), ...) 
       ...
+
+  With a fan-out k > 2 (a power of 2), each interval is divided into k and
+  the processes for the k-1 upper parts are created remotely in parallel,
+  each by a process _s on the current core, so m processes are created in
+  log_k(m) rounds rather than log_2(m)::
+
+    proc _d(_t, _n, _m, params(_p)) is
+      if n = 1
+      then q(...)
+      else if m > n/k
+      then
+      { _d(t, n/k, m, ...)
+      | _s(t+n/k, n/k, m-n/k, ...)
+      ...
+      | _s(t+(k-1)*n/k, n/k, m-(k-1)*n/k, ...)
+      }
+      else _d(t, n/k, m, ...)
+
+    proc _s(_t, _n, _m, params(_p)) is
+      if m > 0 then on (_b+t) do _d(t, n, m, ...)
+
+  where n is the next power of k, and an interval holding fewer than m
+  processes creates only as many as it holds.
   """
-  def __init__(self, sym, sem, sig, device, debug=False):
+  def __init__(self, sym, sem, sig, device, fanout=defs.DEFAULT_REP_FANOUT,
+      debug=False):
     self.sym = sym
     self.sem = sem
     self.sig = sig
     self.device = device
+    self.fanout = fanout
     self.debug = debug
 
+  def choose_fanout(self, m):
+    """
+    Return the fan-out to distribute m processes with. Automatically, this is
+    the largest power of 2 for which the threads each core uses to create
+    them, (k-1) for each level below it and one for the process, are
+    available on the device; otherwise it is 2.
+    """
+    if self.fanout != defs.REP_FANOUT_AUTO:
+      return self.fanout
+    threads = self.device.num_threads()
+    k = defs.DEFAULT_REP_FANOUT
+    while threads != None and k*2 <= threads:
+      if (k*2-1)*levels(k*2, m) + 1 > threads:
+        break
+      k = k * 2
+    return k
+
+  def substitute_indices(self, m, elem_t, indices, pcall):
+    """
+    Replace ocurrances of index variables i with i = f(_t).
+    """
+    divisor = m
+    for x in indices:
+      divisor = floor(divisor / x.count_value)
+      # Calculate the index i as a function of _t and the dimensions.
+      e = ast.ExprBinop('rem', ast.ElemGroup(ast.ExprBinop('/', elem_t,
+            ast.ExprSingle(ast.ElemNumber(divisor)))),
+            ast.ExprSingle(ast.ElemNumber(x.count_value)))
+      if x.base_value > 0:
+        e = ast.ExprBinop('+', ast.ElemNumber(x.base_value),
+            ast.ExprSingle(ast.ElemGroup(e)))
+      # Then replace it for each ocurrance of i
+      for y in pcall.args:
+        y.accept(SubElem(ast.ElemId(x.name), ast.ElemGroup(e)))
+
   def distribute_stmt(self, m, elem_t, elem_n, elem_m, base, 
         indices, proc_actuals, formals, pcall):
     """
@@ -75,19 +144,7 @@ class TransformRep(NodeWalker):
     expr_base = ast.ExprSingle(elem_base)
 
     # Replace ocurrances of index variables i with i = f(_t)
-    divisor = m
-    for x in indices:
-      divisor = floor(divisor / x.count_value)
-      # Calculate the index i as a function of _t and the dimensions.
-      e = ast.ExprBinop('rem', ast.ElemGroup(ast.ExprBinop('/', elem_t,
-            ast.ExprSingle(ast.ElemNumber(divisor)))),
-            ast.ExprSingle(ast.ElemNumber(x.count_value)))
-      if x.base_value > 0:
-        e = ast.ExprBinop('+', ast.ElemNumber(x.base_value),
-            ast.ExprSingle(ast.ElemGroup(e)))
-      # Then replace it for each ocurrance of i
-      for y in pcall.args:
-        y.accept(SubElem(ast.ElemId(x.name), ast.ElemGroup(e)))
+    self.substitute_indices(m, elem_t, indices, pcall)
  
     d = ast.ExprBinop('+', elem_t, ast.ExprSingle(elem_x))
     d = form_location(self.sym, elem_base, d, 1)
@@ -132,6 +189,74 @@ class TransformRep(NodeWalker):
     
     return d
 
+  def distribute_kary_stmt(self, k, m, elem_t, elem_n, elem_m, base,
+        indices, proc_actuals, formals, pcall):
+    """
+    Create the distribution process with a fan-out of k, and the process
+    creating each of its remote children. Return the tuple (distribution-def,
+    spawn-def).
+    """
+
+    # Setup some useful expressions
+    name = self.sig.unique_process_name()
+    spawn = self.sig.unique_process_name()
+    elem_x = ast.ElemId('_x')
+    expr_x = ast.ExprSingle(elem_x)
+    expr_t = ast.ExprSingle(elem_t)
+    expr_m = ast.ExprSingle(elem_m)
+    elem_base = ast.ElemNumber(base) 
+
+    # Replace ocurrances of index variables i with i = f(_t)
+    self.substitute_indices(m, elem_t, indices, pcall)
+
+    # The offset j*n/k of the jth part of the interval
+    def offset(j):
+      if j == 1:
+        return ast.ExprSingle(elem_x)
+      return ast.ExprSingle(ast.ElemGroup(ast.ExprBinop('*',
+        ast.ElemNumber(j), ast.ExprSingle(elem_x))))
+
+    # d(t, n/k, m) | s(t+n/k, n/k, m-n/k) | ... 
+    children = [ast.StmtPcall(name, [expr_t, expr_x, expr_m] + proc_actuals)]
+    for j in range(1, k):
+      children.append(ast.StmtPcall(spawn,
+          [ast.ExprBinop('+', elem_t, offset(j)), expr_x,
+            ast.ExprBinop('-', elem_m, offset(j))] + proc_actuals))
+
+    # Conditionally recurse {d()|s()|...} or d()
+    s1 = ast.StmtIf(
+        # if m > n/k
+        ast.ExprBinop('>', elem_m, ast.ExprSingle(elem_x)),
+        # then
+        ast.StmtPar([], children, False),
+        # else d(t, n/k, m)
+        ast.StmtPcall(name, [expr_t, expr_x, expr_m] + proc_actuals))
+
+    # _x = n/k ; s1
+    n_div_k = ast.ExprBinop('>>', elem_n, 
+        ast.ExprSingle(ast.ElemNumber(k.bit_length()-1)))
+    s2 = ast.StmtSeq([], [ast.StmtAss(elem_x, n_div_k), s1])
+
+    # if n = 1 then process() else s2
+    s3 = ast.StmtIf(ast.ExprBinop('=', elem_n,
+      ast.ExprSingle(ast.ElemNumber(1))), pcall, s2)
+  
+    # Create the local declarations
+    decls = [ast.VarDecl(elem_x.name, T_VAR_SINGLE, None)]
+
+    d = ast.ProcDef(name, T_PROC, formals, ast.StmtSeq(decls, [s3]))
+
+    # The spawning process: if m > 0 then on b+t do d(t, n, m)
+    on_stmt = ast.StmtOn(form_location(self.sym, elem_base, expr_t, 1),
+        ast.StmtPcall(name, [expr_t, ast.ExprSingle(ast.ElemId('_n')), 
+          expr_m] + proc_actuals))
+    on_stmt.location = None
+    s = ast.ProcDef(spawn, T_PROC, [copy.copy(x) for x in formals],
+        ast.StmtIf(ast.ExprBinop('>', elem_m,
+          ast.ExprSingle(ast.ElemNumber(0))), on_stmt, ast.StmtSkip()))
+
+    return (d, s)
+
   def transform_rep(self, stmt):
     """
     Convert a replicated parallel statement into a divide-and-conquer form.
@@ -151,7 +276,8 @@ class TransformRep(NodeWalker):
     
     assert not stmt.m == None
     #assert not stmt.f == None
-    n = util.next_power_of_2(stmt.m)
+    k = self.choose_fanout(stmt.m)
+    n = util.next_power_of_2(stmt.m) if k == 2 else k ** levels(k, stmt.m)
 
     # Create new variables
     formals = []       # Formals for the new distribution process
@@ -191,15 +317,26 @@ class TransformRep(NodeWalker):
 
     # Create the process definition and perform semantic analysis to 
     # update symbol bindings. 
-    d = self.distribute_stmt(stmt.m, elem_t, elem_n, elem_m, base,
-                stmt.indices, proc_actuals, formals, pcall)
-    #Printer().defn(d, 0)
-    self.sem.defn(d)
+    if k == 2:
+      d = self.distribute_stmt(stmt.m, elem_t, elem_n, elem_m, base,
+                  stmt.indices, proc_actuals, formals, pcall)
+      #Printer().defn(d, 0)
+      self.sem.defn(d)
+      p = [d]
+    else:
+      (d, s) = self.distribute_kary_stmt(k, stmt.m, elem_t, elem_n, elem_m,
+          base, stmt.indices, proc_actuals, formals, pcall)
+      # The two are mutually recursive, so declare the second first
+      self.sym.insert(s.name, s.type)
+      self.sig.insert(s.type, s)
+      self.sem.defn(d)
+      self.sem.defn(s)
+      p = [d, s]
     
     # Create the corresponding call.
     c = ast.StmtPcall(d.name, actuals)
     self.sig.insert(d.type, d)
-    return (d, c)
+    return (p, c)
 
   # Program ============================================
 
@@ -223,7 +360,7 @@ class TransformRep(NodeWalker):
     p = self.stmt(node.stmt)
     if isinstance(node.stmt, ast.StmtRep):
       (d, node.stmt) = self.transform_rep(node.stmt)
-      p.append(d)
+      p.extend(d)
     return p
   
   # Statements containing statements ====================
@@ -234,7 +371,7 @@ class TransformRep(NodeWalker):
     for (i, x) in enumerate(node.stmt):
       if isinstance(x, ast.StmtRep):
         (d, node.stmt[i]) = self.transform_rep(node.stmt[i])
-        p.append(d)
+        p.extend(d)
     return p
 
   def stmt_par(self, node):
@@ -243,7 +380,7 @@ class TransformRep(NodeWalker):
     for (i, x) in enumerate(node.stmt):
       if isinstance(x, ast.StmtRep):
         (d, node.stmt[i]) = self.transform_rep(node.stmt[i])
-        p.append(d)
+        p.extend(d)
     return p
 
   def stmt_server(self, node):
@@ -251,10 +388,10 @@ class TransformRep(NodeWalker):
     p += self.stmt(node.client)
     if isinstance(node.server, ast.StmtRep):
       (d, node.server) = self.transform_rep(node.server)
-      p.append(d)
+      p.extend(d)
     if isinstance(node.client, ast.StmtRep):
       (d, node.client) = self.transform_rep(node.client)
-      p.append(d)
+      p.extend(d)
     return p
 
   def stmt_if(self, node):
@@ -262,38 +399,38 @@ class TransformRep(NodeWalker):
     p += self.stmt(node.elsestmt)
     if isinstance(node.thenstmt, ast.StmtRep):
       (d, node.thenstmt) = self.transform_rep(node.thenstmt)
-      p.append(d)
+      p.extend(d)
     if isinstance(node.elsestmt, ast.StmtRep):
       (d, node.elsestmt) = self.transform_rep(node.elsestmt)
-      p.append(d)
+      p.extend(d)
     return p
 
   def stmt_while(self, node):
     p = self.stmt(node.stmt)
     if isinstance(node.stmt, ast.StmtRep):
       (d, node.stmt) = self.transform_rep(node.stmt)
-      p.append(d)
+      p.extend(d)
     return p
 
   def stmt_for(self, node):
     p = self.stmt(node.stmt)
     if isinstance(node.stmt, ast.StmtRep):
       (d, node.stmt) = self.transform_rep(node.stmt)
-      p.append(d)
+      p.extend(d)
     return p
 
   def stmt_rep(self, node):
     p = self.stmt(node.stmt)
     if isinstance(node.stmt, ast.StmtRep):
       (d, node.stmt) = self.transform_rep(node.stmt)
-      p.append(d)
+      p.extend(d)
     return p
 
   def stmt_on(self, node):
     p = self.stmt(node.stmt)
     if isinstance(node.stmt, ast.StmtRep):
       (d, node.stmt) = self.transform_rep(node.stmt)
-      p.append(d)
+      p.extend(d)
     return p
 
   # Statements ==========================================
@@ -14,6 +14,7 @@ from type import Type
 #  - T_CHAN_SINGLE
 #  - T_CHAN_ARRAY
 #  - T_CHANEND_SINGLE
+#  - T_VAL_ARRAY (constant tables, inserted by the compiler)
 #
 # Formal parameters:
 #  - T_VAL_SINGLE
@@ -48,6 +49,7 @@ T_CHANEND_SUB           = Type('chanend', 'sub')
 # Variable arrays
 T_VAR_ARRAY             = Type('var', 'array') 
 T_REF_ARRAY             = Type('ref', 'array')
+T_VAL_ARRAY             = Type('val', 'array')
                        
 # Channel arrays
 T_CHAN_ARRAY            = Type('chan', 'array')
@@ -6,9 +6,13 @@
 import sys
 import re
 import os
+import shutil
+import tempfile
 import subprocess
+from contextlib import contextmanager
 from math import log, ceil
 from error import Error
+import stats
 
 def read_file(filename, read_lines=False):
   """ 
@@ -48,28 +52,81 @@ def write_file(filename, s):
     raise Exception('Unexpected error: {}'
         .format(sys.exc_info()[0]))
 
-def call(args, v=False):
+class CommandError(Error):
+  """
+  An external command failed.
+  """
+  def __init__(self, cmd, output):
+    super(CommandError, self).__init__(cmd, output)
+    self.cmd = cmd
+    self.output = output
+
+  def __str__(self):
+    return 'executing command:\n\n{}\n\nOuput:\n\n{}'.format(
+        ' '.join(self.cmd), self.output)
+
+def execute(args, cwd=None):
   """ 
-  Try to execute a shell command, return stdout as a string.
+  Execute a shell command, in the directory 'cwd' if given, and return stdout
+  as a string, raising a CommandError if it fails.
   """
   try:
-    if v:
-      print(' '.join(args))
-    s = subprocess.check_output(args, stderr=subprocess.STDOUT)
+    with stats.stage(stats.command_name(args)):
+      s = subprocess.check_output(args, stderr=subprocess.STDOUT, cwd=cwd)
     return s.decode("utf-8").replace("\\n", "\n")
   
   except subprocess.CalledProcessError as e:
-    s = e.output.decode('utf-8').replace("\\n", "\n")
+    raise CommandError(e.cmd, e.output.decode('utf-8').replace("\\n", "\n"))
+
+def call(args, v=False, run=execute):
+  """ 
+  Try to execute a shell command, return stdout as a string. A different
+  function to execute the command can be given with 'run'.
+  """
+  try:
+    if v:
+      print(' '.join(args))
+    return run(args)
+  
+  except CommandError as e:
     #sys.stderr.write('\nCall error: '+s)
     #sys.stderr.write(' '.join(args)+'\n')
-    sys.stderr.write('executing command:\n\n{}\n\nOuput:\n\n{}'
-        .format(' '.join(e.cmd), s))
+    sys.stderr.write(str(e))
     raise Error()
   
   except:
     #sys.stderr.write("Unexpected error: {}\n".format(sys.exc_info()[0]))
     raise Exception('Unexpected error: {}'.format(sys.exc_info()[0]))
 
+@contextmanager
+def work_dir(path=None, keep=False, v=False):
+  """
+  Provide a work directory, either 'path' or a new temporary directory, for
+  the body of a with statement and yield its (absolute) path. The working
+  directory of the process is not changed, so builds can run at the same
+  time: a build names its files and runs its commands relative to the work
+  directory. A temporary directory is removed afterwards unless 'keep' is
+  set.
+  """
+  d = (os.path.abspath(path) if path else
+      tempfile.mkdtemp(prefix='sire-build-'))
+  os.makedirs(d, exist_ok=True)
+  vmsg(v, 'Building in '+d)
+  try:
+    yield d
+  finally:
+    if not path:
+      if keep:
+        print('Intermediate files saved in '+d)
+      else:
+        shutil.rmtree(d, ignore_errors=True)
+
+def move_file(filename, dest):
+  """
+  Move a file, possibly to another file system.
+  """
+  shutil.move(filename, dest)
+
 def remove_file(filename):
   """ 
   Remove a file if it exists.
@@ -0,0 +1,227 @@
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+from functools import reduce
+from itertools import repeat
+
+import ast
+from walker import NodeWalker
+from evalexpr import binop, unop
+from affine import columns
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+# Vectorised evaluation of expressions over the iteration space of a set of
+# replicator indices. An expression is compiled into a kernel: a function of
+# the values of the indices at every point, which evaluates each operator over
+# all the points at once. With NumPy, kernels operate on integer arrays;
+# without it, or if a value does not fit in 32 bits (within which NumPy's
+# 64-bit arithmetic is exact), they operate on lists with the operators of
+# EvalExpr.
+
+# Bounds within which NumPy kernels are exact
+MAX_VALUE = 1 << 31
+MAX_SHIFT = 32
+
+# An expression whose value is undefined at every point (EvalExpr gives None)
+UNDEFINED = object()
+
+class Overflow(Exception):
+  pass
+
+class NumPyOps(object):
+  """
+  Operators over integer arrays (or constants).
+  """
+  def grid(self, names, ranges):
+    n = reduce(lambda x, y: x*len(y), ranges, 1)
+    cols = {}
+    stride = n
+    for (name, r) in zip(names, ranges):
+      if n == 0:
+        cols.setdefault(name, numpy.zeros(0, numpy.int64))
+        continue
+      stride //= len(r)
+      col = numpy.tile(numpy.repeat(numpy.arange(r.start, r.stop,
+          dtype=numpy.int64), stride), n // (len(r) * stride))
+      cols.setdefault(name, self.check(col))
+    return cols
+
+  def check(self, a):
+    if numpy.size(a) > 0 and numpy.abs(a).max() >= MAX_VALUE:
+      raise Overflow()
+    return a
+
+  def unop(self, op, a):
+    if   op == '-': return -a
+    elif op == '~': return numpy.invert(a)
+    else:
+      assert 0
+
+  def binop(self, op, a, b):
+    if op in ('/', 'rem') and numpy.any(b == 0):
+      raise ZeroDivisionError('division by zero')
+    if op in ('<<', '>>'):
+      if numpy.any(b < 0):
+        raise ValueError('negative shift count')
+      if numpy.any(b >= MAX_SHIFT):
+        raise Overflow()
+    if   op == '+':   return self.check(a + b)
+    elif op == '-':   return self.check(a - b)
+    elif op == '*':   return self.check(a * b)
+    elif op == '/':   return numpy.floor_divide(a, b)
+    elif op == 'rem': return numpy.mod(a, b)
+    elif op == 'or':  return numpy.bitwise_or(a, b)
+    elif op == 'and': return numpy.bitwise_and(a, b)
+    elif op == 'xor': return numpy.bitwise_xor(a, b)
+    elif op == '<<':  return self.check(numpy.left_shift(a, b))
+    elif op == '>>':  return numpy.right_shift(a, b)
+    elif op == '<':   return numpy.less(a, b).astype(numpy.int64)
+    elif op == '>':   return numpy.greater(a, b).astype(numpy.int64)
+    elif op == '<=':  return numpy.less_equal(a, b).astype(numpy.int64)
+    elif op == '>=':  return numpy.greater_equal(a, b).astype(numpy.int64)
+    elif op == '=':   return numpy.equal(a, b).astype(numpy.int64)
+    elif op == '~=':  return numpy.not_equal(a, b).astype(numpy.int64)
+    else:
+      assert 0
+
+  def constant(self, v):
+    return self.check(v)
+
+  def values(self, a, n):
+    if isinstance(a, numpy.ndarray):
+      return a.tolist()
+    return [int(a)] * n
+
+class PythonOps(object):
+  """
+  Operators over lists (or constants).
+  """
+  def grid(self, names, ranges):
+    return columns(names, ranges)
+
+  def unop(self, op, a):
+    return [unop(op, x) for x in a]
+
+  def binop(self, op, a, b):
+    a = repeat(a) if not isinstance(a, list) else a
+    b = repeat(b) if not isinstance(b, list) else b
+    return [binop(op, x, y) for (x, y) in zip(a, b)]
+
+  def constant(self, v):
+    return v
+
+  def values(self, a, n):
+    return a if isinstance(a, list) else [a] * n
+
+class CompileExpr(NodeWalker):
+  """
+  Compile an expression over a set of index names into a kernel: a function
+  taking a set of operators and the values of each index, and returning the
+  value of the expression at each point, or a constant. Return None if this
+  is not possible. Constants are folded and, as in EvalExpr, any undefined
+  operand makes the expression undefined.
+  """
+  def __init__(self, names):
+    self.names = names
+
+  def constant(self, v):
+    return lambda ops, cols: ops.constant(v)
+
+  # Expressions =========================================
+
+  def expr_single(self, node):
+    return self.elem(node.elem)
+
+  def expr_unary(self, node):
+    a = self.elem(node.elem)
+    if a == None or a is UNDEFINED:
+      return a
+    if isinstance(a, int):
+      return unop(node.op, a)
+    op = node.op
+    return lambda ops, cols: ops.unop(op, a(ops, cols))
+
+  def expr_binop(self, node):
+    a = self.elem(node.elem)
+    b = self.expr(node.right)
+    if a == None or b == None:
+      return None
+    if a is UNDEFINED or b is UNDEFINED:
+      return UNDEFINED
+    if isinstance(a, int) and isinstance(b, int):
+      return binop(node.op, a, b)
+    op = node.op
+    fa = a if not isinstance(a, int) else self.constant(a)
+    fb = b if not isinstance(b, int) else self.constant(b)
+    return lambda ops, cols: ops.binop(op, fa(ops, cols), fb(ops, cols))
+
+  # Elements ============================================
+
+  def elem_id(self, node):
+    if node.name in self.names:
+      name = node.name
+      return lambda ops, cols: cols[name]
+    s = node.symbol
+    if s == None or s.value == None:
+      return UNDEFINED
+    return s.value if isinstance(s.value, int) else None
+
+  def elem_group(self, node):
+    return self.expr(node.expr)
+
+  def elem_number(self, node):
+    return node.value if isinstance(node.value, int) else None
+
+  # Not integer-valued
+
+  def elem_boolean(self, node):
+    return None
+
+  def elem_char(self, node):
+    return None
+
+  # Disallowed
+
+  def elem_fcall(self, node):
+    return UNDEFINED
+
+  def elem_sub(self, node):
+    return UNDEFINED
+
+  def elem_slice(self, node):
+    return UNDEFINED
+
+  def elem_index_range(self, node):
+    return UNDEFINED
+
+  def elem_string(self, node):
+    return UNDEFINED
+
+def evaluate(expr, names, ranges):
+  """
+  Evaluate an expression at each point of the product of the ranges of a set
+  of named indices. Return a list of the values, or None if the expression
+  cannot be compiled.
+  """
+  k = CompileExpr(set(names)).expr(expr)
+  n = reduce(lambda x, y: x*len(y), ranges, 1)
+  if k == None:
+    return None
+  if k is UNDEFINED:
+    return [None] * n
+  if isinstance(k, int):
+    return [k] * n
+  if numpy != None:
+    try:
+      ops = NumPyOps()
+      return ops.values(k(ops, ops.grid(names, ranges)), n)
+    except Overflow:
+      pass
+  ops = PythonOps()
+  return ops.values(k(ops, ops.grid(names, ranges)), n)
@@ -5,6 +5,11 @@
 
 import util
 
+# The method visiting each node class, for each class of walker. Resolving a
+# method from the name of a node class is only done the first time that class
+# is visited by a walker class, so each later visit is a single lookup.
+_dispatch = {}
+
 class NodeWalker(object):
   """
   A base class for walking an AST.
@@ -12,27 +17,22 @@ class NodeWalker(object):
   def name(self, node):
     return util.camel_to_under(node.__class__.__name__)
 
-  def decl(self, node, *args):
-    f = getattr(self, self.name(node))
-    return f(node, *args) if args else f(node)
-  
-  def defn(self, node, *args):
-    f = getattr(self, self.name(node))
-    return f(node, *args) if args else f(node)
-  
-  def param(self, node, *args):
-    f = getattr(self, self.name(node))
-    return f(node, *args) if args else f(node)
-  
-  def stmt(self, node, *args):
-    f = getattr(self, self.name(node))
-    return f(node, *args) if args else f(node)
-  
-  def expr(self, node, *args):
-    f = getattr(self, self.name(node))
-    return f(node, *args) if args else f(node)
+  def method(self, node):
+    """
+    Resolve (and remember) the method of this walker's class visiting a node.
+    """
+    f = getattr(self.__class__, self.name(node))
+    _dispatch[(self.__class__, node.__class__)] = f
+    return f
+
+  def dispatch(self, node, *args):
+    f = _dispatch.get((self.__class__, node.__class__)) or self.method(node)
+    return f(self, node, *args)
 
-  def elem(self, node, *args):
-    f = getattr(self, self.name(node))
-    return f(node, *args) if args else f(node)
+  decl = dispatch
+  defn = dispatch
+  param = dispatch
+  stmt = dispatch
+  expr = dispatch
+  elem = dispatch
 
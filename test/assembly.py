@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the single-pass assembly post-processor in target/xs1/build.py
+# produces exactly the same program and constant pool as the original
+# multi-pass implementation, which is kept below as a reference. This does
+# not need the XMOS tools.
+
+import re
+import unittest
+
+from support import INSTALL_PATH
+ASSEMBLY_DIR = INSTALL_PATH+'/test/assembly'
+
+import config
+import builtin
+import definitions as defs
+from util import vmsg
+from target.xs1.build import modify_assembly
+from target.xs1.build import function_label_bottom
+
+class Signature(object):
+  """
+  The part of a SignatureTable used by the post-processor.
+  """
+  def __init__(self, mobile_proc_names):
+    self.mobile_proc_names = mobile_proc_names
+
+# Reference implementation =====================================
+
+def reference_modify_assembly(sig, lines, v):
+  """ 
+  Perform modifications on assembly output.
+  """
+  vmsg(v, 'Modifying assembly output')
+  
+  #print(''.join(lines))
+  (lines, cp) = reference_extract_constants(lines, v)
+  lines = reference_insert_bottom_labels(sig, lines, v)
+  #lines = insert_frame_sizes(sig, lines, v)
+  lines = reference_rewrite_calls(sig, lines, v)
+  lines.insert(0, '###### MODIFIED ######\n')
+  #print(''.join(lines))
+
+  return (lines, cp)
+
+def reference_extract_constants(lines, v):
+  """ 
+  Extract constant sections only within the elimination block of a function.
+  This covers all constants local to a function. This is to differentiate
+  constants associated with and declared global.
+   - Don't include elimination blocks for strings.
+   - Make extracted labels global.
+  NOTE: this assumes a constant section will be terminated with a .text,
+  (which may not always be true?).
+  """
+  vmsg(v, '  Extracting constants')
+  cp = []
+  new = []
+  sect = False
+  func = False
+  for x in lines:
+
+    # If we have entered a function elimination block
+    if re.match(r'\.cc_top [_A-Za-z][A-Za-z0-9_]*\.function', x):
+      func = True
+
+    # If we have left
+    if re.match(r'\.cc_bottom [_A-Za-z][A-Za-z0-9_]*\.function', x):
+      func = False
+
+    if func:
+
+      # If this is a cp section
+      if x.find('.section .cp') >= 0:
+        sect = True
+      
+      # If we have left the cp section
+      if x.find('.text') >= 0:
+        sect = False
+
+      if sect: 
+        # If we are in the seciton: replace labels with externs, 
+        # declare them as global in the new cp.
+        if x.find(':\n') > 0:
+          cp.append('\t.globl '+x[:-2]+'\n')
+          new.insert(0, '\t.extern '+x[:-2]+'\n')
+        
+        # Rename .const4 and const8 to rodata
+        if x.find('.section .cp.const') >= 0:
+          x = '\t.section .cp.rodata, "ac", @progbits\n'
+
+        # Leave .call and .globreads where they are
+        if (x.find('.call')!=-1 or x.find('.globread')!=-1):
+          new.append(x)
+        # Omit elimination directives (for strings), 
+        elif (x.find('.cc_top')==-1 and x.find('.cc_bottom')==-1):
+          cp.append(x)
+
+      # If we're outside a cp section, add to a new list
+      else:
+        if x.find('.text')==-1:
+          new.append(x)
+    
+    # If we're outside a function block, add to a new list
+    else:
+      new.append(x)
+
+  return (new, cp)
+
+def reference_insert_bottom_labels(sig, lines, v):
+  """
+  Insert bottom labels for each function.
+  """
+  # Look for the structure and insert:
+  # > .globl <bottom-label>
+  #   foo:
+  #   ...
+  # > <bottom-label>
+  #   .cc_bottom foo.function
+  
+  vmsg(v, '  Inserting function labels')
+  
+  # For each function, for each line...
+  # (Create a new list and modify it each time...)
+  b = False
+  for x in sig.mobile_proc_names:
+    new = []
+    for (i, y) in enumerate(lines):
+      new.append(y)
+      if y == x+':\n' and not b:
+        new.insert(len(new)-1, 
+            '.globl '+function_label_bottom(x)+'\n')
+        b = True
+      elif y[0] == '.' and b:
+        if y.split()[0] == '.cc_bottom':
+          new.insert(len(new)-1, 
+              function_label_bottom(x)+':\n')
+          b = False
+    lines = new
+
+  return lines
+
+def reference_rewrite_calls(sig, lines, v):
+  """ 
+  Rewrite calls to program functions to branch through the jump table.
+  """
+  vmsg(v, '  Rewriting calls')
+  for (i, x) in enumerate(lines):
+    frags = x.strip().split()
+    names = builtin.runtime_functions + sig.mobile_proc_names 
+    if frags and frags[0] == 'bl' and frags[1] in names:
+      lines[i] = '\tbla cp[{}+{}]\n'.format(defs.LABEL_JUMP_TABLE, 
+          names.index(frags[1])*defs.BYTES_PER_WORD)
+  return lines
+
+# Generated programs ===========================================
+
+def generate_program(num_procs):
+  """
+  Generate the assembly for a program with many procedures, each of which
+  calls the next and has its own constants.
+  """
+  lines = ['\t.file\t"program.xc"\n', '\t.text\n']
+  for i in range(num_procs):
+    name = '_p{}'.format(i)
+    lines += [
+      '.cc_top {}.function,{}\n'.format(name, name),
+      '\t.align\t2\n',
+      '\t.globl\t{}\n'.format(name),
+      '{}:\n'.format(name),
+      '\tentsp 2\n',
+      '\tldw r0, cp[.LC{}]\n'.format(i),
+      '\tbl _p{}\n'.format((i+1) % num_procs),
+      '\tbl _connectSlave\n',
+      '\tbl printint\n',
+      '\tretsp 2\n',
+      '\t.section .cp.const4, "aMc", @progbits, 4\n',
+      '.cc_top .LC{}.data,.LC{}\n'.format(i, i),
+      '.LC{}:\n'.format(i),
+      '\t.long {}\n'.format(i),
+      '.cc_bottom .LC{}.data\n'.format(i),
+      '\t.text\n',
+      '\t.call {}, _p{}\n'.format(name, (i+1) % num_procs),
+      '.cc_bottom {}.function\n'.format(name)]
+  return lines
+
+# Tests ========================================================
+
+class AssemblyTests(unittest.TestCase):
+
+  def setUp(self):
+    config.init()
+    defs.load(config.XS1_SYSTEM_PATH+'/definitions.h')
+
+  def check(self, sig, lines):
+    expected = reference_modify_assembly(sig, list(lines), False)
+    actual = modify_assembly(sig, list(lines), False)
+    self.assertEqual(expected[0], actual[0])
+    self.assertEqual(expected[1], actual[1])
+
+  def read_program(self):
+    with open(ASSEMBLY_DIR+'/program.S', 'r') as f:
+      return f.readlines()
+
+  def test_program(self):
+    self.check(Signature(['foo', 'bar', 'baz']), self.read_program())
+
+  def test_program_unused_procs(self):
+    self.check(Signature(['baz', 'unused', 'foo']), self.read_program())
+
+  def test_program_no_procs(self):
+    self.check(Signature([]), self.read_program())
+
+  def test_generated_program(self):
+    sig = Signature(['_p{}'.format(i) for i in range(500)])
+    self.check(sig, generate_program(500))
+
+if __name__ == '__main__':
+  unittest.main()
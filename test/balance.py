@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the work estimated by estimate.py for processes with loops, calls and
+# recursion (direct or mutual), and that with --balance processes of little
+# work share the processors InsertOns gives them without any processor having
+# more work or processes than allowed, for a program with processes of uneven
+# work and for each example and feature program. As a benchmark, report the
+# processors used with and without sharing for programs of 8 to 64 processes.
+# This does not need the XMOS tools.
+
+import unittest
+
+import support
+
+import definitions as defs
+from errorlog import ErrorLog
+from parser import Parser
+from estimate import EstimateWork
+from insertons import InsertOns
+
+NUM_PROCS = [8, 16, 32, 64]
+
+def uneven(work):
+  """
+  Return a program composing processes each looping for the given number of
+  iterations.
+  """
+  s = ('proc work(val n) is\n{ var i; var x;\n  x := 0;\n'
+      + '  for i in [0 for n] do x := x + i;\n  printvalln(x)\n}\n\n'
+      + 'proc main() is\n{ ')
+  s += ' & '.join(['work({})'.format(x) for x in work])
+  return s + ' }$\n'
+
+def recursive():
+  """
+  Return a program composing two recursive processes, whose work is that of
+  one call (and its condition) multiplied by WORK_RECURSION.
+  """
+  return ('proc fib(val n) is\n'
+      + '{ if n < 2 then skip else { fib(n-1); fib(n-2) } }\n\n'
+      + 'proc main() is\n{ fib(10) & fib(2) }$\n')
+
+# Two mutually recursive procedures: the work of the first estimated is that
+# of one call (and its condition), with the work of the other, multiplied by
+# WORK_RECURSION, and the other then counts it in full
+MUTUAL = ('proc a(val n) is\n{ if n < 1 then skip else b(n-1) }\n\n'
+    + 'proc b(val n) is\n{ if n < 1 then skip else a(n-1) }\n')
+
+class RecordedInsertOns(InsertOns):
+  """
+  Record the work and locations of the processes of each composition shared.
+  """
+  results = []
+
+  def share(self, node, d, sizes, marks, e):
+    work = [self.work.stmt(x) for x in node.stmt]
+    original = list(sizes)
+    e = super().share(node, d, sizes, marks, e)
+    locations = [d] + [x.expr.elem.value for x in node.stmt[1:]]
+    RecordedInsertOns.results.append((work, original, locations, e,
+      self.device.num_threads()))
+    return e
+
+# Tests ========================================================
+
+class BalanceTests(support.PatchedTestCase):
+  patches = {'InsertOns': RecordedInsertOns}
+
+  def compile_program(self, s, cores):
+    self.assertEqual(support.compile_program(s, cores, ['--balance']), 0)
+
+  def check(self, work, sizes, locations, e, threads):
+    """
+    Check no processor shared has more work than the most heavily loaded
+    process or more processes than half its threads, and each other process
+    has its own processors.
+    """
+    shared = {}
+    for (w, n, l) in zip(work, sizes, locations):
+      if n == 1:
+        shared.setdefault(l, []).append(w)
+    for x in shared.values():
+      self.assertLessEqual(sum(x), max(work))
+      self.assertLessEqual(len(x), threads // 2)
+    blocks = sorted([(l, n) for (l, n) in zip(locations, sizes) if n != 1]
+        + [(l, 1) for l in shared.keys()])
+    self.assertEqual(sum([n for (l, n) in blocks]), e)
+    for ((a, n), (b, m)) in zip(blocks, blocks[1:]):
+      self.assertEqual(a + n, b)
+
+  def test_estimate(self):
+    self.compile_program(uneven([1000, 10, 20, 500, 30, 400]), 8)
+    ((work, sizes, locations, e, threads),) = RecordedInsertOns.results
+    self.assertEqual(work, [2003, 23, 43, 1003, 63, 803])
+
+  def test_share(self):
+    self.compile_program(uneven([1000, 10, 20, 500, 30, 400]), 8)
+    ((work, sizes, locations, e, threads),) = RecordedInsertOns.results
+    self.assertEqual(locations, [0, 1, 2, 2, 2, 2])
+    self.assertEqual(e, 3)
+    self.check(work, sizes, locations, e, threads)
+
+  def test_recursive(self):
+    self.compile_program(recursive(), 8)
+    ((work, sizes, locations, e, threads),) = RecordedInsertOns.results
+    self.assertEqual(work, [2 * defs.WORK_RECURSION] * 2)
+    self.assertEqual(locations, [0, 1])
+    self.assertEqual(e, 2)
+
+  def test_mutual(self):
+    program = Parser(ErrorLog(), lex_optimise=True, yacc_debug=False,
+        yacc_optimise=False).parse(MUTUAL)
+    w = (2 + 2 * defs.WORK_RECURSION) * defs.WORK_RECURSION
+    e = EstimateWork(program.defs)
+    self.assertEqual((e.proc('a'), e.proc('b')), (w, 2 + w))
+    e = EstimateWork(program.defs)
+    self.assertEqual((e.proc('b'), e.proc('a')), (w, 2 + w))
+
+  def test_programs(self):
+    for x in support.programs():
+      support.compile(x, 64, ['--balance', '--place'])
+    for x in RecordedInsertOns.results:
+      self.check(*x)
+
+  @support.benchmark
+  def test_benchmark(self):
+    support.report('\nProcessors used:\n{:>10} {:>8} {:>8}\n'.format(
+        'processes', 'alone', 'shared'))
+    for n in NUM_PROCS:
+      work = [1000 // (i+1) for i in range(n)]
+      self.compile_program(uneven(work), n)
+      (work, sizes, locations, e, threads) = RecordedInsertOns.results[-1]
+      self.check(work, sizes, locations, e, threads)
+      support.report('{:>10} {:>8} {:>8}\n'.format(n, n, e))
+
+if __name__ == '__main__':
+  unittest.main()
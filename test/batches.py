@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check batch compilation (batch.py): the jobs of a job file, compiling
+# programs with different --val overrides and numbers of cores, give the same
+# translations as compiling each on its own, and a job that fails is reported
+# without stopping the others. This does not need the XMOS tools.
+
+import io
+import os
+import tempfile
+import unittest
+import contextlib
+
+import support
+
+import main
+
+PROGRAM = 'val N is 1;\n\nproc main() is printvalln(N)\n'
+
+# (values, cores) of each job
+JOBS = [([], 4), (['N=2'], 4), (['N=3'], 16)]
+
+class BatchTests(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.TemporaryDirectory()
+    self.src = os.path.join(self.dir.name, 'program.sire')
+    with open(self.src, 'w') as f:
+      f.write(PROGRAM)
+
+  def tearDown(self):
+    self.dir.cleanup()
+
+  def args(self, i, vals, cores, name='out'):
+    return [self.src, '-T', '-n', str(cores), '-o', os.path.join(
+      self.dir.name, '{}{}.xc'.format(name, i))] + [y for x in vals
+        for y in ['--val', x]]
+
+  def batch(self, jobs):
+    filename = os.path.join(self.dir.name, 'jobs')
+    with open(filename, 'w') as f:
+      f.write('# Jobs\n\n' + '\n'.join([' '.join(x) for x in jobs]) + '\n')
+    err = io.StringIO()
+    with contextlib.redirect_stderr(err):
+      status = main.main(['--batch', filename, '-j', '2'])
+    return (status, err.getvalue())
+
+  def read(self, i, name='out'):
+    with open(os.path.join(self.dir.name, '{}{}.xc'.format(name, i))) as f:
+      return f.read()
+
+  def test_jobs(self):
+    (status, err) = self.batch([self.args(i, vals, cores)
+        for (i, (vals, cores)) in enumerate(JOBS)])
+    self.assertEqual(status, 0, err)
+    outs = []
+    for (i, (vals, cores)) in enumerate(JOBS):
+      with contextlib.redirect_stderr(io.StringIO()):
+        self.assertEqual(main.main(self.args(i, vals, cores, 'expected')), 0)
+      outs.append(self.read(i))
+      self.assertEqual(outs[-1], self.read(i, 'expected'))
+    self.assertEqual(len(set(outs)), len(JOBS))
+
+  def test_failure(self):
+    (status, err) = self.batch([self.args(0, ['N=2'], 4),
+        self.args(1, ['M=2'], 4), self.args(2, ['N=3'], 4)])
+    self.assertEqual(status, 1)
+    self.assertIn("no val definition 'M' to override", err)
+    self.assertFalse(os.path.exists(os.path.join(self.dir.name, 'out1.xc')))
+    self.assertNotEqual(self.read(0), self.read(2))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the channel table: elements are distinguished by name and subscript,
+# uses resolve to the innermost declaration and the first and second ends
+# inserted are the master and slave (and, as a benchmark, report the memory
+# used by, and time to look up, the elements of a large channel array). Then
+# check the connection identifiers labelled by LabelConns are shared only
+# between channels of par statements that cannot run at the same time. This
+# does not need the XMOS tools.
+
+import os
+import re
+import time
+import tempfile
+import tracemalloc
+import unittest
+
+import support
+
+from chantab import ChanTable
+import main
+
+NUM_ELEMS = 8192
+
+# Channels x, y and z are declared in pars that run one after another, and w
+# in a par nested in that of z.
+PROGRAM = """
+proc foo(chanend c) is c ! 0
+
+proc bar(chanend c) is
+{ var v;
+  c ? v
+}
+
+proc main() is
+{ { chan x;
+    foo(x) & on 1 do bar(x)
+  };
+  { chan y;
+    foo(y) & on 2 do bar(y)
+  };
+  { chan z;
+    { foo(z) & on 1 do bar(z) } &
+    { chan w;
+      foo(w) & on 3 do bar(w)
+    }
+  }
+}
+"""
+
+class ChanSet(object):
+  def __init__(self, chanend):
+    self.chanend = chanend
+
+class Chan(object):
+  def __init__(self, name, chanend):
+    self.name = name
+    self.chanend = chanend
+
+class Elem(object):
+  def __init__(self, index, location):
+    self.index = index
+    self.location = location
+
+# Tests ========================================================
+
+class ChanTableTests(unittest.TestCase):
+
+  def setUp(self):
+    self.tab = ChanTable('main')
+    self.tab.begin_scope()
+
+  def test_subscripts(self):
+    tab = self.tab
+    tab.declare('c', 12)
+    tab.declare('c1', 2)
+    tab.insert('c', 11, 3, '_c0', ChanSet('_c0'))
+    tab.insert('c1', 1, 4, '_c1', ChanSet('_c1'))
+    self.assertEqual(tab.lookup_locations('c', 11), [3])
+    self.assertEqual(tab.lookup_locations('c1', 1), [4])
+    self.assertFalse(tab.contains('c', 1))
+    self.assertFalse(tab.contains('c1', 11))
+    tab.insert('c', 12, 5, '_c0', ChanSet('_c0'))
+    tab.insert('c', -1, 6, '_c0', ChanSet('_c0'))
+    self.assertEqual(tab.lookup_locations('c', 12), [5])
+    self.assertEqual(tab.lookup_locations('c', -1), [6])
+    self.assertEqual(tab.lookup_locations('c', 11), [3])
+
+  def test_scopes(self):
+    tab = self.tab
+    tab.declare('c')
+    tab.begin_scope()
+    tab.insert('c', None, 1, '_c0', ChanSet('_c0'))
+    tab.begin_scope()
+    tab.declare('c')
+    tab.insert('c', None, 2, '_c1', ChanSet('_c1'))
+    inner = tab.end_scope()
+    outer = tab.end_scope()
+    self.assertEqual(tab.lookup_locations('c', None, inner), [2])
+    self.assertEqual(tab.lookup_locations('c', None, outer), [1])
+    self.assertEqual(tab.lookup_locations('c', None), [1])
+
+  def test_master(self):
+    tab = self.tab
+    tab.declare('c', 2)
+    (a, b) = (ChanSet('_c0'), ChanSet('_c1'))
+    tab.insert_all('c', [0, 1], [1, 2], '_c0', a)
+    tab.insert_all('c', [0, 1], [3, 2], '_c1', b)
+    self.assertEqual(tab.lookup_master_location('c', 0), 1)
+    self.assertEqual(tab.lookup_slave_location('c', 0), 3)
+    self.assertTrue(tab.lookup_is_master(Chan('c', '_c1'), Elem(0, 1)))
+    self.assertFalse(tab.lookup_is_master(Chan('c', '_c1'), Elem(0, 3)))
+    self.assertTrue(tab.lookup_is_master(Chan('c', '_c0'), Elem(1, 2)))
+    self.assertFalse(tab.lookup_is_master(Chan('c', '_c1'), Elem(1, 2)))
+    self.assertIs(tab.lookup_chanset(Chan('c', '_c1'), Elem(1, 2)), b)
+    self.assertEqual(tab.lookup_connid('c', 1, None), -1)
+    tab.set_connid('c', 1, None, 4)
+    self.assertEqual(tab.lookup_connid('c', 1, None), 4)
+    self.assertEqual(tab.lookup_connid('c', 0, None), -1)
+
+  @support.benchmark
+  def test_benchmark(self):
+    tracemalloc.start()
+    tab = self.tab
+    tab.declare('c', NUM_ELEMS)
+    tab.begin_scope()
+    tab.begin_scope()
+    tab.insert_all('c', range(NUM_ELEMS), range(NUM_ELEMS), '_c0',
+        ChanSet('_c0'))
+    tab.insert_all('c', range(NUM_ELEMS), range(1, NUM_ELEMS+1), '_c1',
+        ChanSet('_c1'))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    chan = Chan('c', '_c0')
+    elems = [Elem(x, x) for x in range(NUM_ELEMS)]
+    t = time.perf_counter()
+    for x in elems:
+      tab.lookup_connid('c', x.index, None)
+      tab.lookup_is_master(chan, x)
+      tab.lookup_slave_location('c', x.index)
+    lookup = time.perf_counter() - t
+    support.report('\n{} elements: {:.0f} bytes per element, {:.3f}s '
+        'lookup ... '.format(NUM_ELEMS, size / NUM_ELEMS, lookup))
+
+class LabelConnsTests(unittest.TestCase):
+
+  def test_reuse(self):
+    with tempfile.TemporaryDirectory() as d:
+      src = os.path.join(d, 'conns.sire')
+      out = os.path.join(d, 'conns.xc')
+      with open(src, 'w') as f:
+        f.write(PROGRAM)
+      self.assertEqual(main.main([src, '-n', '4', '-T', '-o', out]), 0)
+      with open(out) as f:
+        conns = re.findall(r'_connectMaster\((\d+), (\d+)\)', f.read())
+    masters = sorted([(int(x), int(y)) for (x, y) in conns])
+    self.assertEqual(masters, [(0, 1), (0, 1), (0, 2), (1, 3)])
+
+if __name__ == '__main__':
+  unittest.main()
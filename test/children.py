@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the children found by children.py from the condensed call graph are
+# those found by the fixed-point closure it replaced (below), for random call
+# graphs with recursion and for each example and feature program, and that
+# they are given in the order of the mobile procedures. As a benchmark,
+# report the time each takes for a program with many procedures. This does
+# not need the XMOS tools.
+
+import time
+import random
+import unittest
+
+import support
+
+from children import Children
+
+NUM_PROCS = [1000, 2000, 4000, 8000]
+NUM_FIXED_POINT = 1000
+CLUSTER_SIZE = 20
+NUM_GRAPHS = 50
+
+class Signature(object):
+  def __init__(self, names):
+    self.mobile_proc_names = names
+
+def fixed_point(children):
+  """
+  The fixed-point closure: add the children of each child until there are
+  no more to add.
+  """
+  children = dict([(x, list(y)) for (x, y) in children.items()])
+  change = True
+  while change:
+    change = False
+    for x in children.keys():
+      for y in children[x]:
+        for z in children[y]:
+          if not z in children[x] and x != z:
+            children[x].append(z)
+            change = True
+  return children
+
+def graph(n, calls, seed):
+  """
+  Return the children of n procedures, each calling (at most) some number of
+  others chosen at random, so there are cycles.
+  """
+  r = random.Random(seed)
+  names = ['p{}'.format(i) for i in range(n)]
+  child = Children(Signature(names))
+  for x in names:
+    child.parent = x
+    [child.add_child(r.choice(names)) for i in range(r.randint(0, calls))]
+  return child
+
+def chain(n):
+  """
+  Return the children of n procedures, each calling the next, with the last
+  calling the first.
+  """
+  names = ['p{}'.format(i) for i in range(n)]
+  child = Children(Signature(names))
+  for (i, x) in enumerate(names):
+    child.parent = x
+    child.add_child(names[(i+1) % n])
+  return child
+
+def clusters(n, size, calls, seed):
+  """
+  Return the children of n procedures, in clusters of the given size, each
+  procedure calling some others in its cluster chosen at random, like the
+  procedures generated for each replicator, with the first also calling the
+  first of each cluster, like main.
+  """
+  r = random.Random(seed)
+  names = ['p{}'.format(i) for i in range(n)]
+  child = Children(Signature(names))
+  for (i, x) in enumerate(names):
+    child.parent = x
+    c = i - i % size
+    [child.add_child(names[min(c+r.randrange(size), n-1)])
+        for j in range(r.randint(0, calls))]
+  child.parent = names[0]
+  [child.add_child(x) for x in names[size::size]]
+  return child
+
+class CheckedChildren(Children):
+  """
+  Record the children found by both closures for each program.
+  """
+  results = []
+
+  def build(self):
+    expected = fixed_point(self.children)
+    super().build()
+    CheckedChildren.results.append((expected, self.children))
+
+# Tests ========================================================
+
+class ChildrenTests(support.PatchedTestCase):
+  patches = {'Children': CheckedChildren}
+
+  def check(self, expected, children, names):
+    self.assertEqual(set(expected.keys()), set(children.keys()))
+    for x in expected.keys():
+      self.assertEqual(set(expected[x]), set(children[x]), x)
+      self.assertEqual(children[x], sorted(children[x], key=names.index), x)
+      self.assertFalse(x in children[x], x)
+
+  def test_graphs(self):
+    for i in range(NUM_GRAPHS):
+      child = graph(60, 3, i)
+      expected = fixed_point(child.children)
+      child.build()
+      self.check(expected, child.children, child.names)
+
+  def test_recursive(self):
+    child = chain(5)
+    child.build()
+    self.assertEqual(child.children['p2'], ['p0', 'p1', 'p3', 'p4'])
+
+  def test_programs(self):
+    for x in support.programs():
+      support.compile(x, 16)
+    self.assertGreater(len(CheckedChildren.results), 20)
+    for (expected, children) in CheckedChildren.results:
+      self.check(expected, children, list(children.keys()))
+
+  @support.benchmark
+  def test_benchmark(self):
+    child = clusters(NUM_FIXED_POINT, CLUSTER_SIZE, 3, 0)
+    t = time.perf_counter()
+    expected = fixed_point(child.children)
+    t = time.perf_counter() - t
+    child.build()
+    self.check(expected, child.children, child.names)
+    support.report('\n{} procedures: {:.3f}s fixed-point'.format(
+        NUM_FIXED_POINT, t))
+    for n in NUM_PROCS:
+      child = clusters(n, CLUSTER_SIZE, 3, 0)
+      t = time.perf_counter()
+      child.build()
+      t = time.perf_counter() - t
+      support.report('\n{} procedures: {:.3f}s condensed'.format(n, t))
+    support.report(' ... ')
+
+if __name__ == '__main__':
+  unittest.main()
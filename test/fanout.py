@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the distribution processes generated by transformrep.py for each
+# fan-out (--rep-fanout) create every process of a replicator once, on the
+# same core as the binary distribution does, by interpreting them. As a
+# benchmark, report the spawn latency of rep_basic_1d, array2d and farm on 64
+# to 1024 cores, as the rounds of remote process creation on the longest path.
+# This does not need the XMOS tools.
+
+import os
+import tempfile
+import unittest
+
+import support
+from support import INSTALL_PATH
+
+import ast
+from transformrep import TransformRep, levels
+
+FANOUTS = [2, 4, 8]
+CORES = [64, 256, 1024]
+
+# (program, values for each number of cores)
+PROGRAMS = [
+  ('features/rep_basic_1d.sire', lambda n: []),
+  ('examples/array2d.sire', lambda n: ['--val', 'N={}'.format(
+      int(n ** 0.5))]),
+  ('examples/farm.sire', lambda n: []),
+]
+
+class RecordedTransformRep(TransformRep):
+  """
+  Record the definitions, call and location of each replicator transformed.
+  """
+  results = []
+
+  def transform_rep(self, stmt):
+    base = stmt.location.elem.value
+    (d, c) = super().transform_rep(stmt)
+    RecordedTransformRep.results.append((d, c, base))
+    return (d, c)
+
+BINOPS = {
+  '+': lambda a, b: a + b,
+  '-': lambda a, b: a - b,
+  '*': lambda a, b: a * b,
+  '/': lambda a, b: a // b,
+  'rem': lambda a, b: a % b,
+  '>>': lambda a, b: a >> b,
+  '>': lambda a, b: a > b,
+  '=': lambda a, b: a == b,
+}
+
+class Distribution(object):
+  """
+  Interpret a distribution process, recording the core and the value of the
+  first argument of each process it creates, and return the rounds of remote
+  process creation on the longest path.
+  """
+  def __init__(self, defs):
+    self.defs = dict([(x.name, x) for x in defs])
+    self.procs = []
+
+  def expr(self, e, env):
+    if isinstance(e, ast.ExprSingle):
+      return self.elem(e.elem, env)
+    if isinstance(e, ast.ExprBinop):
+      return BINOPS[e.op](self.elem(e.elem, env), self.expr(e.right, env))
+    raise ValueError(e)
+
+  def elem(self, e, env):
+    if isinstance(e, ast.ElemNumber):
+      return e.value
+    if isinstance(e, ast.ElemGroup):
+      return self.expr(e.expr, env)
+    if isinstance(e, ast.ElemId) and e.name in env:
+      return env[e.name]
+    raise ValueError(e)
+
+  def call(self, stmt, env, core):
+    d = self.defs[stmt.name]
+    args = [self.expr(x, env) if i < 3 else None
+        for (i, x) in enumerate(stmt.args)]
+    return self.stmt(d.stmt, dict(zip([x.name for x in d.formals], args)),
+        core)
+
+  def stmt(self, s, env, core):
+    if isinstance(s, ast.StmtSeq):
+      return sum([self.stmt(x, env, core) for x in s.stmt])
+    if isinstance(s, ast.StmtPar):
+      return max([self.stmt(x, env, core) for x in s.stmt])
+    if isinstance(s, ast.StmtIf):
+      return self.stmt(s.thenstmt if self.expr(s.cond, env) else s.elsestmt,
+          env, core)
+    if isinstance(s, ast.StmtAss):
+      env[s.left.name] = self.expr(s.expr, env)
+      return 0
+    if isinstance(s, ast.StmtOn):
+      c = self.expr(s.expr, env)
+      return (1 if c != core else 0) + self.stmt(s.stmt, env, c)
+    if isinstance(s, ast.StmtPcall) and s.name in self.defs:
+      return self.call(s, env, core)
+    if isinstance(s, ast.StmtPcall):
+      self.procs.append((core, self.expr(s.args[0], env)))
+      return 0
+    if isinstance(s, ast.StmtSkip):
+      return 0
+    raise ValueError(s)
+
+  def run(self, call, core):
+    return self.call(call, {}, core)
+
+# Tests ========================================================
+
+class FanoutTests(support.PatchedTestCase):
+  patches = {'TransformRep': RecordedTransformRep}
+
+  def distribute(self, program, cores, fanout, vals=[]):
+    """
+    Return the processes created and rounds taken by each replicator.
+    """
+    RecordedTransformRep.results = []
+    self.assertEqual(support.compile(os.path.join(INSTALL_PATH, 'test',
+      program), cores, ['--rep-fanout', str(fanout)] + vals), 0)
+    results = []
+    for (defs, call, base) in RecordedTransformRep.results:
+      self.assertEqual(len(defs), 1 if fanout == 2 else 2)
+      t = Distribution(defs)
+      rounds = t.run(call, base)
+      results.append((sorted(t.procs), rounds))
+    return results
+
+  def test_placement(self):
+    for (program, vals) in PROGRAMS:
+      binary = self.distribute(program, 64, 2, vals(64))
+      self.assertTrue(binary)
+      for k in FANOUTS[1:]:
+        results = self.distribute(program, 64, k, vals(64))
+        self.assertEqual([x[0] for x in results], [x[0] for x in binary])
+        for (procs, rounds) in results:
+          self.assertEqual(len(set(procs)), len(procs))
+          self.assertEqual(rounds, levels(k, len(procs)))
+
+  def test_uneven(self):
+    # A replicator that does not fill the tree
+    s = 'proc main() is { var i; par i in [0 for 37] do printvalln(i) }'
+    with tempfile.TemporaryDirectory() as d:
+      src = os.path.join(d, 'rep.sire')
+      with open(src, 'w') as f:
+        f.write(s)
+      for k in FANOUTS:
+        ((procs, rounds),) = self.distribute(src, 64, k)
+        self.assertEqual(procs, [(i, i) for i in range(37)])
+
+  def test_auto(self):
+    ((procs, rounds),) = self.distribute('features/rep_basic_1d.sire', 16,
+        'auto')
+    self.assertEqual(rounds, 2)
+
+  @support.benchmark
+  def test_benchmark(self):
+    support.report('\nRounds of remote process creation:\n{:>30} {:>6} '
+        .format('program', 'cores') + ''.join(['{:>4}'.format('k='+str(k))
+          for k in FANOUTS]) + '\n')
+    for (program, vals) in PROGRAMS:
+      for n in CORES:
+        rounds = [max([x[1] for x in self.distribute(program, n, k, vals(n))])
+            for k in FANOUTS]
+        support.report('{:>30} {:>6} '.format(program, n)
+            + ''.join(['{:>4}'.format(x) for x in rounds]) + '\n')
+
+if __name__ == '__main__':
+  unittest.main()
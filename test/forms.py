@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the closed-form evaluation of expressions over replicator indices in
+# affine.py, and the kernels compiled by vecexpr.py (with and without NumPy),
+# give the same values as substituting the indices into the expression and
+# evaluating it at each point. This does not need the XMOS tools.
+
+import copy
+import unittest
+from itertools import product
+
+import support
+
+import ast
+from errorlog import ErrorLog
+from parser import Parser
+from subelem import SubElem
+from evalexpr import EvalExpr
+from affine import expand
+import vecexpr
+from vecexpr import evaluate
+
+NAMES = ['i', 'j', 'k']
+RANGES = [range(0, 3), range(2, 6), range(1, 8)]
+
+# Expressions with a closed form
+AFFINE = [
+  '7',
+  'i',
+  '(j*4)+i',
+  '(i*4)+((j+1) rem 4)',
+  '((2*i)+1) - k',
+  '-(i - j)',
+  '~k',
+  '(i+j+k) / 2',
+  '((4*i)+(8*j)) / 4',
+  '(((i*3)+k) rem 5) + (j / 3)',
+  '(k << 2) + (j >> 1)',
+  '5 - 3 - i',
+  '(k - 20) / 3',
+  '(i - k) rem 3',
+  '(1 << 40) + k',
+]
+
+# Expressions without
+OTHER = [
+  'i * j',
+  'i xor 1',
+  '(i xor (i xor 1)) and (-(i < (i xor 1)))',
+  'k / (i+1)',
+  'j << i',
+  '(i < j) + (k >= 4) + (i = 1) + (j ~= 3) + (k <= 2) + (k > i)',
+  '(i or k) - (j and 6)',
+  '(-k) rem 4 + ((-j) / 3)',
+  '(k * 100000) * (k * 100000)',
+  '((i*3)+k) rem 5 + (j / 3)',
+]
+
+def parse_expr(parser, s):
+  program = parser.parse('proc main() is x := {}'.format(s))
+  return program.defs[0].stmt.expr
+
+def substitute(expr):
+  values = []
+  for x in product(*RANGES):
+    e = copy.deepcopy(expr)
+    for (y, z) in zip(NAMES, x):
+      e.accept(SubElem(ast.ElemId(y), ast.ElemNumber(z)))
+    values.append(EvalExpr().expr(e))
+  return values
+
+# Tests ========================================================
+
+class FormTests(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    cls.parser = Parser(ErrorLog(), lex_optimise=True, yacc_debug=False,
+        yacc_optimise=False)
+
+  def test_affine(self):
+    for s in AFFINE:
+      e = parse_expr(self.parser, s)
+      self.assertEqual(substitute(e), expand(e, NAMES, RANGES), s)
+
+  def test_other(self):
+    for s in OTHER:
+      self.assertEqual(expand(parse_expr(self.parser, s), NAMES, RANGES),
+          None, s)
+
+  def check_kernel(self):
+    for s in AFFINE + OTHER:
+      e = parse_expr(self.parser, s)
+      self.assertEqual(substitute(e), evaluate(e, NAMES, RANGES), s)
+
+  def test_kernel(self):
+    self.check_kernel()
+
+  def test_kernel_without_numpy(self):
+    numpy = vecexpr.numpy
+    vecexpr.numpy = None
+    try:
+      self.check_kernel()
+    finally:
+      vecexpr.numpy = numpy
+
+  def test_repeated_name(self):
+    e = parse_expr(self.parser, '(2*i)+j')
+    self.assertEqual(expand(e, ['i', 'j', 'i'], RANGES),
+      [(2*x)+y for (x, y, z) in product(*RANGES)])
+
+  def test_empty_range(self):
+    e = parse_expr(self.parser, 'i+j')
+    self.assertEqual(expand(e, NAMES, [range(0, 2), range(0), range(0, 2)]),
+        [])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check that chunkreps.py divides a replicator with more processes than
+# processors into chunks, so a ring of processes connected by channels runs
+# over the threads of each processor with its channels labelled between
+# neighbouring chunks, and processes without channels run in sequence; that a
+# number of processes without a suitable divisor is divided with a partial last
+# chunk, using every processor; that a grain given with --grain is kept for
+# processes without channels and rounded up to a divisor of the number of
+# processes for a ring; and that each example and feature program compiles,
+# with and without --grain, on few enough processors to be divided. As a
+# benchmark, report the chunks used by replicators of 512 processes on 4 to 512
+# processors. This does not need the XMOS tools.
+
+import os
+import io
+import unittest
+
+import support
+
+import ast
+import main
+from chunkreps import ChunkReps, processes
+from placement import ChannelGraph
+
+NUM_CORES = [4, 16, 64, 256, 512]
+
+# Errors of the example programs themselves (also reported without chunking)
+KNOWN_ERRORS = set([
+  ('search.sire', 'Error: channel c has no slave connection')])
+
+def ring(n):
+  """
+  Return a program replicating a ring of n processes, each connected to the
+  next by a channel.
+  """
+  return ('proc node(chanend l, chanend r, val v) is\n'
+      + '{{ var x; r ! v; l ? x; printvalln(x) }}\n\n'
+      + 'proc main() is\n{{ chan c[{0}];\n  var i;\n'
+      + '  par i in [0 for {0}] do node(c[i], c[(i+1) rem {0}], i)\n}}\n'
+      ).format(n)
+
+def independent(n, m):
+  """
+  Return a program replicating n x m processes without channels.
+  """
+  return ('proc work(val v) is\n{{ var x; x := v; printvalln(x) }}\n\n'
+      + 'proc main() is\n{{ var i; var j;\n'
+      + '  par i in [0 for {}], j in [0 for {}] do work(i*j)\n}}\n'
+      ).format(n, m)
+
+class RecordedChunkReps(ChunkReps):
+  """
+  Record the processes and grain of each replicator divided.
+  """
+  results = []
+
+  def chunk(self, node, g, v):
+    m = processes(node)
+    divided = super().chunk(node, g, v)
+    if divided:
+      RecordedChunkReps.results.append((m, processes(node),
+        isinstance(node.stmt, ast.StmtPar)))
+    return divided
+
+class RecordedLabelConns(main.LabelConns):
+  """
+  Record the edges between the locations of the ends of each channel.
+  """
+  results = None
+
+  def walk_program(self, node):
+    graph = ChannelGraph([])
+    node.defs[-1].accept(graph)
+    RecordedLabelConns.results = graph.edges()
+    super().walk_program(node)
+
+# Tests ========================================================
+
+class GrainTests(support.PatchedTestCase):
+  patches = {'ChunkReps': RecordedChunkReps, 'LabelConns': RecordedLabelConns}
+
+  def test_ring(self):
+    self.assertEqual(support.compile_program(ring(256), 64), 0)
+    self.assertEqual(RecordedChunkReps.results, [(256, 64, True)])
+    edges = dict([((x, x+1), 1) for x in range(63)] + [((0, 63), 1)])
+    self.assertEqual(dict(RecordedLabelConns.results), edges)
+
+  def test_ring_sequential(self):
+    self.assertEqual(support.compile_program(ring(256), 16), 1)
+    self.assertEqual(RecordedChunkReps.results, [])
+
+  def test_sequential(self):
+    self.assertEqual(support.compile_program(independent(8, 8), 4), 0)
+    self.assertEqual(RecordedChunkReps.results, [(64, 4, False)])
+
+  def test_partial(self):
+    for (n, cores) in [(13, 4), (14, 4), (31, 16)]:
+      RecordedChunkReps.results = []
+      self.assertEqual(support.compile_program(independent(n, 1), cores), 0)
+      self.assertEqual(RecordedChunkReps.results, [(n, cores, True)])
+
+  def test_grain(self):
+    self.assertEqual(support.compile_program(independent(8, 8), 64,
+      ['--grain', '3']), 0)
+    self.assertEqual(RecordedChunkReps.results, [(64, 22, True)])
+    self.assertEqual(support.compile_program(ring(256), 256,
+      ['--grain', '1']), 0)
+    self.assertEqual(RecordedChunkReps.results, [(64, 22, True)])
+    self.assertEqual(support.compile_program(ring(255), 256,
+      ['--grain', '2']), 0)
+    self.assertEqual(RecordedChunkReps.results[1:], [(255, 85, True)])
+
+  def test_programs(self):
+    for x in support.programs():
+      for cores in [4, 16]:
+        for options in [[], ['--grain', '2']]:
+          err = io.StringIO()
+          support.compile(x, cores, options, err)
+          errors = [y for y in err.getvalue().splitlines()
+              if ('error' in y.lower() or 'Traceback' in y)
+              and not 'insufficient processors' in y
+              and not (os.path.basename(x), y) in KNOWN_ERRORS]
+          self.assertEqual(errors, [], '{} -n {} {}'.format(x, cores,
+            ' '.join(options)))
+    self.assertGreater(len(RecordedChunkReps.results), 0)
+
+  @support.benchmark
+  def test_benchmark(self):
+    support.report('\nChunks of 512 processes:\n{:>10} {:>8} {:>8}\n'
+        .format('processors', 'ring', 'no chans'))
+    for n in NUM_CORES:
+      r = []
+      for s in [ring(512), independent(32, 16)]:
+        RecordedChunkReps.results = []
+        e = support.compile_program(s, n)
+        r.append('-' if e != 0 else RecordedChunkReps.results[0][1]
+          if RecordedChunkReps.results else 512)
+      support.report('{:>10} {:>8} {:>8}\n'.format(n, *r))
+
+if __name__ == '__main__':
+  unittest.main()
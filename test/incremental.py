@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check incremental compilation (transcache.py): compiling a program again
+# reuses the translation of each procedure, editing one procedure translates
+# only that procedure again, even when it allocates a different number of
+# labels than before, and the result is the same as compiling the program
+# without the cache; and a program is translated again in a process with a
+# different seed for hashing reusing every translation. This does not need
+# the XMOS tools.
+
+import io
+import os
+import re
+import tempfile
+import unittest
+import contextlib
+import subprocess
+
+import support
+from support import INSTALL_PATH
+
+import main
+import objcache
+import transcache
+
+PROGRAM = '''proc work(val v) is
+{{ var x; x := v; printvalln(x) }}
+
+proc p(val v) is
+{{ {} }}
+
+proc q(val v) is
+{{ work(v) & work(v+2) }}
+
+proc main() is
+{{ p(1); q(2) }}
+'''
+
+REPORT = re.compile(r'Translation cache: ([0-9]+) hits?, ([0-9]+) miss')
+
+class IncrementalTests(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.TemporaryDirectory()
+    self.env = os.environ.get(objcache.CACHE_PATH_ENV)
+    os.environ[objcache.CACHE_PATH_ENV] = os.path.join(self.dir.name, 'cache')
+    self.src = os.path.join(self.dir.name, 'program.sire')
+
+  def tearDown(self):
+    if self.env == None:
+      del os.environ[objcache.CACHE_PATH_ENV]
+    else:
+      os.environ[objcache.CACHE_PATH_ENV] = self.env
+    self.dir.cleanup()
+
+  def compile(self, s, options=['--incremental']):
+    """
+    Compile a program and return its translation, with the numbers of
+    translations reused and made.
+    """
+    with open(self.src, 'w') as f:
+      f.write(s)
+    out = os.path.join(self.dir.name, 'program.xc')
+    err = io.StringIO()
+    with contextlib.redirect_stderr(err):
+      self.assertEqual(main.main([self.src, '-T', '-n', '4', '-o', out]
+        + options), 0, err.getvalue())
+    with open(out) as f:
+      return (f.read(), transcache.hits, transcache.misses)
+
+  def test_edit(self):
+    s = PROGRAM.format('work(v) & work(v+1)')
+    (expected, hits, misses) = self.compile(s, ['--no-cache'])
+    self.assertEqual(self.compile(s), (expected, 0, 4))
+    self.assertEqual(self.compile(s), (expected, 4, 0))
+    # Add a component to p, which allocates more labels before q
+    s = PROGRAM.format('work(v) & work(v+1) & work(v+3)')
+    (expected, hits, misses) = self.compile(s, ['--no-cache'])
+    self.assertEqual(self.compile(s), (expected, 3, 1))
+
+  def compile_seed(self, src, seed):
+    """
+    Compile a program in a new interpreter with a seed for hashing and return
+    the numbers of translations reused and made.
+    """
+    out = subprocess.check_output(['python3',
+      os.path.join(INSTALL_PATH, 'compiler', 'main.py'), src, '-T', '-n', '16',
+      '--incremental', '-v', '-o', os.path.join(self.dir.name, 'program.xc')],
+      env=dict(os.environ, PYTHONHASHSEED=seed), stderr=subprocess.DEVNULL)
+    m = REPORT.search(out.decode('utf-8'))
+    return (int(m.group(1)), int(m.group(2)))
+
+  def test_seeds(self):
+    src = os.path.join(INSTALL_PATH, 'test', 'examples', 'quadtree.sire')
+    (hits, misses) = self.compile_seed(src, '1')
+    self.assertGreater(misses, 0)
+    self.assertEqual(self.compile_seed(src, '2'), (misses, 0))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the canonical keys of expressions in cmpexpr.py: expressions that
+# differ only by grouping or the order of commutative operands have the same
+# key, and others do not. As a benchmark, report the time to build a set of
+# many distinct channel uses, against pairwise structural comparison. This
+# does not need the XMOS tools.
+
+import time
+import unittest
+
+import support
+
+import ast
+from errorlog import ErrorLog
+from parser import Parser
+from cmpexpr import expr_key, cmp_expr
+from labelchans import ChanUse, ChanUseSet
+
+NUM_USES = 500
+
+# Pairs of equal expressions
+EQUAL = [
+  ('i', '(i)'),
+  ('i', '((i))'),
+  ('i + 1', '1 + i'),
+  ('(i * j) + k', 'k + (j * i)'),
+  ('i + (j + k)', '(k + i) + j'),
+  ('(i and 3) or j', 'j or (3 and i)'),
+  ('i = j', 'j = i'),
+  ('f(i + 1, j)', 'f((1 + i), j)'),
+  ('-(i)', '-i'),
+]
+
+# Pairs of different expressions
+DIFFERENT = [
+  ('i', 'j'),
+  ('i - j', 'j - i'),
+  ('i / 2', '2 / i'),
+  ('i < j', 'j < i'),
+  ('i + (j * k)', '(i + j) * k'),
+  ('i = (j = k)', '(i = j) = k'),
+  ('1', 'true'),
+  ('f(i, j)', 'f(j, i)'),
+  ('i + 1', 'i + 1 + 1'),
+]
+
+def parse_exprs(parser, exprs):
+  program = parser.parse('proc main() is {{ {} }}'.format(
+      '; '.join(['x := {}'.format(x) for x in exprs])))
+  return [x.expr for x in program.defs[0].stmt.stmt]
+
+def equal(a, b):
+  """
+  Structural comparison of two expressions, as pairwise comparison of nodes.
+  """
+  if type(a) != type(b):
+    return False
+  if isinstance(a, ast.Node):
+    return all(equal(getattr(a, x), getattr(b, x)) for x in a._fields
+        if not x in ('coord', 'key', 'symbol'))
+  if isinstance(a, list):
+    return len(a) == len(b) and all(equal(x, y) for (x, y) in zip(a, b))
+  return a == b
+
+# Tests ========================================================
+
+class KeyTests(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    cls.parser = Parser(ErrorLog(), lex_optimise=True, yacc_debug=False,
+        yacc_optimise=False)
+
+  def test_equal(self):
+    for (x, y) in EQUAL:
+      (a, b) = parse_exprs(self.parser, [x, y])
+      self.assertTrue(cmp_expr(a, b), x+' and '+y)
+
+  def test_different(self):
+    for (x, y) in DIFFERENT:
+      (a, b) = parse_exprs(self.parser, [x, y])
+      self.assertFalse(cmp_expr(a, b), x+' and '+y)
+
+  def test_cached(self):
+    (a,) = parse_exprs(self.parser, ['(i * 2) + j'])
+    k = expr_key(a)
+    self.assertEqual(a.key, k)
+    a.key = -1
+    self.assertEqual(expr_key(a), -1)
+
+  def test_uses(self):
+    es = parse_exprs(self.parser, ['i + 1', '1 + i', 'i'])
+    uses = ChanUseSet([ChanUse('c', x, None) for x in es])
+    uses.update(ChanUseSet([ChanUse('c', es[2], None),
+        ChanUse('d', es[2], None), ChanUse('c', None, None)]))
+    self.assertEqual([(x.name, x.expr) for x in uses.uses],
+        [('c', es[0]), ('c', es[2]), ('d', es[2]), ('c', None)])
+
+  @support.benchmark
+  def test_benchmark(self):
+    exprs = ['({}*i)+j'.format(x) for x in range(NUM_USES)]
+    es = parse_exprs(self.parser, exprs + exprs)
+    t = time.perf_counter()
+    uses = []
+    for x in es:
+      if not any(equal(x, y) for y in uses):
+        uses.append(x)
+    pairwise = time.perf_counter() - t
+    t = time.perf_counter()
+    s = ChanUseSet([ChanUse('c', x, None) for x in es])
+    keyed = time.perf_counter() - t
+    self.assertEqual(len(s.uses), len(uses))
+    support.report('\n{} uses: {:.3f}s pairwise, {:.3f}s keyed ... '.format(
+        len(es), pairwise, keyed))
+
+if __name__ == '__main__':
+  unittest.main()
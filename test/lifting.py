@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the components of par statements lifted into processes by
+# transformpar.py: calls to procedures of the program are run as they are, and
+# calls to builtins, which are not processes, are lifted like any other
+# statement, including those of the chunks of a replicator (chunkreps.py). The
+# parameters and local declarations of each process do not depend on the order
+# of sets, so a program is translated the same way with any seed for hashing.
+# This does not need the XMOS tools.
+
+import io
+import os
+import tempfile
+import unittest
+import subprocess
+
+import support
+from support import INSTALL_PATH
+
+import ast
+from transformpar import TransformPar
+
+class RecordedTransformPar(TransformPar):
+  """
+  Record the statements lifted into processes.
+  """
+  results = []
+
+  def stmt_to_process(self, stmt, indices):
+    RecordedTransformPar.results.append(stmt)
+    return super().stmt_to_process(stmt, indices)
+
+def calls(s):
+  """
+  Return a program running the calls in s in parallel.
+  """
+  return ('proc work(val v) is\n{{ var x; x := v; printvalln(x) }}\n\n'
+      + 'proc main() is\n{{ {} }}\n').format(' & '.join(s))
+
+SEEDS = ['0', '1', '2', '3', '5']
+
+def translate(src, seed):
+  """
+  Translate a program in a new interpreter with a seed for hashing.
+  """
+  with tempfile.TemporaryDirectory() as d:
+    out = os.path.join(d, 'program.xc')
+    subprocess.check_call(['python3',
+      os.path.join(INSTALL_PATH, 'compiler', 'main.py'), src, '-T', '-n', '4',
+      '-o', out], env=dict(os.environ, PYTHONHASHSEED=seed),
+      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with open(out) as f:
+      return f.read()
+
+# Tests ========================================================
+
+class LiftingTests(support.PatchedTestCase):
+  patches = {'TransformPar': RecordedTransformPar}
+
+  def lifted(self, s, cores=4):
+    RecordedTransformPar.results = []
+    err = io.StringIO()
+    self.assertEqual(support.compile_program(s, cores, err=err), 0,
+        err.getvalue())
+    return [x.name for x in RecordedTransformPar.results
+        if isinstance(x, ast.StmtPcall)]
+
+  def test_procedures(self):
+    self.assertEqual(self.lifted(calls(['work(1)', 'work(2)', 'work(3)'])),
+        [])
+
+  def test_builtins(self):
+    self.assertEqual(self.lifted('proc main() is\n'
+      + '{ printvalln(1) & printvalln(2) }\n'), ['printvalln'])
+    self.assertEqual(self.lifted(calls(['work(1)', 'printvalln(2)',
+      'work(3)'])), ['printvalln'])
+
+  def test_chunks(self):
+    s = 'proc main() is\n{ var i;\n  par i in [0 for 16] do printvalln(i)\n}\n'
+    self.assertEqual(self.lifted(s, 4), ['printvalln'] * 3)
+
+  def test_order(self):
+    src = os.path.join(INSTALL_PATH, 'test', 'features', 'server_5.sire')
+    self.assertEqual(len(set([translate(src, x) for x in SEEDS])), 1)
+
+if __name__ == '__main__':
+  unittest.main()
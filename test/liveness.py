@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the worklist liveness analysis in liveness.py gives the same in and
+# out sets for every statement as the iterative analysis it replaced (below),
+# for each example and feature program, and numbers the variables of each
+# procedure in an order that does not depend on the order of sets. As a
+# benchmark, report the time each takes for a large procedure with nested
+# loops. This does not need the XMOS tools.
+
+import time
+import unittest
+
+import support
+
+import ast
+from walker import NodeWalker
+from liveness import Liveness, Variables
+
+NUM_LOOPS = 40
+
+def loops(n):
+  """
+  Return a procedure with n nested loops, each updating its own variable
+  from that of the loop enclosing it, where the innermost updates the
+  variable read by the outermost, so liveness must propagate through every
+  loop.
+  """
+  s = 'proc main() is\n{ ' + ''.join(['var x{};\n  '.format(i)
+      for i in range(n+1)])
+  s += ''.join(['x{} := 0;\n  '.format(i) for i in range(n+1)])
+  for i in range(1, n+1):
+    s += 'while x{0} < 10 do\n  {{ x{0} := x{0} + x{1};\n  '.format(i, i-1)
+  s += 'x0 := x0 + x{}\n  '.format(n) + '}\n  ' * n
+  return s + ';\n  printvalln(x0)\n}\n'
+
+class IterativeLiveness(NodeWalker):
+  """
+  The iterative liveness analysis: re-walk each procedure, recomputing the
+  in and out sets of every statement, until no set changes.
+  """
+  def compute(self, stmt):
+    inp = stmt.inp.copy()
+    out = stmt.out.copy()
+    stmt.inp = stmt.use | (stmt.out - stmt.defs)
+    stmt.out = set()
+    [stmt.out.update(x.inp) for x in stmt.succ]
+    return len(inp^stmt.inp)>0 or len(out^stmt.out)>0
+
+  def run(self, node):
+    while any([self.stmt(x.stmt) if x.stmt else False for x in node.defs]):
+      pass
+
+  def stmt_seq(self, node):
+    a = any([self.stmt(x) for x in reversed(node.stmt)])
+    return self.compute(node) or a
+
+  def stmt_par(self, node):
+    a = any([self.stmt(x) for x in node.stmt])
+    return self.compute(node) or a
+
+  def stmt_server(self, node):
+    a = self.stmt(node.server)
+    b = self.stmt(node.client)
+    return self.compute(node) or a or b
+
+  def stmt_if(self, node):
+    a = self.stmt(node.thenstmt)
+    b = self.stmt(node.elsestmt)
+    return self.compute(node) or a or b
+
+  def stmt_while(self, node):
+    return self.stmt(node.stmt) | self.compute(node)
+
+  def stmt_for(self, node):
+    return self.stmt(node.stmt) | self.compute(node)
+
+  def stmt_rep(self, node):
+    return self.stmt(node.stmt) | self.compute(node)
+
+  def stmt_on(self, node):
+    return self.stmt(node.stmt) | self.compute(node)
+
+  def stmt_skip(self, node):
+    return self.compute(node)
+
+  stmt_pcall = stmt_skip
+  stmt_ass = stmt_skip
+  stmt_in = stmt_skip
+  stmt_out = stmt_skip
+  stmt_in_tag = stmt_skip
+  stmt_out_tag = stmt_skip
+  stmt_alias = stmt_skip
+  stmt_connect = stmt_skip
+  stmt_assert = stmt_skip
+  stmt_return = stmt_skip
+
+class Statements(NodeWalker):
+  """
+  Return the statements of a procedure (and the statement following it).
+  """
+  def collect(self, node):
+    self.stmts = []
+    self.stmt(node.stmt)
+    return self.stmts + [x for y in self.stmts for x in y.succ
+        if not x in self.stmts]
+
+  def stmt_seq(self, node):
+    self.stmts.append(node)
+    [self.stmt(x) for x in node.stmt]
+
+  stmt_par = stmt_seq
+
+  def stmt_server(self, node):
+    self.stmts.append(node)
+    self.stmt(node.server)
+    self.stmt(node.client)
+
+  def stmt_if(self, node):
+    self.stmts.append(node)
+    self.stmt(node.thenstmt)
+    self.stmt(node.elsestmt)
+
+  def stmt_while(self, node):
+    self.stmts.append(node)
+    self.stmt(node.stmt)
+
+  stmt_for = stmt_while
+  stmt_rep = stmt_while
+  stmt_on = stmt_while
+
+  def stmt_skip(self, node):
+    self.stmts.append(node)
+
+  stmt_pcall = stmt_skip
+  stmt_ass = stmt_skip
+  stmt_in = stmt_skip
+  stmt_out = stmt_skip
+  stmt_in_tag = stmt_skip
+  stmt_out_tag = stmt_skip
+  stmt_alias = stmt_skip
+  stmt_connect = stmt_skip
+  stmt_assert = stmt_skip
+  stmt_return = stmt_skip
+
+class CheckedLiveness(Liveness):
+  """
+  Run both analyses on each program and record the statements whose sets
+  differ.
+  """
+  procs = 0
+  errors = []
+  times = None
+
+  def run(self, node, debug=False):
+    t = time.perf_counter()
+    IterativeLiveness().run(node)
+    t1 = time.perf_counter() - t
+    stmts = [(x, Statements().collect(x)) for x in node.defs if x.stmt]
+    sets = [[(set(y.inp), set(y.out)) for y in x] for (d, x) in stmts]
+    t = time.perf_counter()
+    super().run(node, debug)
+    t2 = time.perf_counter() - t
+    CheckedLiveness.times = (t1, t2)
+    for ((d, x), y) in zip(stmts, sets):
+      CheckedLiveness.procs += 1
+      for (s, (inp, out)) in zip(x, y):
+        if inp != s.inp or out != s.out:
+          CheckedLiveness.errors.append((d.name, s, inp, s.inp, out, s.out))
+
+# Tests ========================================================
+
+class LivenessTests(support.PatchedTestCase):
+  patches = {'Liveness': CheckedLiveness}
+
+  def setUp(self):
+    super().setUp()
+    CheckedLiveness.procs = 0
+    CheckedLiveness.errors = []
+
+  def test_programs(self):
+    for x in support.programs():
+      support.compile(x, 64)
+    self.assertGreater(CheckedLiveness.procs, 100)
+    self.assertEqual(CheckedLiveness.errors, [])
+
+  def test_order(self):
+    v = Variables()
+    names = ['x{}'.format(i) for i in range(20)]
+    self.assertEqual(v.bits(set([ast.ElemId(x) for x in names[:10]])), 0x3ff)
+    v.bits(set([ast.ElemId(x) for x in reversed(names)]))
+    self.assertEqual([x.name for x in v.elems], sorted(names[:10])
+        + sorted(names[10:]))
+
+  @support.benchmark
+  def test_benchmark(self):
+    support.compile_program(loops(NUM_LOOPS), 1, name='loops.sire')
+    self.assertEqual(CheckedLiveness.errors, [])
+    (t1, t2) = CheckedLiveness.times
+    support.report('\n{} nested loops: {:.3f}s iterative, {:.3f}s worklist '
+        '... '.format(NUM_LOOPS, t1, t2))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the slotted AST classes generated by astgen.py: traversal with
+# accept() follows children(), passes can only set declared attributes and
+# copies are complete. As a benchmark, report the memory used by, and the time
+# to traverse, a large generated program. This does not need the XMOS tools.
+
+import io
+import copy
+import time
+import tracemalloc
+import unittest
+
+import support
+
+import ast
+from errorlog import ErrorLog
+from parser import Parser
+from printer import Printer
+from programs import generate_program
+
+NUM_PROCS = 500
+
+class Order(ast.NodeVisitor):
+  """
+  Record the order in which nodes are visited.
+  """
+  def __init__(self):
+    self.nodes = []
+
+  def __getattribute__(self, name):
+    if name.startswith('visit_'):
+      return lambda node: self.nodes.append(node)
+    return object.__getattribute__(self, name)
+
+def preorder(node, nodes):
+  nodes.append(node)
+  for x in node.children():
+    preorder(x, nodes)
+  return nodes
+
+def pprint(program):
+  buf = io.StringIO()
+  Printer(buf).walk_program(program)
+  return buf.getvalue()
+
+# Tests ========================================================
+
+class NodeTests(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    cls.parser = Parser(ErrorLog(), lex_optimise=True, yacc_debug=False,
+        yacc_optimise=False)
+    cls.program = cls.parser.parse(generate_program(NUM_PROCS))
+
+  def test_accept_order(self):
+    v = Order()
+    self.program.accept(v)
+    self.assertEqual(preorder(self.program, []), v.nodes)
+
+  def test_slots(self):
+    for x in preorder(self.program, []):
+      self.assertFalse(hasattr(x, '__dict__'))
+      self.assertFalse(hasattr(x.coord, '__dict__'))
+    s = ast.StmtSkip()
+    self.assertFalse(hasattr(s, 'location'))
+    s.location = ast.ElemNumber(0)
+    self.assertTrue(hasattr(s, 'location'))
+    with self.assertRaises(AttributeError):
+      s.undeclared = None
+
+  def test_deepcopy(self):
+    s = self.program.defs[0].stmt
+    s.location = ast.ElemNumber(1)
+    s.pred = [s]
+    c = copy.deepcopy(s)
+    self.assertIsNot(c, s)
+    self.assertIs(c.pred[0], c)
+    self.assertIsNot(c.location, s.location)
+    self.assertEqual(c.location.value, 1)
+    self.assertFalse(hasattr(c, 'succ'))
+    self.assertEqual(pprint(self.program), pprint(copy.deepcopy(self.program)))
+    del s.location
+    del s.pred
+
+  @support.benchmark
+  def test_benchmark(self):
+    tracemalloc.start()
+    program = self.parser.parse(generate_program(NUM_PROCS))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    num_nodes = len(preorder(program, []))
+    t = time.perf_counter()
+    program.accept(ast.NodeVisitor())
+    accept = time.perf_counter() - t
+    t = time.perf_counter()
+    preorder(program, [])
+    children = time.perf_counter() - t
+    support.report('\n{} nodes: {:.0f} bytes per node, {:.3f}s accept, '
+        '{:.3f}s children ... '.format(num_nodes, size / num_nodes, accept,
+        children))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the cache of object files (objcache.py), with a command standing in
+# for the XMOS tools that copies its source to its object file: a command is
+# run again only when its source, or a header included from the directory of
+# the source or an include path, changes; and the least recently used entries
+# are evicted when the cache grows over its size. This does not need the XMOS
+# tools.
+
+import os
+import sys
+import tempfile
+import unittest
+
+import support
+
+import objcache
+
+# Copy the source (argv[1]) to the object file (after -o) and count the calls
+TOOL = '''import sys, shutil
+shutil.copyfile(sys.argv[1], sys.argv[sys.argv.index('-o')+1])
+with open(sys.argv[0]+'.calls', 'a') as f:
+  f.write(sys.argv[1]+'\\n')
+'''
+
+class ObjCacheTests(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.TemporaryDirectory()
+    self.saved = (objcache.enabled, objcache.path, objcache.max_size)
+    objcache.enabled = True
+    objcache.path = self.path('cache')
+    self.tool = self.write('tool.py', TOOL)
+    self.include = self.path('include')
+
+  def tearDown(self):
+    (objcache.enabled, objcache.path, objcache.max_size) = self.saved
+    self.dir.cleanup()
+
+  def path(self, name):
+    return os.path.join(self.dir.name, name)
+
+  def write(self, name, s):
+    path = self.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+      f.write(s)
+    return path
+
+  def calls(self):
+    try:
+      with open(self.tool+'.calls') as f:
+        return len(f.readlines())
+    except IOError:
+      return 0
+
+  def compile(self, src):
+    obj = self.path(os.path.basename(src)+'.o')
+    objcache.execute([sys.executable, self.tool, src, '-I', self.include,
+      '-o', obj], src, obj)
+    with open(obj) as f:
+      return f.read()
+
+  def test_hit(self):
+    src = self.write('a.c', 'int a;\n')
+    self.assertEqual(self.compile(src), 'int a;\n')
+    self.assertEqual(self.compile(src), 'int a;\n')
+    self.assertEqual(self.calls(), 1)
+    self.write('a.c', 'int b;\n')
+    self.assertEqual(self.compile(src), 'int b;\n')
+    self.assertEqual(self.calls(), 2)
+
+  def test_includes(self):
+    src = self.write('src/a.c', '#include "local.h"\n#include <device.h>\n')
+    self.write('src/local.h', 'int a;\n')
+    self.write('include/device.h', 'int b;\n')
+    self.compile(src)
+    self.compile(src)
+    self.assertEqual(self.calls(), 1)
+    self.write('src/local.h', 'int c;\n')
+    self.compile(src)
+    self.assertEqual(self.calls(), 2)
+    self.write('include/device.h', 'int d;\n')
+    self.compile(src)
+    self.compile(src)
+    self.assertEqual(self.calls(), 3)
+
+  def cached(self):
+    """
+    Return the files of the entries in the cache by their contents.
+    """
+    es = {}
+    for (mtime, size, name) in objcache.entries():
+      with open(name) as f:
+        es[f.read()] = name
+    return es
+
+  def test_eviction(self):
+    srcs = [self.write(x+'.c', x * 100) for x in 'abc']
+    objcache.max_size = 250
+    self.compile(srcs[0])
+    self.compile(srcs[1])
+    # Use a, the least recently used, again
+    es = self.cached()
+    os.utime(es['a' * 100], (1000, 1000))
+    os.utime(es['b' * 100], (2000, 2000))
+    self.compile(srcs[0])
+    self.assertEqual(self.calls(), 2)
+    # Adding c evicts b, the least recently used
+    self.compile(srcs[2])
+    self.assertEqual(sorted(self.cached().keys()), ['a' * 100, 'c' * 100])
+    self.compile(srcs[0])
+    self.assertEqual(self.calls(), 3)
+    self.compile(srcs[1])
+    self.assertEqual(self.calls(), 4)
+
+if __name__ == '__main__':
+  unittest.main()
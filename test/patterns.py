@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the classification of connection patterns in connpatterns.py: the
+# segments found for the connections of trees, hypercubes and meshes give the
+# same target, connection id and master at each index as the connections
+# themselves, and irregular connections are not classified. Also check the
+# connections of the tree and hypercube examples are made without a
+# conditional statement for each index, and those of an irregular map are
+# looked up in tables or selected by a balanced search. This does not need
+# the XMOS tools.
+
+import os
+import re
+import random
+import tempfile
+import unittest
+from functools import reduce
+
+from support import INSTALL_PATH
+
+import ast
+from typedefs import *
+from symboltab import Symbol
+from evalexpr import EvalExpr
+from connpatterns import classify, Bit
+import insertconns
+import main
+
+# Examples with regular connections and their parameters
+EXAMPLES = [
+  ('tree', 16, [('D', '2')]),
+  ('cube2d', 4, []),
+  ('cube3d', 16, []),
+]
+
+# Each pair of processes i < j with h(i) = h(j) is connected, where i is the
+# master
+IRREGULAR = """
+val N is {};
+
+proc foo(chanend c) is c ! 1
+
+proc main() is
+{{ chan c[N/2];
+  var i;
+  par i in [0 for N] do
+    foo(c[(((2*i*i*i)+(5*i)) rem N)/2])
+}}
+"""
+
+def h(n, i):
+  return (((2*i*i*i)+(5*i)) % n) // 2
+
+def tree(k, depth):
+  """
+  The connections of the nodes of a k-ary tree (numbered breadth first from
+  1) to their parents: the root is connected to the master at location 0,
+  and each child is the slave of its parent.
+  """
+  n = sum([k**x for x in range(depth)])
+  return [(1, 0, 0, False)] + [(x, ((x - 2) // k) + 1, (x - 2) % k, False)
+      for x in range(2, n+1)]
+
+def hypercube(d, dim):
+  """
+  The connections along dimension 'dim' of a d-dimensional hypercube, where
+  the node with bit 'dim' clear is the master.
+  """
+  m = 1 << dim
+  return [(x, x ^ m, dim, x & m == 0) for x in range(1 << d)]
+
+def mesh(dims, offsets):
+  """
+  The connections of each node of a toroidal mesh with its neighbour at the
+  given offset in each dimension.
+  """
+  rows = []
+  for x in range(reduce(lambda x, y: x*y, dims, 1)):
+    (digits, y) = ([], x)
+    for d in reversed(dims):
+      digits.insert(0, y % d)
+      y //= d
+    t = 0
+    for (a, o, d) in zip(digits, offsets, dims):
+      t = (t * d) + ((a + o) % d)
+    rows.append((x, t, 0, True))
+  return rows
+
+def evaluate(segments, v):
+  """
+  Select and evaluate the segment for index 'v' as the generated connections
+  would, returning (target, connid, master).
+  """
+  i_elem = ast.ElemId('_i')
+  i_elem.symbol = Symbol('_i', T_VAR_SINGLE, scope=T_SCOPE_BLOCK)
+  i_elem.symbol.value = v
+  s = [x for x in segments if x.start <= v][-1]
+  s = ([x for x in s.exceptions if x.start == v] + [s])[0]
+  master = s.master
+  if isinstance(master, Bit):
+    master = EvalExpr().expr(master.expr(i_elem)) != 0
+  return (EvalExpr().expr(s.target.expr(i_elem, s.base)),
+      EvalExpr().expr(s.connid.expr(i_elem, s.base)), master)
+
+# Tests ========================================================
+
+class PatternTests(unittest.TestCase):
+
+  def check(self, rows, dims, n):
+    segments = classify(rows, dims)
+    self.assertIsNotNone(segments)
+    self.assertLessEqual(sum([1 + len(x.exceptions) for x in segments]), n)
+    for x in rows:
+      self.assertEqual(evaluate(segments, x[0]), x[1:])
+
+  def test_trees(self):
+    self.check(tree(2, 4), [15], 2)
+    self.check(tree(4, 3), [21], 2)
+
+  def test_hypercubes(self):
+    for x in range(3):
+      self.check(hypercube(3, x), [8], 1)
+    self.check(hypercube(4, 3), [2, 2, 2, 2], 1)
+
+  def test_meshes(self):
+    self.check(mesh([4, 4], [0, 1]), [4, 4], 1)
+    self.check(mesh([4, 4], [-1, 0]), [4, 4], 1)
+    self.check(mesh([2, 3, 4], [1, 0, -1]), [2, 3, 4], 1)
+
+  def test_irregular(self):
+    rnd = random.Random(1)
+    rows = [(x, rnd.randrange(64), 0, True) for x in range(32)]
+    self.assertIsNone(classify(rows, [32]))
+
+  def compile(self, name, s, cores):
+    with tempfile.TemporaryDirectory() as d:
+      src = os.path.join(d, name+'.sire')
+      out = os.path.join(d, name+'.xc')
+      with open(src, 'w') as f:
+        f.write(s)
+      self.assertEqual(main.main([src, '-n', str(cores), '-T', '-o', out]), 0)
+      with open(out) as f:
+        return f.read()
+
+  def test_examples(self):
+    for (name, cores, param) in EXAMPLES:
+      with open(os.path.join(INSTALL_PATH, 'test', 'examples',
+          name+'.sire')) as f:
+        s = f.read()
+      for (x, y) in param:
+        s = re.sub('val {} is [0-9]+;'.format(x), 'val {} is {};'.format(x, y),
+            s, count=1)
+      self.assertNotIn('_i ==', self.compile(name, s, cores), name)
+
+  def test_tables(self):
+    n = 16
+    s = self.compile('irregular', IRREGULAR.format(n), n)
+    partners = [[j for j in range(n) if j != i and h(n, j) == h(n, i)][0]
+        for i in range(n)]
+    tables = dict(re.findall(r'const int (\w+)\[\d+\] = \{(.*)\};', s))
+    self.assertEqual(tables['_targets'], ', '.join(map(str, partners)))
+    self.assertEqual(tables['_masters'],
+        ', '.join(['1' if i < j else '0' for (i, j) in enumerate(partners)]))
+    self.assertNotIn('_i ==', s)
+
+  def test_search(self):
+    n = 16
+    size = insertconns.MIN_TABLE_SIZE
+    insertconns.MIN_TABLE_SIZE = n + 1
+    try:
+      s = self.compile('irregular', IRREGULAR.format(n), n)
+    finally:
+      insertconns.MIN_TABLE_SIZE = size
+    # Each process makes one connection, selected in at most log2(n) tests
+    depths = set([len(x) for x in re.findall(r'\n( *)if \(_i >=', s)])
+    self.assertEqual(len(depths), 4)
+    self.assertNotIn('_i ==', s)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the hop distances of each device, and that placement.py (--place) never
+# increases the total hop distance between the processes connected by channels
+# of each example and feature program, that the channels are labelled with the
+# locations the processes are moved to, and that it reduces the distance for a
+# ring of processes composed out of order, on the XS1-L and XS1-G devices
+# chosen for the number of cores and on MPI with several ranks on each host
+# (compiled only as far as -Q). As a benchmark, report the distance before and
+# after placement for rings of 16 to 256 processes. This does not need the XMOS
+# tools.
+
+import io
+import random
+import unittest
+
+import support
+
+import main
+from printer import Printer
+from placement import Placement, ChannelGraph
+from target.definitions import XS1_DEVICE_TYPE_G, XS1_DEVICE_TYPE_L
+from target.xs1.device import XS1Device
+from target.mpi.device import MPIDevice
+
+RING_SIZES = [16, 64, 256]
+
+# A ring of 16 processes composed out of order
+RING_16 = [0, 5, 2, 7, 4, 1, 6, 3, 8, 13, 10, 15, 12, 9, 14, 11]
+
+def shuffled(n, seed):
+  order = list(range(n))
+  random.Random(seed).shuffle(order)
+  return order
+
+def ring(order):
+  """
+  Return a program composing a ring of processes in the given order, each
+  connected to the next by a channel.
+  """
+  n = len(order)
+  s = ('proc node(chanend l, chanend r, val v) is\n'
+      + '{ var x; r ! v; l ? x; printvalln(x) }\n\n'
+      + 'proc main() is\n{{ chan c[{}];\n  {{ '.format(n))
+  s += '\n  & '.join(['node(c[{}], c[{}], {})'.format(i, (i+1) % n, i)
+      for i in order])
+  return s + '\n  }$\n}\n'
+
+class RecordedPlacement(Placement):
+  """
+  Record each placement and the hop distance of the channels as they are
+  labelled for the next stage (LabelConns).
+  """
+  results = []
+
+  def run(self, node):
+    moved = super().run(node)
+    RecordedPlacement.results.append(self)
+    return moved
+
+class CheckedLabelConns(main.LabelConns):
+  """
+  Record the hop distance of the channels of the last placement.
+  """
+  def walk_program(self, node):
+    if RecordedPlacement.results:
+      p = RecordedPlacement.results[-1]
+      graph = ChannelGraph(p.ons.ons)
+      node.defs[-1].accept(graph)
+      p.labelled = sum([w * p.device.hops(a, b)
+        for ((a, b), w) in graph.edges().items()])
+    super().walk_program(node)
+
+class QuietPrinter(Printer):
+  """
+  Discard the transformed AST printed with -Q.
+  """
+  def __init__(self, buf=None, labels=False):
+    super().__init__(io.StringIO(), labels)
+
+# Tests ========================================================
+
+class PlacementTests(support.PatchedTestCase):
+  patches = {'Placement': RecordedPlacement, 'LabelConns': CheckedLabelConns,
+      'Printer': QuietPrinter}
+
+  def place_ring(self, order, options=[]):
+    self.assertEqual(support.compile_program(ring(order), len(order),
+      ['--place'] + options, name='ring.sire'), 0)
+    (p,) = RecordedPlacement.results[-1:]
+    return p
+
+  def check(self, p):
+    """
+    Check the channels are labelled with the locations after placement.
+    """
+    if p.after == None:
+      return
+    self.assertEqual(p.labelled, p.after)
+    self.assertLessEqual(p.after, p.before)
+
+  def test_hops(self):
+    l = XS1Device(XS1_DEVICE_TYPE_L, 'XS1-L8A', 8, 1)
+    self.assertEqual([l.hops(0, x) for x in range(8)],
+        [0, 1, 1, 2, 1, 2, 2, 3])
+    g = XS1Device(XS1_DEVICE_TYPE_G, 'XMP-16', 4, 4)
+    self.assertEqual([g.hops(1, x) for x in range(16)],
+        [1, 0, 1, 1, 2, 2, 2, 2, 2, 2, 2, 2, 3, 3, 3, 3])
+    m = MPIDevice('MPI', 8, 4)
+    self.assertEqual([m.hops(2, x) for x in range(8)],
+        [1, 1, 0, 1, 2, 2, 2, 2])
+    self.assertEqual(MPIDevice('MPI', 8).hops(0, 7), 1)
+
+  def test_ring(self):
+    p = self.place_ring([0, 5, 2, 7, 4, 1, 6, 3])
+    self.assertEqual((p.before, p.after), (18, 10))
+    self.assertEqual(sorted(p.place), list(range(8)))
+    self.check(p)
+
+  def test_ring_g(self):
+    p = self.place_ring(RING_16)
+    self.assertEqual((p.device.type, p.device.num_nodes), (XS1_DEVICE_TYPE_G,
+      4))
+    self.assertEqual((p.before, p.after), (30, 20))
+    self.check(p)
+
+  def test_ring_mpi(self):
+    p = self.place_ring(RING_16, ['-t', 'MPI', '--ranks-per-host', '4', '-Q'])
+    self.assertEqual(p.device.ranks_per_host, 4)
+    self.assertEqual((p.before, p.after), (30, 20))
+    self.check(p)
+    p = self.place_ring(RING_16, ['-t', 'MPI', '-Q'])
+    self.assertEqual((p.before, p.after), (16, 16))
+
+  def test_programs(self):
+    for x in support.programs():
+      support.compile(x, 64, ['--place'])
+    self.assertGreater(len(RecordedPlacement.results), 20)
+    for p in RecordedPlacement.results:
+      self.check(p)
+
+  @support.benchmark
+  def test_benchmark(self):
+    support.report('\nHop distance of a ring:\n{:>10} {:>8} {:>8}\n'.format(
+        'processes', 'before', 'after'))
+    for n in RING_SIZES:
+      p = self.place_ring(shuffled(n, 0))
+      self.check(p)
+      support.report('{:>10} {:>8} {:>8}\n'.format(n, p.before, p.after))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the coordinates of the AST: the line and column of each node of the
+# example and feature programs, found from the offsets of the newlines lexed,
+# are those of its position in the source; coordinates are shared by copies;
+# lexer errors report the file; and without tracking (--no-positions) the
+# same AST is produced. As a benchmark, report the time to parse a large
+# generated program with coordinates found as each is made, found when
+# formatted, and without tracking. This does not need the XMOS tools.
+
+import os
+import io
+import copy
+import time
+import unittest
+
+import support
+
+from errorlog import ErrorLog
+from parser import Parser, Coord
+from printer import Printer
+from programs import generate_program
+
+NUM_PROCS = 500
+
+class EagerCoord(Coord):
+  """
+  Coordinates with the line and column found when made, from the line
+  tracked by the parser and by searching the input back to the last newline.
+  """
+  __slots__ = ('eager',)
+
+  def __init__(self, source, lexpos, lineno, data):
+    super().__init__(source, lexpos)
+    self.eager = (lineno, lexpos - max(data.rfind('\n', 0, lexpos), 0) + 1)
+
+class EagerParser(Parser):
+  def coord(self, p, index=1):
+    return EagerCoord(self.lexer.source, p.lexpos(index), p.lineno(index),
+        self.lexer.data())
+
+def nodes(node, l):
+  l.append(node)
+  for x in node.children():
+    nodes(x, l)
+  return l
+
+def pprint(program):
+  buf = io.StringIO()
+  Printer(buf).walk_program(program)
+  return buf.getvalue()
+
+# Tests ========================================================
+
+class PositionTests(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    cls.parser = Parser(ErrorLog(), lex_optimise=True, yacc_debug=False,
+        yacc_optimise=False)
+
+  def parse(self, s, filename='', tracking=True):
+    return self.parser.parse(s, filename, tracking=tracking)
+
+  def test_positions(self):
+    for x in support.programs():
+      with open(x) as f:
+        s = f.read()
+      program = self.parse(s, x)
+      for y in nodes(program, []):
+        if y.coord == None:
+          continue
+        c = y.coord
+        self.assertEqual(c.file, os.path.basename(x))
+        self.assertEqual(c.line, s.count('\n', 0, c.lexpos) + 1)
+        self.assertEqual(c.column,
+            c.lexpos - max(s.rfind('\n', 0, c.lexpos), 0) + 1)
+
+  def test_shared(self):
+    program = self.parse(generate_program(10))
+    c = copy.deepcopy(program)
+    for (x, y) in zip(nodes(program, []), nodes(c, [])):
+      self.assertIs(x.coord, y.coord)
+    self.assertFalse(hasattr(program.coord, '__dict__'))
+    self.assertFalse(hasattr(program.coord.source, '__dict__'))
+
+  def test_lex_error(self):
+    err = io.StringIO()
+    support.compile_program('proc main() is\n{ var x;\n  x := 1 # 2\n}\n',
+        err=err)
+    self.assertIn("program.sire:3:11: error: Illegal character",
+        err.getvalue())
+
+  def test_no_positions(self):
+    for x in support.programs():
+      with open(x) as f:
+        s = f.read()
+      self.assertEqual(pprint(self.parse(s, x, False)),
+          pprint(self.parse(s, x)))
+
+  @support.benchmark
+  def test_benchmark(self):
+    s = generate_program(NUM_PROCS)
+    eager = EagerParser(ErrorLog(), lex_optimise=True, yacc_debug=False,
+        yacc_optimise=False)
+    support.report('\nTime to parse {} procedures:\n'.format(NUM_PROCS))
+    self.parse(s)
+    for (name, f) in [
+        ('eager', lambda: eager.parse(s)),
+        ('lazy', lambda: self.parse(s)),
+        ('no tracking', lambda: self.parse(s, tracking=False))]:
+      t = time.perf_counter()
+      program = f()
+      t = time.perf_counter() - t
+      self.assertEqual(len(program.defs), NUM_PROCS + 1)
+      support.report('{:>12} {:>8.3f}s\n'.format(name, t))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,30 @@
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Generated programs for the tests of the compiler's internals.
+
+def generate_program(num_procs):
+  """
+  Generate a program with many procedures, each containing a mix of
+  statements and expressions.
+  """
+  s = 'val N is 10;\n'
+  for i in range(num_procs):
+    s += '''
+proc p{0}(var a[n], val n, val x) is
+{{ var i;
+  var y;
+  y := (x + {0}) * 2 - n / 3;
+  for i in [0 for n] do
+  {{ if (a[i] > y) and (x < N) then a[i] := a[i] + y * i
+    else a[i] := (a[i] - 1) rem 7;
+    while y > 0 do y := y - 1
+  }};
+  {{ y := x + 1 & a[0] := n - 1 }};
+  on {1} do printval(y)
+}}
+'''.format(i, i % 16)
+  s += '\nproc main() is { var a[N]; p0(a, N, 1) }\n'
+  return s
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check a round trip through the compile server (server.py) and its client
+# (client.py): a server is started on a temporary socket and programs with
+# the same name in different directories are compiled through it, giving the
+# same translations as compiling them directly, written where the client
+# asked; and only positional arguments are sent as input files. This does not
+# need the XMOS tools.
+
+import os
+import io
+import time
+import signal
+import tempfile
+import unittest
+import contextlib
+import subprocess
+
+import support
+from support import INSTALL_PATH
+
+import client
+
+TIMEOUT = 30
+
+def program(v):
+  return 'proc main() is printvalln({})\n'.format(v)
+
+class RemoteTests(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.TemporaryDirectory()
+    self.socket = os.path.join(self.dir.name, 'sire.sock')
+    self.server = subprocess.Popen(['python3',
+      os.path.join(INSTALL_PATH, 'compiler', 'main.py'), '--server',
+      self.socket], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    t = time.time()
+    while not os.path.exists(self.socket):
+      self.assertIsNone(self.server.poll(), 'server exited')
+      self.assertLess(time.time() - t, TIMEOUT, 'server did not start')
+      time.sleep(0.1)
+
+  def tearDown(self):
+    self.server.send_signal(signal.SIGINT)
+    self.server.wait(TIMEOUT)
+    self.dir.cleanup()
+
+  def write(self, name, s):
+    path = os.path.join(self.dir.name, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+      f.write(s)
+    return path
+
+  def compile_remote(self, args):
+    err = io.StringIO()
+    with contextlib.redirect_stdout(io.StringIO()), \
+        contextlib.redirect_stderr(err):
+      status = client.compile_remote(args, self.socket)
+    return (status, err.getvalue())
+
+  def test_programs(self):
+    srcs = [self.write(x, program(i))
+        for (i, x) in enumerate(['a/program.sire', 'b/program.sire'])]
+    outs = []
+    for (i, x) in enumerate(srcs):
+      out = os.path.join(self.dir.name, 'out{}.xc'.format(i))
+      expected = os.path.join(self.dir.name, 'expected{}.xc'.format(i))
+      (status, err) = self.compile_remote([x, '-n', '4', '-T', '-o', out])
+      self.assertEqual(status, 0, err)
+      self.assertEqual(support.compile(x, 4, ['-o', expected]), 0)
+      with open(out) as f, open(expected) as g:
+        outs.append(f.read())
+        self.assertEqual(outs[-1], g.read())
+    self.assertNotEqual(outs[0], outs[1])
+
+  def test_inputs(self):
+    src = self.write('program.sire', program(1))
+    self.write('4', '')
+    cwd = os.getcwd()
+    os.chdir(self.dir.name)
+    try:
+      args = ['-n', '4', '--stats', 'json', src, '-T', '-o', 'out.xc']
+      self.assertEqual(client.inputs(args), [4])
+      self.assertEqual([x[1] for x in client.request(args)['files']], [src])
+      (status, err) = self.compile_remote(args)
+      self.assertEqual(status, 0, err)
+      self.assertTrue(os.path.isfile('out.xc'))
+    finally:
+      os.chdir(cwd)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the channels of large replicators are labelled symbolically (see
+# labelchans.ChanMap): the connections of rings and tori are made in closed
+# form, with each master connected to the slave of the same element, and
+# arrays that are also used elsewhere are expanded with the same result.
+# As a benchmark, report the time to compile a ring as the number of processes
+# is increased from 16 to 65536, which should not depend on it once the
+# replicator is symbolic. This does not need the XMOS tools.
+
+import os
+import re
+import time
+import tempfile
+import unittest
+
+import support
+
+import labelchans
+import main
+
+SIZES = [16, 64, 256, 1024, 4096, 16384, 65536]
+
+RING = """
+val N is {};
+
+proc foo(chanend l, chanend r) is
+{{ var v;
+  r ! 1;
+  l ? v
+}}
+
+proc main() is
+{{ chan c[N];
+  var i;
+  par i in [0 for N] do
+    foo(c[i], c[(i+1) rem N])
+}}
+"""
+
+TORUS = """
+val N is {};
+
+proc node(chanend a, chanend b, chanend c, chanend d) is
+{{ var x;
+  var y;
+  {{ a ! 1 & c ! 1 & b ? x & d ? y }}
+}}
+
+proc main() is
+{{ chan h[N*N];
+  chan v[N*N];
+  var i;
+  var j;
+  par i in [0 for N], j in [0 for N] do
+    node(h[(i*N)+j], h[(i*N)+((j+1) rem N)], v[(i*N)+j],
+        v[(((i+1) rem N)*N)+j])
+}}
+"""
+
+# The ring also uses c[N], so its symbolic uses are expanded
+EXTRA = """
+val N is {};
+
+proc foo(chanend l, chanend r) is
+{{ var v;
+  r ! 1;
+  l ? v
+}}
+
+proc a(chanend c) is c ! 1
+
+proc b(chanend c) is
+{{ var v;
+  c ? v
+}}
+
+proc main() is
+{{ chan c[N+1];
+  var i;
+  {{ par i in [0 for N] do foo(c[i], c[(i+1) rem N]) &
+    on N do a(c[N]) &
+    on N+1 do b(c[N]) }}
+}}
+"""
+
+def connections(s):
+  """
+  Return a list of (master, connid, target) for each connection made in terms
+  of the combined index _i.
+  """
+  return [(x == 'Master', int(y), eval('lambda _i: '+z.replace('/', '//')))
+      for (x, y, z) in re.findall(r'_connect(Master|Slave)\((\d+), (.*)\);', s)]
+
+# Tests ========================================================
+
+class ReplicatorTests(unittest.TestCase):
+
+  def compile(self, s, cores):
+    with tempfile.TemporaryDirectory() as d:
+      src = os.path.join(d, 'rep.sire')
+      out = os.path.join(d, 'rep.xc')
+      with open(src, 'w') as f:
+        f.write(s)
+      self.assertEqual(main.main([src, '-n', str(cores), '-T', '-o', out]), 0)
+      with open(out) as f:
+        return f.read()
+
+  def check(self, s, n):
+    """
+    Check each master at i connects to a distinct process j, whose slave with
+    the same identifier connects back to i.
+    """
+    conns = connections(s)
+    self.assertNotIn('_i ==', s)
+    masters = [x for x in conns if x[0]]
+    self.assertTrue(masters)
+    for (m, connid, f) in masters:
+      slaves = [x[2] for x in conns if not x[0] and x[1] == connid]
+      self.assertEqual(len(slaves), 1)
+      self.assertEqual(sorted([f(i) for i in range(n)]), list(range(n)))
+      for i in range(n):
+        self.assertEqual(slaves[0](f(i)), i)
+
+  def test_ring(self):
+    n = labelchans.MIN_SYMBOLIC_SIZE
+    self.check(self.compile(RING.format(n), n), n)
+
+  def test_torus(self):
+    n = 16
+    self.check(self.compile(TORUS.format(n), n*n), n*n)
+
+  def test_expanded(self):
+    n = labelchans.MIN_SYMBOLIC_SIZE
+    s = self.compile(EXTRA.format(n), n+2)
+    size = labelchans.MIN_SYMBOLIC_SIZE
+    labelchans.MIN_SYMBOLIC_SIZE = n + 1
+    try:
+      self.assertEqual(s, self.compile(EXTRA.format(n), n+2))
+    finally:
+      labelchans.MIN_SYMBOLIC_SIZE = size
+
+  @support.benchmark
+  def test_benchmark(self):
+    support.report('\n')
+    for n in SIZES:
+      t = time.perf_counter()
+      s = self.compile(RING.format(n), n)
+      t = time.perf_counter() - t
+      self.assertNotIn('_i ==', s)
+      support.report('{:>6} processes: {:.3f}s\n'.format(n, t))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the statistics of compilation (stats.py) reported with --stats: the
+# JSON report of a feature program parses and has each stage with the number
+# of AST nodes before and after it and the CPU time of child processes, and
+# the text report is written even when compilation fails. This does not need
+# the XMOS tools.
+
+import io
+import os
+import json
+import unittest
+import contextlib
+
+import support
+from support import INSTALL_PATH
+
+# The stages of the front end and of the transformations of a program
+STAGES = ['Parser', 'Parse', 'Semantics', 'ExpandProcs', 'ChunkReps',
+    'InsertOns', 'LabelProcs', 'LabelChans', 'LabelConns', 'InsertConns',
+    'RenameChans', 'BuildCFG', 'Liveness', 'TransformServer', 'TransformPar',
+    'TransformRep', 'FlattenCalls', 'RemoveDecls', 'Children', 'Translate']
+
+class StatsTests(unittest.TestCase):
+
+  def report(self, f, *args):
+    """
+    Return the exit code of a compilation and the report written.
+    """
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+      e = f(*args)
+    return (e, out.getvalue())
+
+  def test_json(self):
+    src = os.path.join(INSTALL_PATH, 'test', 'features', 'server_5.sire')
+    (e, s) = self.report(support.compile, src, 4, ['--stats', 'json'])
+    self.assertEqual(e, 0)
+    d = json.loads(s)
+    self.assertEqual(d['infile'], src)
+    self.assertEqual(d['num_cores'], 4)
+    self.assertEqual([x['name'] for x in d['stages']], STAGES)
+    for x in d['stages'][2:]:
+      self.assertGreater(x['nodes_before'], 0, x['name'])
+      self.assertGreater(x['nodes_after'], 0, x['name'])
+      self.assertGreaterEqual(x['child_cpu'], 0, x['name'])
+    parse = d['stages'][1]
+    self.assertEqual((parse['nodes_before'], parse['nodes_after']),
+        (None, d['stages'][2]['nodes_before']))
+
+  def test_failure(self):
+    (e, s) = self.report(support.compile_program,
+        'proc main() is\n{ x := 1 }\n', 4, ['--stats'])
+    self.assertEqual(e, 1)
+    lines = s.splitlines()
+    self.assertTrue(lines[0].startswith('Stage'))
+    self.assertEqual([x.split()[0] for x in lines[2:]],
+        ['Parser', 'Parse', 'Semantics'])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the scheduler of build jobs (jobs.py): each job starts after those it
+# depends on, output is reported in the order the jobs are given, and a job
+# that fails, with a CommandError or any other exception, stops the jobs that
+# depend on it and is reported. This does not need the XMOS tools.
+
+import io
+import time
+import threading
+import unittest
+import contextlib
+
+import support
+
+import jobs
+from jobs import Job
+from error import Error
+from util import CommandError
+
+class Steps(object):
+  """
+  Record the order in which the jobs of a build run.
+  """
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.order = []
+
+  def job(self, name, deps=[], delay=0, fail=None):
+    def run(args):
+      time.sleep(delay)
+      with self.lock:
+        self.order.append(name)
+      if fail:
+        raise fail
+      return name+'\n'
+    return Job(name, [name], deps, run)
+
+class SchedulerTests(unittest.TestCase):
+
+  def run_jobs(self, l, num_procs=4):
+    out = io.StringIO()
+    err = io.StringIO()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+      try:
+        jobs.run(l, num_procs)
+        failed = False
+      except Error:
+        failed = True
+    return (failed, out.getvalue(), err.getvalue())
+
+  def test_order(self):
+    s = Steps()
+    l = [s.job('a', delay=0.2), s.job('b'), s.job('c', ['a', 'b'])]
+    self.assertEqual(self.run_jobs(l), (False, 'a\nb\nc\n', ''))
+    self.assertEqual(s.order, ['b', 'a', 'c'])
+
+  def test_command_error(self):
+    s = Steps()
+    l = [s.job('a', fail=CommandError(['cc', 'a.c'], 'a.c: error\n')),
+        s.job('b', ['a'])]
+    (failed, out, err) = self.run_jobs(l)
+    self.assertTrue(failed)
+    self.assertEqual(s.order, ['a'])
+    self.assertFalse(l[1].started)
+    self.assertIn('cc a.c', err)
+    self.assertIn('a.c: error', err)
+
+  def test_exception(self):
+    s = Steps()
+    l = [s.job('a', fail=ValueError('bad value')), s.job('b', ['a']),
+        s.job('c', ['b']), s.job('d', delay=0.1)]
+    (failed, out, err) = self.run_jobs(l)
+    self.assertTrue(failed)
+    self.assertEqual(sorted(s.order), ['a', 'd'])
+    self.assertEqual([x.started for x in l], [True, False, False, True])
+    self.assertEqual(out, 'd\n')
+    self.assertIn('job a failed', err)
+    self.assertIn('ValueError: bad value', err)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,87 @@
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# The setup shared by the tests of the compiler's modules, which do not need
+# the XMOS tools. Import this before any compiler module: the compiler's own
+# ast module replaces the standard one (already imported by unittest).
+#
+# Benchmarks are skipped unless SIRE_BENCHMARK is set (make benchmark), so a
+# test run stays quiet and fast.
+
+import os
+import sys
+import io
+import glob
+import tempfile
+import unittest
+import contextlib
+
+INSTALL_PATH_ENV = 'SIRE_HOME'
+INSTALL_PATH = os.environ[INSTALL_PATH_ENV]
+BENCHMARK_ENV = 'SIRE_BENCHMARK'
+
+sys.path.insert(0, INSTALL_PATH+'/compiler')
+sys.modules.pop('ast', None)
+
+import main
+
+def benchmark(f):
+  """
+  Mark a test as a benchmark, run only if SIRE_BENCHMARK is set. Its results
+  are written to stderr with report().
+  """
+  return unittest.skipUnless(os.environ.get(BENCHMARK_ENV),
+      'set {} to run benchmarks'.format(BENCHMARK_ENV))(f)
+
+def report(s):
+  sys.stderr.write(s)
+
+def programs(sets=['examples', 'features']):
+  """
+  Return the paths of the example and feature programs.
+  """
+  return sorted([y for x in sets for y in glob.glob(
+    os.path.join(INSTALL_PATH, 'test', x, '*.sire'))])
+
+def compile(src, cores=None, options=[], err=None):
+  """
+  Compile a program with the compiler's main (translating only) and return
+  its exit code. Its messages are written to err if given, and otherwise
+  discarded.
+  """
+  args = [src, '-T'] + (['-n', str(cores)] if cores != None else [])
+  with tempfile.TemporaryDirectory() as d:
+    with contextlib.redirect_stderr(err if err != None else io.StringIO()):
+      return main.main(args + ['-o', os.path.join(d, 'out')] + options)
+
+def compile_program(s, cores=None, options=[], err=None,
+    name='program.sire'):
+  """
+  Compile the source of a program, as compile().
+  """
+  with tempfile.TemporaryDirectory() as d:
+    src = os.path.join(d, name)
+    with open(src, 'w') as f:
+      f.write(s)
+    return compile(src, cores, options, err)
+
+class PatchedTestCase(unittest.TestCase):
+  """
+  A test case replacing classes used by main (usually subclasses of passes
+  recording what they do) for each test: 'patches' maps the names of the
+  classes to their replacements, whose 'results' are emptied.
+  """
+  patches = {}
+
+  def setUp(self):
+    self.patched = dict([(x, getattr(main, x)) for x in self.patches])
+    for (x, y) in self.patches.items():
+      setattr(main, x, y)
+      if hasattr(y, 'results'):
+        y.results = []
+
+  def tearDown(self):
+    for (x, y) in self.patched.items():
+      setattr(main, x, y)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check the cached NodeWalker dispatch in walker.py visits a large generated
+# program exactly as the original (which resolved the method from the name of
+# the node class on every visit) and, as a benchmark, compare the time taken
+# by each. This does not need the XMOS tools.
+
+import io
+import time
+import unittest
+
+import support
+
+import util
+from error import Error
+from errorlog import ErrorLog
+from parser import Parser
+from printer import Printer
+from programs import generate_program
+
+NUM_PROCS = 500
+NUM_REPEATS = 5
+
+class ReferencePrinter(Printer):
+  """
+  A Printer using the original dispatch of NodeWalker for the node types it
+  does not handle itself.
+  """
+  def dispatch(self, node, *args):
+    f = getattr(self, util.camel_to_under(node.__class__.__name__))
+    return f(node, *args) if args else f(node)
+
+  stmt = dispatch
+  expr = dispatch
+  elem = dispatch
+
+# Tests ========================================================
+
+class WalkerTests(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    cls.program = Parser(ErrorLog(), lex_optimise=True, yacc_debug=False,
+        yacc_optimise=False).parse(generate_program(NUM_PROCS))
+
+  def walk(self, printer):
+    buf = io.StringIO()
+    printer(buf).walk_program(self.program)
+    return buf.getvalue()
+
+  def time(self, printer):
+    t = time.perf_counter()
+    for i in range(NUM_REPEATS):
+      self.walk(printer)
+    return (time.perf_counter() - t) / NUM_REPEATS
+
+  def test_walk(self):
+    self.assertEqual(self.walk(ReferencePrinter), self.walk(Printer))
+
+  @support.benchmark
+  def test_benchmark(self):
+    reference = self.time(ReferencePrinter)
+    cached = self.time(Printer)
+    support.report('\n{} procedures: {:.3f}s per walk with the original '
+        'dispatch, {:.3f}s cached ({:.1f}x) ... '.format(NUM_PROCS, reference,
+        cached, reference / cached))
+    self.assertLess(cached, reference)
+
+if __name__ == '__main__':
+  unittest.main()
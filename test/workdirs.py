@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2011, James Hanlon, All rights reserved
+# This software is freely distributable under a derivative of the
+# University of Illinois/NCSA Open Source License posted in
+# LICENSE.txt and at <http://github.xcore.com/>
+
+# Check builds run in their own work directories (util.work_dir), with
+# commands standing in for the MPI tools that join their inputs into their
+# output: builds running at the same time do not see each other's files,
+# the working directory of the process is not changed, each output is
+# written relative to it, and --work-dir keeps the files of a build. This
+# does not need the XMOS or MPI tools.
+
+import io
+import os
+import stat
+import tempfile
+import threading
+import unittest
+import contextlib
+
+import support
+
+import config
+from target.mpi.device import MPIDevice
+from target.mpi.build import build_mpi
+
+# Join the input files (found relative to the directory the command runs in)
+# into the output file, slowly enough that builds overlap.
+TOOL = '''#!/usr/bin/env python3
+import os, sys, time
+time.sleep(0.2)
+args = sys.argv[1:]
+out = args[args.index('-o')+1]
+s = ''
+for (i, x) in enumerate(args):
+  if os.path.isfile(x) and not (i > 0 and args[i-1] in ['-o', '-I']):
+    with open(x) as f:
+      s += f.read()
+with open(out, 'w') as f:
+  f.write(s)
+'''
+
+TOOLS = ['mpicc', 'gcc']
+
+def program(name):
+  return '/* program {} */\n'.format(name)
+
+class WorkDirTests(unittest.TestCase):
+
+  def setUp(self):
+    config.init()
+    self.dir = tempfile.TemporaryDirectory()
+    bin = os.path.join(self.dir.name, 'bin')
+    os.makedirs(bin)
+    for x in TOOLS:
+      path = os.path.join(bin, x)
+      with open(path, 'w') as f:
+        f.write(TOOL)
+      os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    self.path = os.environ['PATH']
+    os.environ['PATH'] = bin + os.pathsep + self.path
+    self.cwd = os.getcwd()
+    self.caller = os.path.join(self.dir.name, 'caller')
+    os.makedirs(self.caller)
+    os.chdir(self.caller)
+
+  def tearDown(self):
+    os.chdir(self.cwd)
+    os.environ['PATH'] = self.path
+    self.dir.cleanup()
+
+  def build(self, name, work_dir=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+      build_mpi(MPIDevice('MPI', 4), io.StringIO(program(name)), name+'.out',
+          False, work_dir=work_dir)
+
+  def read(self, name):
+    with open(name) as f:
+      return f.read()
+
+  def test_concurrent(self):
+    names = ['a', 'b']
+    errors = []
+    def build(name):
+      try:
+        self.build(name)
+      except BaseException as e:
+        errors.append(e)
+    threads = [threading.Thread(target=build, args=(x,)) for x in names]
+    [x.start() for x in threads]
+    [x.join() for x in threads]
+    self.assertEqual(errors, [])
+    self.assertEqual(os.getcwd(), self.caller)
+    self.assertEqual(sorted(os.listdir(self.caller)), ['a.out', 'b.out'])
+    for x in names:
+      s = self.read(x+'.out')
+      self.assertTrue(s.startswith(program(x)), x)
+      self.assertNotIn(program('b' if x == 'a' else 'a'), s)
+
+  def test_work_dir(self):
+    d = os.path.join(self.dir.name, 'work')
+    self.build('a', d)
+    self.assertEqual(os.getcwd(), self.caller)
+    self.assertEqual(os.listdir(self.caller), ['a.out'])
+    self.assertEqual(self.read(os.path.join(d, 'program.c')), program('a'))
+    self.assertTrue(os.path.isfile(os.path.join(d, 'device.h')))
+
+if __name__ == '__main__':
+  unittest.main()